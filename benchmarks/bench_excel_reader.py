@@ -0,0 +1,47 @@
+"""
+Times get_info's fast reader (openpyxl read_only values, and calamine if installed) against 
+    the pd.ExcelFile + two pd.read_excel path it replaced, on synthetic workbooks.
+
+    python -m benchmarks.bench_excel_reader
+"""
+import io
+import time
+import pandas as pd
+from benchmarks.synthetic import write_workbook
+from src.excel_reader import calamine_available
+from src.scraper import read_workbook
+
+def time_reader(data: bytes, repeats: int = 3, **kwargs) -> tuple[float, pd.DataFrame]:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        _, df = read_workbook(io.BytesIO(data), **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best, df
+
+def main():
+    readers = {
+        "read_excel x2": {"fast_reader": False},
+        "openpyxl fast": {"fast_reader": True, "engine": "openpyxl"},
+    }
+    if calamine_available():
+        readers["calamine fast"] = {"fast_reader": True, "engine": "calamine"}
+
+    print(f"{'rows':>8} {'quarters':>8} " + " ".join(f"{name:>15}" for name in readers))
+    for n_blocks, n_years in [(1, 25), (20, 25), (100, 40), (500, 40)]:
+        buffer = io.BytesIO()
+        write_workbook(buffer, n_blocks=n_blocks, n_years=n_years)
+        data = buffer.getvalue()
+
+        timings = {}
+        baseline_df = None
+        for name, kwargs in readers.items():
+            timings[name], df = time_reader(data, repeats=1 if n_blocks >= 100 else 3, **kwargs)
+            if baseline_df is None:
+                baseline_df = df
+            else:
+                pd.testing.assert_frame_equal(df, baseline_df)
+        print(f"{len(baseline_df):>8} {n_years * 4:>8} " + " ".join(f"{timings[name]:>14.3f}s" for name in readers))
+
+if __name__ == "__main__":
+    main()
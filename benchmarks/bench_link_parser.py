@@ -0,0 +1,50 @@
+"""
+Times get_excel_link's streaming HTMLParser path against the full BeautifulSoup tree it replaced, 
+    on synthetic landing pages - or on a saved copy of the real page, if a path is given.
+
+    python -m benchmarks.bench_link_parser [saved_page.html]
+"""
+import sys
+import time
+from requests import Response
+from benchmarks.synthetic import landing_page_html
+from src.link_parser import attachment_links
+from src.scraper import get_excel_link
+
+def as_response(content: bytes) -> Response:
+    response = Response()
+    response._content = content
+    response.status_code = 200
+    return response
+
+def best_time(func, repeats: int = 20) -> tuple[float, object]:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def compare(label: str, content: bytes) -> None:
+    response = as_response(content)
+    soup_time, soup_link = best_time(lambda: get_excel_link(response, fast_parser=False))
+    fast_time, fast_link = best_time(lambda: get_excel_link(response))
+    all_time, links = best_time(lambda: attachment_links(content))
+    assert soup_link == fast_link
+    print(
+        f"{label:<28} {len(content) / 1024:>7.0f}KB {soup_time * 1000:>10.2f}ms {fast_time * 1000:>10.2f}ms "
+        f"{soup_time / fast_time:>7.1f}x {all_time * 1000:>10.2f}ms ({len(links)} links)"
+    )
+
+def main():
+    print(f"{'page':<28} {'size':>9} {'soup':>12} {'streaming':>12} {'speedup':>8} {'all links':>12}")
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "rb") as f:
+            compare(sys.argv[1], f.read())
+        return
+    for n_attachments, filler, position in [(5, 200, 0.0), (5, 200, 1.0), (40, 1000, 0.0), (40, 1000, 1.0)]:
+        label = f"{n_attachments} files, link {'first' if position == 0 else 'last'}, {filler} p"
+        compare(label, landing_page_html(n_attachments, filler, position))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Scan times of read_table before and after optimize, on a large synthetic table:
+    - fragmented: every partition spread over several files, as appends leave it
+    - versioned: a table after a run of releases each revising recent quarters, then vacuumed
+
+    python -m benchmarks.bench_optimize [n_blocks] [n_years] [files_per_partition]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+import numpy as np
+from benchmarks.synthetic import quarter_frame
+from src.transform import transform_quarter_df
+from src.storage import write_parquet_file, partition_path, table_path
+from src.versioning import commit_merge
+from src.query import read_table
+from src.maintenance import optimize, vacuum
+
+def best_time(func, repeats: int = 3) -> tuple[float, object]:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def disk_usage(location: str) -> tuple[int, int]:
+    files = [os.path.join(d, f) for d, _, names in os.walk(table_path(location)) for f in names if f.endswith(".parquet")]
+    return len(files), sum(os.path.getsize(f) for f in files)
+
+def scans(location: str, queries: dict) -> dict:
+    return {label: best_time(lambda: read_table(location, **query))[0] for label, query in queries.items()}
+
+def report(title: str, location: str, queries: dict, before: dict, stats: dict, usage_before, usage_after) -> None:
+    after = scans(location, queries)
+    print(f"{title}: {usage_before[0]} files / {usage_before[1] / 1e6:.1f}MB -> {usage_after[0]} files / {usage_after[1] / 1e6:.1f}MB ({stats})")
+    for label in queries:
+        print(f"  {label:<24} {before[label]:>8.3f}s -> {after[label]:>8.3f}s ({before[label] / after[label]:.1f}x)")
+
+def main():
+    n_blocks = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    n_years = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    pieces = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    df = transform_quarter_df(quarter_frame(n_blocks=n_blocks, n_years=n_years), datetime(2024, 7, 30), "ET_3.1_JUL_24.xlsx")
+    last_year = int(df["year"].max())
+    queries = {
+        "everything": {},
+        "one year": {"years": [last_year]},
+        "one resource": {"resources": ["crude oil & ngls"]},
+        "imports, ten years": {"years": list(range(last_year - 9, last_year + 1)), "categories": ["import"]},
+    }
+    print(f"{len(df)} rows")
+
+    with tempfile.TemporaryDirectory() as location:
+        for (year, quarter), part in df.groupby(["year", "quarter"], observed=True):
+            for rows in np.array_split(np.arange(len(part)), pieces):
+                write_parquet_file(part.iloc[rows], partition_path(location, int(year), int(quarter)))
+        before, usage = scans(location, queries), disk_usage(location)
+        stats = optimize(location)
+        report(f"fragmented, {pieces} files per partition", location, queries, before, stats, usage, disk_usage(location))
+
+    with tempfile.TemporaryDirectory() as location:
+        periods = df["year"].astype(int) * 4 + df["quarter"].astype(int)
+        for release in range(12):
+            revised = df.copy()
+            revised.loc[periods > periods.max() - 8, "figures"] += release
+            commit_merge(revised, location, f"2024-{release + 1:02d}-28", f"ET_{release}.xlsx")
+        before, usage = scans(location, queries), disk_usage(location)
+        stats = optimize(location)
+        stats["vacuumed"] = len(vacuum(location, retain_versions=0, min_age=0))
+        report("versioned, 12 releases", location, queries, before, stats, usage, disk_usage(location))
+
+if __name__ == "__main__":
+    main()
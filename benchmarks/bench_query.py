@@ -0,0 +1,69 @@
+"""
+Times read_table against what downstream consumers do now - load all of DeltaTable.csv and filter it -
+    and against reading the whole parquet table, for a few typical queries on a large synthetic table.
+
+    python -m benchmarks.bench_query [n_blocks] [n_years]
+"""
+import io
+import sys
+import tempfile
+import time
+import pandas as pd
+from benchmarks.synthetic import write_workbook
+from src.scraper import read_workbook
+from src.transform import transform_quarter_df
+from src.storage import save_parquet, read_parquet_table
+from src.query import read_table, matching_files
+
+def best_time(func, repeats: int = 3) -> tuple[float, object]:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def whole_csv(csv_path: str, filters: dict, columns: list[str]) -> pd.DataFrame:
+    df = pd.read_csv(csv_path)
+    for column, values in filters.items():
+        df = df[df[column].isin(values)]
+    return df[columns]
+
+def main():
+    n_blocks = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    n_years = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    buffer = io.BytesIO()
+    write_workbook(buffer, n_blocks=n_blocks, n_years=n_years)
+    published, info_df = read_workbook(io.BytesIO(buffer.getvalue()))
+    df = transform_quarter_df(info_df, published, "ET_3.1_JUL_24.xlsx")
+    last_year = int(df["year"].max())
+    queries = {
+        "one year, crude oil imports": {"years": [last_year], "categories": ["import"], "resources": ["crude oil & ngls"]},
+        "one quarter": {"years": [last_year], "quarters": [1]},
+        "ten years, exports": {"years": list(range(last_year - 9, last_year + 1)), "categories": ["export"]},
+        "crude oil, all years": {"resources": ["crude oil"]},
+    }
+    columns = ["resource", "category", "year", "quarter", "figures"]
+
+    with tempfile.TemporaryDirectory() as location:
+        location = f"{location}/"
+        df.to_csv(f"{location}DeltaTable.csv", index=False)
+        save_parquet(df, location)
+        read_table(location, years=[last_year]) # builds the partition index once
+        n_files = len(matching_files(location))
+        print(f"{len(df)} rows, {n_files} files")
+        print(f"{'query':<30} {'rows':>8} {'files':>7} {'csv + filter':>13} {'parquet all':>12} {'read_table':>11} {'speedup':>8}")
+        for label, query in queries.items():
+            filters = {k[:-1] if k != "categories" else "category": v for k, v in query.items()}
+            csv_time, expected = best_time(lambda: whole_csv(f"{location}DeltaTable.csv", filters, columns), repeats=1)
+            all_time, _ = best_time(lambda: read_parquet_table(location))
+            query_time, result = best_time(lambda: read_table(location, columns=columns, **query))
+            assert len(result) == len(expected)
+            files = len(matching_files(location, **query))
+            print(
+                f"{label:<30} {len(result):>8} {files:>7} {csv_time:>12.3f}s {all_time:>11.3f}s "
+                f"{query_time:>10.3f}s {csv_time / query_time:>7.0f}x"
+            )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Times diff_frames (hash join on one 64-bit key hash) against a merge on the four key columns,
+    for a release revising its last few quarters, on a large synthetic table.
+
+    python -m benchmarks.bench_revisions [n_blocks] [n_years]
+"""
+import sys
+import time
+from datetime import datetime
+import numpy as np
+from benchmarks.synthetic import quarter_frame
+from src.storage import merge_keys
+from src.transform import transform_quarter_df
+from src.revisions import diff_frames
+
+def best_time(func, repeats: int = 3) -> tuple[float, object]:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def merge_on_columns(stored, incoming):
+    joined = incoming[merge_keys + ["figures"]].merge(stored[merge_keys + ["figures"]], on=merge_keys, suffixes=("", "_old"))
+    same = (joined["figures"] == joined["figures_old"]) | (joined["figures"].isna() & joined["figures_old"].isna())
+    return joined[~same.to_numpy()]
+
+def main():
+    n_blocks = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    n_years = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    stored = transform_quarter_df(quarter_frame(n_blocks=n_blocks, n_years=n_years), datetime(2024, 6, 27), "ET_JUN.xlsx")
+    incoming = transform_quarter_df(quarter_frame(n_blocks=n_blocks, n_years=n_years), datetime(2024, 7, 30), "ET_JUL.xlsx")
+    periods = incoming["year"].astype(int) * 4 + incoming["quarter"].astype(int)
+    incoming.loc[periods > periods.max() - 4, "figures"] *= 1.01
+    # the stored table read back, with its own categories
+    stored = stored.sample(frac=1, random_state=0).reset_index(drop=True)
+
+    merge_time, expected = best_time(lambda: merge_on_columns(stored, incoming))
+    hash_time, revisions = best_time(lambda: diff_frames(stored, incoming))
+    assert len(revisions) == len(expected) and np.isclose(revisions["change"].abs().sum(), (expected["figures"] - expected["figures_old"]).abs().sum())
+    print(f"{len(incoming)} rows, {len(revisions)} revised")
+    print(f"{'merge on the key columns':<28} {merge_time:>8.3f}s")
+    print(f"{'diff_frames':<28} {hash_time:>8.3f}s ({merge_time / hash_time:.1f}x, with the full revisions table)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Startup cost of the daily no-op run - importing main.py, finding the workbook link on the landing page
+    and checking it against the manifest - measured with python -X importtime in a fresh interpreter.
+    Also checks none of the heavy dependencies (only needed to process a new file) get loaded on the way.
+
+    python -m benchmarks.bench_startup
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+heavy_modules = ["pandas", "numpy", "pandera", "pyarrow", "bs4", "dateutil", "openpyxl", "python_calamine"]
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# everything main() does when the file isn't new, bar the network request
+noop_script = """
+import json, sys
+import main
+from requests import Response
+response = Response()
+response.status_code = 200
+response._content = b'<a class="govuk-link gem-c-attachment__link" href="https://a/ET_3.1_JUL_24.xlsx">Supply and use of crude oil, natural gas liquids and feedstocks</a>'
+link = main.get_excel_link(response)
+main.confirm_new_file(main.retrieve_filename(link), csv_location=sys.argv[1])
+print(json.dumps(sorted(m for m in {heavy} if m in sys.modules)))
+"""
+
+def run_noop(importtime: bool = False) -> subprocess.CompletedProcess:
+    with tempfile.TemporaryDirectory() as location:
+        return subprocess.run(
+            [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", noop_script.format(heavy=heavy_modules), f"{location}/"],
+            cwd=root, capture_output=True, text=True, check=True
+        )
+
+def noop_path_modules() -> list[str]:
+    """
+    Heavy modules loaded by the no-op path - should be none
+    """
+    return json.loads(run_noop().stdout)
+
+def import_times(stderr: str) -> dict:
+    """
+    Cumulative import time in microseconds of each top level import, from -X importtime output
+    """
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit() and not name.startswith("  "): # top level, not nested
+            times[name.strip()] = int(cumulative)
+    return times
+
+def main():
+    runs = [run_noop(importtime=True) for _ in range(5)]
+    best = min(runs, key=lambda run: sum(import_times(run.stderr).values()))
+    times = import_times(best.stderr)
+    loaded = json.loads(best.stdout)
+
+    print(f"no-op path imports: {sum(times.values()) / 1000:.1f}ms (best of {len(runs)})")
+    for name, us in sorted(times.items(), key=lambda item: -item[1])[:10]:
+        print(f"  {name:<30} {us / 1000:>7.1f}ms")
+    print(f"heavy modules loaded: {loaded or 'none'}")
+    if loaded:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
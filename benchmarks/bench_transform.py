@@ -0,0 +1,128 @@
+"""
+Times the transforms on synthetic Quarter frames of growing size.
+
+    python -m benchmarks.bench_transform
+"""
+import time
+from datetime import datetime
+import pandas as pd
+from benchmarks.synthetic import quarter_frame
+from src.transform import (
+    retrieve_pie_category,
+    nullify_category_if_not_pie,
+    extract_pie_df,
+    melt_df,
+    clean_df,
+    add_dates,
+    add_filename,
+    transform_quarter_df,
+    transform_quarter_dfs,
+    compact_df
+)
+from src.data_integrity import output_schema_validation, output_check_duplicates
+
+def extract_pie_df_rowwise(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    extract_pie_df as it was before being vectorized, kept here as the reference
+    """
+    df_pie = df.copy()
+    df_pie["category"] = df_pie[df_pie.columns[0]].apply(retrieve_pie_category)
+    df_pie.insert(1, "category", df_pie.pop("category"))
+    df_pie["category"] = df_pie["category"].ffill()
+    df_pie["category"] = df_pie.apply(nullify_category_if_not_pie, axis=1)
+    df_pie["category"] = df_pie["category"].fillna("other")
+    return df_pie
+
+def best_of(func, *args, repeats: int = 3):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def bench_extract_pie_df():
+    print("extract_pie_df")
+    print(f"{'rows':>8} {'row-wise apply':>15} {'vectorized':>12} {'speedup':>8}")
+    for n_blocks in [1, 100, 1000, 5000]:
+        df = quarter_frame(n_blocks=n_blocks, n_years=2)
+        rowwise_time, expected = best_of(extract_pie_df_rowwise, df)
+        vectorized_time, result = best_of(extract_pie_df, df)
+        pd.testing.assert_frame_equal(result, expected)
+        print(f"{len(df):>8} {rowwise_time:>14.4f}s {vectorized_time:>11.4f}s {rowwise_time / vectorized_time:>7.1f}x")
+
+def transform_chain(df: pd.DataFrame) -> pd.DataFrame:
+    return (
+        df
+        .pipe(extract_pie_df)
+        .pipe(melt_df)
+        .pipe(clean_df)
+        .pipe(add_dates, published_date = datetime(2024, 7, 30))
+        .pipe(add_filename, filename = "ET_3.1_JUL_24.xlsx")
+    )
+
+def transform_fused(df: pd.DataFrame) -> pd.DataFrame:
+    return transform_quarter_df(df, datetime(2024, 7, 30), "ET_3.1_JUL_24.xlsx")
+
+def bench_transform_quarter_df():
+    print("extract_pie_df -> ... -> add_filename chain vs transform_quarter_df")
+    print(f"{'rows out':>10} {'chain':>10} {'fused':>10} {'speedup':>8} {'chain MB':>9} {'fused MB':>9}")
+    for n_blocks, n_years in [(1, 25), (20, 25), (100, 40), (500, 40)]:
+        df = quarter_frame(n_blocks=n_blocks, n_years=n_years)
+        chain_time, expected = best_of(transform_chain, df)
+        fused_time, result = best_of(transform_fused, df)
+        result["date_processed"] = expected["date_processed"]
+        result["date_published"] = expected["date_published"] # the one column csv output differs on would be the dtype
+        assert result.to_csv(index=False) == expected.to_csv(index=False)
+        chain_mb = expected.memory_usage(deep=True).sum() / 1e6
+        fused_mb = result.memory_usage(deep=True).sum() / 1e6
+        print(f"{len(result):>10} {chain_time:>9.3f}s {fused_time:>9.3f}s {chain_time / fused_time:>7.1f}x {chain_mb:>9.1f} {fused_mb:>9.1f}")
+
+def release_sheets(n_releases: int, n_blocks: int) -> list:
+    """
+    Quarterly releases of the same table, each a quarter longer than the one before, as a backfill would read them
+    """
+    return [
+        (quarter_frame(n_blocks=n_blocks, n_years=25 + r // 4, seed=r), datetime(2000 + r // 4, 3 * (r % 4) + 1, 28), f"ET_3.1_{r}.xlsx")
+        for r in range(n_releases)
+    ]
+
+def transform_each(sheets: list) -> pd.DataFrame:
+    return pd.concat([transform_quarter_df(df, published, filename) for df, published, filename in sheets], ignore_index=True)
+
+def bench_transform_quarter_dfs():
+    print("transform_quarter_df per release vs transform_quarter_dfs over all of them")
+    print(f"{'releases':>9} {'rows out':>10} {'per release':>12} {'batch':>10} {'speedup':>8}")
+    for n_releases, n_blocks in [(10, 1), (100, 1), (400, 1), (40, 20)]:
+        sheets = release_sheets(n_releases, n_blocks)
+        each_time, expected = best_of(transform_each, sheets)
+        batch_time, result = best_of(transform_quarter_dfs, sheets)
+        result["date_processed"] = expected["date_processed"]
+        pd.testing.assert_frame_equal(result, compact_df(expected))
+        print(f"{n_releases:>9} {len(result):>10} {each_time:>11.3f}s {batch_time:>9.3f}s {each_time / batch_time:>7.1f}x")
+
+def validate(df: pd.DataFrame) -> None:
+    output_schema_validation(df)
+    output_check_duplicates(df)
+
+def bench_output_memory():
+    print("output table - object vs compact dtypes")
+    print(f"{'rows out':>10} {'object MB':>10} {'compact MB':>11} {'reduction':>10} {'validate obj':>13} {'validate compact':>17}")
+    for n_blocks, n_years in [(1, 25), (100, 40), (500, 40)]:
+        df = quarter_frame(n_blocks=n_blocks, n_years=n_years)
+        object_df = transform_quarter_df(df, datetime(2024, 7, 30), "ET_3.1_JUL_24.xlsx", compact=False)
+        compact = transform_quarter_df(df, datetime(2024, 7, 30), "ET_3.1_JUL_24.xlsx", compact=True)
+        object_mb = object_df.memory_usage(deep=True).sum() / 1e6
+        compact_mb = compact.memory_usage(deep=True).sum() / 1e6
+        object_time, _ = best_of(validate, object_df, repeats=1)
+        compact_time, _ = best_of(validate, compact, repeats=1)
+        print(f"{len(compact):>10} {object_mb:>10.1f} {compact_mb:>11.1f} {object_mb / compact_mb:>9.1f}x {object_time:>12.3f}s {compact_time:>16.3f}s")
+
+def main():
+    bench_extract_pie_df()
+    bench_transform_quarter_df()
+    bench_transform_quarter_dfs()
+    bench_output_memory()
+
+if __name__ == "__main__":
+    main()
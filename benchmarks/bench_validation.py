@@ -0,0 +1,107 @@
+"""
+Times the data integrity checks on synthetic frames of growing size.
+
+    python -m benchmarks.bench_validation
+"""
+import time
+from datetime import datetime
+import pandera as pa
+from benchmarks.synthetic import quarter_frame
+from src.transform import transform_quarter_df
+from src.data_integrity import (
+    input_rows_check,
+    input_nulls_check,
+    input_duplicate_rows,
+    input_temporal_integrity,
+    input_allowable_negative_quantities,
+    input_check_report,
+    output_schema,
+    output_schema_validation,
+    output_check_duplicates
+)
+from src.validation_index import build_index, check_increment
+
+def best_of(func, *args, repeats: int = 5):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def separate_input_checks(df) -> None:
+    """
+    input_checks as it was - five checks, each scanning the frame again and stopping at its first failure
+    """
+    input_rows_check(df)
+    input_nulls_check(df)
+    input_duplicate_rows(df)
+    input_temporal_integrity(df)
+    input_allowable_negative_quantities(df)
+
+def bench_input_checks():
+    print("input checks - five separate checks vs one pass report")
+    print(f"{'rows':>8} {'quarters':>8} {'separate':>10} {'one pass':>10} {'speedup':>8}")
+    for n_blocks, n_years in [(1, 25), (100, 40), (1000, 40), (5000, 40)]:
+        df = quarter_frame(n_blocks=n_blocks, n_years=n_years)
+        separate_time, _ = best_of(separate_input_checks, df)
+        report_time, failures = best_of(input_check_report, df)
+        assert failures == []
+        print(f"{len(df):>8} {n_years * 4:>8} {separate_time:>9.4f}s {report_time:>9.4f}s {separate_time / report_time:>7.1f}x")
+
+def output_schema_validation_uncached(df) -> None:
+    """
+    output_schema_validation as it was - schema built on every call, date_processed checked row by row
+    """
+    schema = output_schema.__wrapped__(compact=False)
+    try:
+        schema.validate(df, lazy=True)
+    except pa.errors.SchemaErrors as e:
+        raise ValueError(f"Errors seen in {e.failure_cases['column'].unique()}")
+    assert df['date_processed'].apply(lambda x: x.strftime('%Y-%m-%d %H:%M:%S') == str(x)).all()
+
+def bench_output_validation():
+    print("output validation - as it was vs cached schema and vectorized date check (and sampled)")
+    print(f"{'rows out':>10} {'as it was':>10} {'now':>10} {'compact':>10} {'sample 10k':>11}")
+    for n_blocks, n_years in [(1, 25), (100, 40), (500, 40)]:
+        df = quarter_frame(n_blocks=n_blocks, n_years=n_years)
+        object_df = transform_quarter_df(df, datetime(2024, 7, 30), "ET_3.1_JUL_24.xlsx", compact=False)
+        compact = transform_quarter_df(df, datetime(2024, 7, 30), "ET_3.1_JUL_24.xlsx", compact=True)
+        old_time, _ = best_of(output_schema_validation_uncached, object_df, repeats=1)
+        new_time, _ = best_of(output_schema_validation, object_df, repeats=3)
+        compact_time, _ = best_of(output_schema_validation, compact, repeats=3)
+        sample_time, _ = best_of(lambda d: output_schema_validation(d, sample=10_000), object_df, repeats=3)
+        print(f"{len(object_df):>10} {old_time:>9.3f}s {new_time:>9.3f}s {compact_time:>9.3f}s {sample_time:>10.3f}s")
+
+def full_output_checks(df) -> None:
+    output_schema_validation(df)
+    output_check_duplicates(df)
+
+def bench_incremental_validation():
+    print("output checks - whole frame vs incremental against the stored index (latest year new, quarter before revised)")
+    print(f"{'stored':>10} {'workbook':>10} {'delta':>8} {'whole obj':>10} {'incr obj':>10} {'whole cpt':>10} {'incr cpt':>10}")
+    for n_blocks, n_years in [(1, 25), (100, 40), (500, 40)]:
+        df = quarter_frame(n_blocks=n_blocks, n_years=n_years)
+        workbook = {}
+        for compact in [False, True]:
+            workbook[compact] = transform_quarter_df(df, datetime(2024, 7, 30), "ET_3.1_JUL_24.xlsx", compact=compact)
+            last_year = workbook[compact]["year"] == workbook[compact]["year"].max()
+            revised = (workbook[compact]["year"] == workbook[compact]["year"].max() - 1) & (workbook[compact]["quarter"] == 4)
+            workbook[compact].loc[revised, "figures"] += 1
+        index = build_index(workbook[True][~last_year.to_numpy()])
+        timings = {}
+        for compact in [False, True]:
+            timings["whole", compact], _ = best_of(full_output_checks, workbook[compact], repeats=3)
+            timings["incremental", compact], stats = best_of(check_increment, index, workbook[compact], repeats=3)
+        print(
+            f"{len(index):>10} {len(workbook[True]):>10} {stats['delta']:>8} "
+            + " ".join(f"{timings[kind, compact]:>9.3f}s" for compact in [False, True] for kind in ["whole", "incremental"])
+        )
+
+def main():
+    bench_input_checks()
+    bench_output_validation()
+    bench_incremental_validation()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Times refreshing the materialized views after a typical release (one new quarter, the last few revised)
+    against rebuilding them, and reading shares from the view against reading and regrouping the parquet table.
+
+    python -m benchmarks.bench_views [n_blocks] [n_years]
+"""
+import sys
+import tempfile
+import time
+from datetime import datetime
+import numpy as np
+from benchmarks.synthetic import quarter_frame
+from src.transform import transform_quarter_df
+from src.storage import save_parquet
+from src.query import read_table
+from src.views import refresh_views, build_views, read_view
+
+def best_time(func, repeats: int = 3) -> tuple[float, object]:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def regroup_share(df):
+    totals = df.groupby(["year", "quarter", "category"], observed=True)["figures"].transform("sum")
+    return df.assign(share=df["figures"] / totals)
+
+def main():
+    n_blocks = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    n_years = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    history = transform_quarter_df(quarter_frame(n_blocks=n_blocks, n_years=n_years), datetime(2024, 7, 30), "ET.xlsx")
+    periods = history["year"].astype(int) * 4 + history["quarter"].astype(int)
+    last = periods.max()
+    stored = history[periods < last].reset_index(drop=True)
+    # next release - adds the last quarter and revises the four before it
+    release = history.copy()
+    release.loc[(periods >= last - 4) & (periods < last), "figures"] += 1
+
+    with tempfile.TemporaryDirectory() as location:
+        location = f"{location}/"
+        print(f"{len(history)} rows, {periods.nunique()} quarters")
+
+        def incremental():
+            refresh_views(stored, location, write_mode="overwrite")
+            start = time.perf_counter()
+            refresh_views(release, location)
+            return time.perf_counter() - start
+        refresh_time = min(incremental() for _ in range(3))
+        rebuild_time, _ = best_time(lambda: refresh_views(release, location, write_mode="overwrite"))
+        build_time, _ = best_time(lambda: build_views(release))
+        print(f"{'refresh, 5 quarters changed':<32} {refresh_time:>8.3f}s")
+        print(f"{'rebuild and save':<32} {rebuild_time:>8.3f}s ({rebuild_time / refresh_time:.1f}x)")
+        print(f"{'  of which building':<32} {build_time:>8.3f}s")
+
+        save_parquet(release, location)
+        for label, years in [("all years", None), ("one year", [int(release["year"].max())])]:
+            regroup_time, expected = best_time(lambda: regroup_share(read_table(location, years=years)))
+            view_time, shares = best_time(lambda: read_view("shares", location, years=years))
+            assert np.allclose(
+                expected.sort_values(["year", "quarter", "category", "resource"])["share"].to_numpy(),
+                shares["share"].to_numpy(), equal_nan=True
+            )
+            print(f"{'shares, ' + label + ', regrouped':<32} {regroup_time:>8.3f}s")
+            print(f"{'shares, ' + label + ', from view':<32} {view_time:>8.3f}s ({regroup_time / view_time:.1f}x)")
+
+if __name__ == "__main__":
+    main()
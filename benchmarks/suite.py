@@ -0,0 +1,164 @@
+"""
+Times every stage of the pipeline, and the pipeline end to end, on synthetic workbooks shaped like the real one
+    (see benchmarks/synthetic.py), from a few dozen rows up to millions of output rows. Results can be stored
+    as a baseline and later runs compared against it, to catch regressions on the same machine.
+
+    python -m benchmarks.suite                           # tiny, small and medium sizes
+    python -m benchmarks.suite --sizes all --save        # every size, stored as the baseline
+    python -m benchmarks.suite --compare                 # flags stages slower than the baseline by > tolerance
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+from benchmarks.synthetic import write_workbook, quarter_rows
+
+# name -> (resource blocks of 19 rows, years of quarter columns)
+sizes = {
+    "tiny": (2, 5),       # 38 rows x 20 quarters
+    "small": (1, 25),     # 19 rows x 100 quarters - about the real workbook
+    "medium": (100, 40),  # 1,900 rows x 160 quarters - 304k output rows
+    "large": (500, 40),   # 9,500 rows x 160 quarters - 1.5M output rows
+    "xlarge": (5000, 10), # 95,000 rows x 40 quarters - 3.8M output rows
+}
+default_sizes = ["tiny", "small", "medium"]
+slow_reader_limit = 100 # blocks - pd.read_excel is only timed up to this size, it takes minutes beyond
+baseline_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", "baseline.json")
+default_tolerance = 0.25
+min_slowdown = 0.005 # seconds - smaller differences are timer noise, whatever the ratio
+
+def best_of(func, repeats: int):
+    best, result = float("inf"), None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def run_size(n_blocks: int, n_years: int, repeats: int) -> dict:
+    """
+    Seconds (best of repeats) per stage for one workbook size
+    """
+    from src.excel_reader import calamine_available
+    from src.scraper import read_workbook
+    from src.transform import extract_pie_df, melt_df, clean_df, add_dates, add_filename, transform_quarter_df, save_csv
+    from src.data_integrity import input_schema_validation, input_checks, output_schema_validation, output_check_duplicates
+    from src.pipeline import transform_and_validate
+    from src.storage import save_parquet
+
+    buffer = io.BytesIO()
+    write_workbook(buffer, n_blocks=n_blocks, n_years=n_years)
+    data = buffer.getvalue()
+    published, filename = datetime(2024, 7, 30), "ET_3.1_JUL_24.xlsx"
+    timings = {}
+
+    def timed(name, func, times: int = repeats):
+        timings[name], result = best_of(func, times)
+        return result
+
+    # reading
+    if n_blocks <= slow_reader_limit:
+        timed("get_info read_excel", lambda: read_workbook(io.BytesIO(data), fast_reader=False), times=1)
+    _, info_df = timed("get_info openpyxl", lambda: read_workbook(io.BytesIO(data), engine="openpyxl"))
+    if calamine_available():
+        timed("get_info calamine", lambda: read_workbook(io.BytesIO(data), engine="calamine"))
+
+    # checks and transforms
+    timed("input_schema_validation", lambda: input_schema_validation(info_df))
+    timed("input_checks", lambda: input_checks(info_df))
+    df = timed("extract_pie_df", lambda: extract_pie_df(info_df))
+    df = timed("melt_df", lambda: melt_df(df.copy())) # melt_df renames the columns of its input
+    df = timed("clean_df", lambda: clean_df(df))
+    df = timed("add_dates", lambda: add_dates(df, published))
+    timed("add_filename", lambda: add_filename(df, filename))
+    final_df = timed("transform_quarter_df", lambda: transform_quarter_df(info_df, published, filename))
+    timed("output_schema_validation", lambda: output_schema_validation(final_df))
+    timed("output_check_duplicates", lambda: output_check_duplicates(final_df))
+
+    # saving, and the whole thing
+    with tempfile.TemporaryDirectory() as location:
+        location = f"{location}/"
+        timed("save_csv", lambda: save_csv(final_df, location), times=1)
+        timed("save_parquet", lambda: save_parquet(final_df, f"{location}parquet/"), times=1)
+
+        def end_to_end():
+            published_date_ts, info = read_workbook(io.BytesIO(data))
+            save_csv(transform_and_validate(info, published_date_ts, filename), location)
+        timed("end to end (csv)", end_to_end, times=1)
+    return timings
+
+def machine() -> dict:
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version()
+    }
+
+def run_suite(size_names: list[str], repeats: int = 3) -> dict:
+    results = {"machine": machine(), "created": datetime.now().isoformat(timespec="seconds"), "sizes": {}}
+    for name in size_names:
+        n_blocks, n_years = sizes[name]
+        rows = len(quarter_rows(n_blocks, n_years)) - 1
+        print(f"{name}: {rows} rows x {n_years * 4} quarters", flush=True)
+        timings = run_size(n_blocks, n_years, repeats=repeats if n_blocks <= slow_reader_limit else 1)
+        results["sizes"][name] = {"rows": rows, "quarters": n_years * 4, "seconds": timings}
+        for stage, seconds in timings.items():
+            print(f"  {stage:<26} {seconds:>10.4f}s")
+    return results
+
+def compare(results: dict, baseline: dict, tolerance: float = default_tolerance) -> list[dict]:
+    """
+    Stages slower than in the baseline by more than tolerance (0.25 = 25%) and min_slowdown, for the sizes both have
+    """
+    regressions = []
+    for name, size in results["sizes"].items():
+        stored = baseline["sizes"].get(name, {}).get("seconds", {})
+        for stage, seconds in size["seconds"].items():
+            if stage in stored and seconds > stored[stage] * (1 + tolerance) and seconds - stored[stage] > min_slowdown:
+                regressions.append({"size": name, "stage": stage, "baseline": stored[stage], "now": seconds, "ratio": round(seconds / stored[stage], 2)})
+    return regressions
+
+def save_results(results: dict, path: str = baseline_path) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=1)
+
+def load_results(path: str = baseline_path) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def main():
+    parser = argparse.ArgumentParser(description="pipeline benchmark suite on synthetic workbooks")
+    parser.add_argument("--sizes", default=",".join(default_sizes), help=f"comma separated, or 'all': {', '.join(sizes)}")
+    parser.add_argument("--repeats", type=int, default=3, help="best of this many runs per stage (sizes up to medium)")
+    parser.add_argument("--save", action="store_true", help=f"store the results as the baseline ({baseline_path})")
+    parser.add_argument("--compare", action="store_true", help="compare against the stored baseline, exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=default_tolerance, help="slowdown allowed before a stage counts as a regression")
+    parser.add_argument("--baseline", default=baseline_path)
+    args = parser.parse_args()
+
+    size_names = list(sizes) if args.sizes == "all" else args.sizes.split(",")
+    results = run_suite(size_names, repeats=args.repeats)
+
+    if args.compare:
+        baseline = load_results(args.baseline)
+        if baseline["machine"] != results["machine"]:
+            print(f"warning - baseline was taken on another machine: {baseline['machine']}")
+        regressions = compare(results, baseline, tolerance=args.tolerance)
+        for r in regressions:
+            print(f"REGRESSION {r['size']} {r['stage']}: {r['baseline']:.4f}s -> {r['now']:.4f}s ({r['ratio']}x)")
+        print(f"{len(regressions)} regressions against the baseline from {baseline['created']}")
+    if args.save:
+        save_results(results, args.baseline)
+        print(f"baseline saved to {args.baseline}")
+    if args.compare and regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
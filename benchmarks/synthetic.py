@@ -0,0 +1,120 @@
+import random
+from openpyxl import Workbook
+
+# one block of the Quarter sheet, as laid out in the Energy Trends oil workbook
+# (resource, whether its figures can be negative)
+resource_block = [
+    ("Indigenous production", False),
+    ("Crude oil [note 1]", False),
+    ("NGLs [note 2]", False),
+    ("Feedstocks [note 3]", False),
+    ("Imports", False),
+    ("Crude oil & NGLs [note 4]", False),
+    ("Feedstocks", False),
+    ("Exports", False),
+    ("Crude oil & NGLs", False),
+    ("Feedstocks", False),
+    ("Stock change [note 5]", True),
+    ("Transfers", True),
+    ("Total supply", False),
+    ("Statistical difference [note 6]", True),
+    ("Total demand", False),
+    ("Transformation", False),
+    ("Petroleum refineries", False),
+    ("Energy industry use", False),
+    ("Oil & gas extraction", False),
+]
+
+def quarter_headers(n_years: int, start_year: int = 1999) -> list[str]:
+    ordinals = ["1st", "2nd", "3rd", "4th"]
+    return [f"{start_year + y} {ordinals[q]} quarter" for y in range(n_years) for q in range(4)]
+
+def quarter_rows(n_blocks: int = 1, n_years: int = 25, start_year: int = 1999, seed: int = 0) -> list[list]:
+    """
+    Header plus n_blocks * len(resource_block) rows of figures, one column per quarter.
+        Resources past the first block get the block number (ahead of any note), so rows never repeat.
+    """
+    rng = random.Random(seed)
+    rows = [["Column1"] + quarter_headers(n_years, start_year)]
+    for b in range(n_blocks):
+        for resource, can_be_negative in resource_block:
+            name, bracket, note = resource.partition(" [")
+            name = resource if b == 0 else f"{name} {b}{bracket}{note}"
+            low = -5000 if can_be_negative else 0
+            rows.append([name] + [round(rng.uniform(low, 40000), 2) for _ in range(n_years * 4)])
+    return rows
+
+def write_workbook(
+    path,
+    n_blocks: int = 1,
+    n_years: int = 25,
+    start_year: int = 1999,
+    published: str = "30 July 2024",
+    seed: int = 0
+):
+    """
+    Writes a workbook shaped like the real one - Cover Sheet text in A4, 
+        Quarter sheet with 4 title rows then the header. path can be a file path or a binary buffer.
+    """
+    wb = Workbook(write_only=True)
+    cover = wb.create_sheet("Cover Sheet")
+    cover.append(["Energy Trends: UK oil and oil products"])
+    cover.append([])
+    cover.append([])
+    cover.append([f"This spreadsheet was published {published}\nNext update: the following month"])
+    cover.append(["Contact: energy.stats@example.gov.uk"])
+
+    quarter = wb.create_sheet("Quarter")
+    quarter.append(["Supply and use of crude oil, natural gas liquids and feedstocks (thousand tonnes)"])
+    quarter.append(["Quarterly data"])
+    quarter.append([])
+    quarter.append(["Figures are provisional"])
+    for row in quarter_rows(n_blocks, n_years, start_year, seed):
+        quarter.append(row)
+    wb.save(path)
+    return path
+
+def quarter_frame(n_blocks: int = 1, n_years: int = 25, start_year: int = 1999, seed: int = 0):
+    """
+    The frame get_info hands to the transforms (resource column lowercased), without going through excel
+    """
+    import pandas as pd
+    rows = quarter_rows(n_blocks, n_years, start_year, seed)
+    df = pd.DataFrame(rows[1:], columns=rows[0])
+    df[df.columns[0]] = df[df.columns[0]].str.lower()
+    return df
+
+# attachment titles of the Energy Trends oil section page, the crude oil table being the one the pipeline looks for
+attachment_titles = [
+    "Supply and use of crude oil, natural gas liquids and feedstocks (ET 3.1 - quarterly)",
+    "Supply and use of crude oil, natural gas liquids and feedstocks (ET 3.2 - monthly)",
+    "Supply and use of petroleum products (ET 3.4 - quarterly)",
+    "Supply and use of petroleum products (ET 3.5 - annual)",
+    "Deliveries of petroleum products for inland consumption (ET 3.13)",
+]
+
+def landing_page_html(n_attachments: int = 5, filler_paragraphs: int = 200, target_position: float = 0.0) -> bytes:
+    """
+    A page shaped like a gov.uk statistics page - header and navigation markup, attachment blocks 
+        (with the crude oil table at target_position, 0 = first, 1 = last), then a long footer.
+    """
+    filler = "".join(
+        f'<p class="govuk-body">Paragraph {i} of the methodology notes, with <a href="/guidance/{i}">a link</a>.</p>\n'
+        for i in range(filler_paragraphs)
+    )
+    others = [t for t in attachment_titles if "ET 3.1" not in t]
+    titles = [f"{others[i % len(others)]} [{i}]" for i in range(n_attachments - 1)]
+    titles.insert(round(target_position * (n_attachments - 1)), attachment_titles[0])
+    attachments = "".join(
+        '<section class="gem-c-attachment"><h3 class="gem-c-attachment__title">\n'
+        f'<a class="govuk-link gem-c-attachment__link" href="https://assets.publishing.service.gov.uk/media/{i}/ET_{i}.xlsx">{title}</a>\n'
+        '</h3><p class="gem-c-attachment__metadata">MS Excel Spreadsheet, 120 KB</p></section>\n'
+        for i, title in enumerate(titles)
+    )
+    page = (
+        '<!DOCTYPE html><html lang="en"><head><meta charset="utf-8"><title>Oil and oil products: section 3 energy trends - GOV.UK</title></head>\n'
+        f'<body><header class="govuk-header">{filler[: len(filler) // 4]}</header>\n'
+        f'<main class="govuk-main-wrapper">{attachments}</main>\n'
+        f'<footer class="govuk-footer">{filler}</footer></body></html>'
+    )
+    return page.encode("utf-8")
@@ -1,4 +1,4 @@
-import pandas as pd 
+import argparse
 import logging
 from datetime import datetime
 from src.scraper import (
@@ -8,20 +8,12 @@ from src.scraper import (
     confirm_new_file, 
     get_info
 )
-from src.transform import (
-    extract_pie_df, 
-    melt_df,
-    clean_df,  
-    add_dates, 
-    add_filename, 
-    save_csv
-)
-from src.data_integrity import (
-    input_schema_validation, 
-    input_checks, 
-    output_schema_validation, 
-    output_check_duplicates
-)
+from src.http_client import cache_stats, content_sha256
+from src.manifest import load_manifest, save_manifest, record_ingest
+from src.datasets import datasets, get_dataset
+from src.instrumentation import instrumented_run
+# pandas, pandera and the rest of the processing code are only imported once a new file is found,
+# so the usual daily run (nothing new) starts fast - see benchmarks/bench_startup.py
 
 logging.basicConfig(
     filename=f"logs/{datetime.today().strftime('%Y-%m-%d')}_log.log",
@@ -35,58 +27,187 @@ logging.basicConfig(
 
 gov_link = "https://www.gov.uk/government/statistics/oil-and-oil-products-section-3-energy-trends"
 csv_location = "submit_csv/" # can also make this "" if you'd like to store in root directory
+http_cache_dir = ".http_cache/" # ETag/Last-Modified cache, so unchanged pages and workbooks aren't downloaded again
+download_if_not_new = True # Toggle On to see if code runs smoothly
+output_format = "csv" # "csv" for DeltaTable.csv, or "parquet" for a DeltaTable folder partitioned by year and quarter
+write_mode = "merge" # "merge" upserts on (year, quarter, category, resource), "overwrite" replaces the table with this run's rows
+# "versioned" (parquet only) also upserts, but keeps a transaction log so the table can be read as of a published date
+incremental_validation = True # checks only rows new or changed since the last ingest, against a key index of the stored table
+materialized_views = True # keeps category totals, resource shares and quarter/year changes in views/, refreshed on each ingest
+track_revisions = True # records the stored figures each release revises in revisions/, one file per release
+metrics_path = f"logs/{datetime.today().strftime('%Y-%m-%d')}_metrics.jsonl" # wall/CPU time, peak memory and rows of each stage, one json line each
+trace_memory = True # peak memory per stage with tracemalloc - slows the run down a little
+profile_run = False # also dumps a cProfile of the run to logs/<run id>.prof
 
 def main():
-    try:
+    run_id = datetime.now().strftime('%Y%m%d-%H%M%S')
+    with instrumented_run(
+        metrics_path, 
+        trace_memory = trace_memory, 
+        profile_path = f"logs/{run_id}.prof" if profile_run else None, 
+        run_id = run_id
+    ):
+        try:
         
-        # gets response from provided url
-        gov_response = extract_from_link(link=gov_link, retries=2)
-
-        # finds the relevant excel link embedded in html content of response
-        excel_link = get_excel_link(gov_response)
-
-        # extracts file name
-        excel_filename = retrieve_filename(excel_link)
-
-        # checks if new - if not, exits function (logs that file exists)
-        if not confirm_new_file(
-            current_filename = excel_filename, 
-            download_if_not_new = True, # Toggle On to see if code runs smoothly
-            csv_location = csv_location
-        ):
-            logging.info("File data seems to have been ingested already")
-            return # exits if a new file is NOT found
+            # gets response from provided url
+            gov_response = extract_from_link(link=gov_link, retries=2, cache_dir=http_cache_dir)
+
+            # finds the relevant excel link embedded in html content of response
+            excel_link = get_excel_link(gov_response)
+
+            # extracts file name
+            excel_filename = retrieve_filename(excel_link)
+
+            # checks if new - if not, exits function (logs that file exists)
+            if not confirm_new_file(
+                current_filename = excel_filename, 
+                download_if_not_new = download_if_not_new,
+                csv_location = csv_location,
+                excel_link = excel_link
+            ):
+                logging.info("File data seems to have been ingested already")
+                return # exits if a new file is NOT found
         
-        # extracts response from excel url
-        excel_response = extract_from_link(link=excel_link, retries=2)
+            # extracts response from excel url
+            excel_response = extract_from_link(link=excel_link, retries=2, cache_dir=http_cache_dir, stream=True)
+
+            # same filename can be republished with different content - compares against the last ingested hash
+            content_hash = content_sha256(excel_response)
+            if not confirm_new_file(
+                current_filename = excel_filename, 
+                download_if_not_new = download_if_not_new,
+                csv_location = csv_location,
+                content_hash = content_hash
+            ):
+                logging.info("File content unchanged since it was last ingested")
+                return
+
+            from src.pipeline import transform_and_validate, save_release
+            from src.validation_index import load_index
 
-        # gets the published date and relevant cells from relevant worksheet of excel file
-        published_date_ts, info_df = get_info(excel_response)
+            # gets the published date and relevant cells from relevant worksheet of excel file
+            published_date_ts, info_df = get_info(excel_response)
 
-        # validates input schema
-        input_schema_validation(info_df)
+            # validates input schema and integrity of the excel file, transforms (one fused pass equivalent to
+            #   extract_pie_df -> melt_df -> clean_df -> add_dates -> add_filename), then validates the output
+            index = load_index(csv_location) if incremental_validation else None
+            final_df = transform_and_validate(info_df, published_date = published_date_ts, filename = excel_filename, index = index)
 
-        # integrity checks for excel file
-        input_checks(info_df)
+            # saves to final destination, and brings the validation index, views and revision feed up to date with it
+            save_release(
+                final_df, 
+                csv_location, 
+                output_format = output_format, 
+                write_mode = write_mode, 
+                published_date = published_date_ts, 
+                filename = excel_filename, 
+                index = index, 
+                views = materialized_views, 
+                revisions = track_revisions
+            )
 
-        # transformations
-        final_df = (
-            info_df
-            .pipe(extract_pie_df)
-            .pipe(melt_df)
-            .pipe(clean_df)
-            .pipe(add_dates, published_date = published_date_ts)
-            .pipe(add_filename, filename = excel_filename)
-        )
+            # records the ingest, so the next run's new file check is a lookup
+            manifest = load_manifest(csv_location)
+            record_ingest(
+                manifest, 
+                filename = excel_filename, 
+                url = excel_link, 
+                content_hash = content_hash, 
+                published_date = published_date_ts.date(), 
+                rows = len(final_df)
+            )
+            save_manifest(manifest, csv_location)
+        except Exception as e:
+            logging.exception(f"Error seen: {e}")
+        finally:
+            logging.info(f"HTTP cache - {cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['bytes_saved']} bytes saved")
 
-        # validates output schema
-        output_schema_validation(final_df)
-        output_check_duplicates(final_df) # easier to do here than with input
+def run_backfill(args: argparse.Namespace) -> None:
+    from src.backfill import load_sources, backfill
+    progress = backfill(
+        load_sources(args.sources), 
+        csv_location, 
+        output_format = args.output_format, 
+        write_mode = args.write_mode, 
+        download_dir = args.download_dir, 
+        cache_dir = http_cache_dir, 
+        download_workers = args.download_workers, 
+        parse_workers = args.parse_workers, 
+        validation_sample = args.validation_sample,
+        views = materialized_views,
+        revisions = track_revisions
+    )
+    print(f"Backfill finished - {progress}")
 
-        # saves to final destination
-        save_csv(final_df, csv_location)
-    except Exception as e:
-        logging.exception(f"Error seen: {e}")
+def run_datasets_command(args: argparse.Namespace) -> None:
+    import asyncio
+    from src.runner import run_datasets
+    selected = {name: get_dataset(name) for name in (args.names or datasets)}
+    statuses = asyncio.run(run_datasets(
+        selected, 
+        csv_location, 
+        cache_dir = http_cache_dir, 
+        output_format = output_format, 
+        write_mode = write_mode, 
+        download_if_not_new = download_if_not_new, 
+        download_dir = args.download_dir, 
+        views = materialized_views, 
+        revisions = track_revisions, 
+        max_concurrency = args.max_concurrency, 
+        parse_workers = args.parse_workers
+    ))
+    for status in statuses:
+        print(f"{status['dataset']} - {status['status']} ({status['filename']}, {status['rows']} rows)")
+
+def run_optimize(args: argparse.Namespace) -> None:
+    import time
+    from src.query import read_table
+    from src.maintenance import optimize, vacuum
+
+    def scan_time() -> float:
+        start = time.perf_counter()
+        read_table(csv_location)
+        return time.perf_counter() - start
+
+    before = scan_time()
+    stats = optimize(csv_location, zorder = args.zorder)
+    after = scan_time()
+    print(f"Optimize - {stats}, full scan {before:.3f}s before, {after:.3f}s after")
+    if args.vacuum:
+        removed = vacuum(csv_location, retain_versions = args.retain_versions, dry_run = args.dry_run)
+        print(f"Vacuum - {len(removed)} files {'to remove' if args.dry_run else 'removed'}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Energy Trends data pipeline - with no command, checks gov_link for a new workbook")
+    commands = parser.add_subparsers(dest="command")
+
+    backfill_parser = commands.add_parser("backfill", help="ingest past workbooks from a list of urls or local files")
+    backfill_parser.add_argument("sources", help="text file with one url/path per line, or a json list/ingestion manifest")
+    backfill_parser.add_argument("--output-format", default=output_format, choices=["csv", "parquet"], help="defaults to output_format")
+    backfill_parser.add_argument("--write-mode", default=write_mode, choices=["merge", "overwrite", "versioned"], help="defaults to write_mode")
+    backfill_parser.add_argument("--download-dir", default="downloads/")
+    backfill_parser.add_argument("--download-workers", type=int, default=4)
+    backfill_parser.add_argument("--parse-workers", type=int, default=None, help="defaults to the number of CPUs")
+    backfill_parser.add_argument("--validation-sample", type=int, default=None, help="check the output schema on this many sampled rows per workbook")
+
+    datasets_parser = commands.add_parser("datasets", help="check several Energy Trends sections at once (see src/datasets.py)")
+    datasets_parser.add_argument("names", nargs="*", help=f"datasets to run, all by default: {', '.join(datasets)}")
+    datasets_parser.add_argument("--max-concurrency", type=int, default=4, help="requests in flight at once, across all datasets")
+    datasets_parser.add_argument("--download-dir", default="downloads/", help="workbooks are kept here while they are parsed")
+    datasets_parser.add_argument("--parse-workers", type=int, default=None, help="defaults to the number of CPUs")
+
+    optimize_parser = commands.add_parser("optimize", help="compact and cluster the stored table's files, then optionally vacuum")
+    optimize_parser.add_argument("--zorder", action="store_true", help="Z-order rows on category and resource instead of sorting")
+    optimize_parser.add_argument("--vacuum", action="store_true", help="also delete files no retained version uses")
+    optimize_parser.add_argument("--retain-versions", type=int, default=None, help="versions to keep readable besides the latest (all by default)")
+    optimize_parser.add_argument("--dry-run", action="store_true", help="list the files vacuum would delete")
+
+    args = parser.parse_args()
+    if args.command == "backfill":
+        run_backfill(args)
+    elif args.command == "datasets":
+        run_datasets_command(args)
+    elif args.command == "optimize":
+        run_optimize(args)
+    else:
+        main()
\ No newline at end of file
@@ -0,0 +1,30 @@
+import os
+from typing import Callable
+
+# no pandas/pyarrow here - the manifest and http cache use it on the startup path (see benchmarks/bench_startup.py)
+
+def atomic_write(path: str, write: Callable, mode: str | None = None, tmp_path: str | None = None) -> str:
+    """
+    Writes path through a temp file next to it and a rename, so readers (and a run after a crash) only ever
+        see the old file or the whole new one. The folder is created if needed, and the temp file removed
+        if writing fails. Returns path.
+
+    write is given the temp path (e.g. df.to_parquet) - or with mode ("w" or "wb"), the temp file opened in it.
+        tmp_path overrides the default <path>.tmp.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = tmp_path or f"{path}.tmp"
+    try:
+        if mode is None:
+            write(tmp_path)
+        else:
+            with open(tmp_path, mode, **({} if "b" in mode else {"encoding": "utf-8"})) as f:
+                write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+import pandas as pd
+from src.scraper import extract_from_link, retrieve_filename
+from src.http_client import save_body
+from src.atomic import atomic_write
+from src.manifest import load_manifest, save_manifest, record_ingest, is_new_content, latest_published
+from src.pipeline import parse_workbook, save_release
+from src.transform import compact_df
+
+def load_sources(sources_path: str) -> list[str]:
+    """
+    Workbook urls or local paths to backfill, from either:
+        - a text file with one per line (blank lines and lines starting with # are skipped)
+        - a json file with a list of them, or an ingestion manifest (its 'ingests' urls are used)
+    """
+    with open(sources_path, "r", encoding="utf-8") as f:
+        if sources_path.endswith(".json"):
+            content = json.load(f)
+            if isinstance(content, dict):
+                content = [ingest["url"] for ingest in content.get("ingests", []) if ingest.get("url")]
+            sources = [str(source) for source in content]
+        else:
+            sources = [line.strip() for line in f if line.strip() and not line.strip().startswith("#")]
+    return list(dict.fromkeys(sources)) # drops repeats, keeps order
+
+def is_url(source: str) -> bool:
+    return source.startswith("http://") or source.startswith("https://")
+
+def file_sha256(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+def fetch_source(source: str, download_dir: str, cache_dir: str | None = None) -> tuple[str, str]:
+    """
+    Local path and content hash of a workbook - urls are streamed into download_dir first. A download that
+        already finished on an earlier (crashed) run is reused, as files only get their final name once complete.
+    """
+    if not is_url(source):
+        return source, file_sha256(source)
+    url_key = hashlib.sha256(source.encode("utf-8")).hexdigest()[:12]
+    path = os.path.join(download_dir, f"{url_key}-{retrieve_filename(source)}")
+    if os.path.exists(path):
+        return path, file_sha256(path)
+    response = extract_from_link(link=source, retries=3, delay=2, cache_dir=cache_dir, stream=True)
+    save_body(response, path)
+    return path, file_sha256(path)
+
+def parse_to_file(path: str, filename: str, parsed_path: str, validation_sample: int | None = None) -> datetime:
+    """
+    parse_workbook, with the frame written to parsed_path (parquet) instead of being returned - so only the 
+        published date comes back from the worker, and the backfill never holds more than one release in memory
+    """
+    published_date_ts, final_df = parse_workbook(path, filename, validation_sample=validation_sample)
+    atomic_write(parsed_path, lambda tmp_path: final_df.to_parquet(tmp_path, index=False))
+    return published_date_ts
+
+def backfill(
+    sources: list[str],
+    location: str,
+    output_format: str = "parquet",
+    write_mode: str = "versioned",
+    download_dir: str = "downloads/",
+    cache_dir: str | None = None,
+    download_workers: int = 4,
+    parse_workers: int | None = None, 
+    validation_sample: int | None = None,
+    views: bool = False,
+    revisions: bool = False
+) -> dict:
+    """
+    Ingests many past workbooks at once:
+        - urls are downloaded concurrently on a bounded thread pool
+        - each workbook is parsed, checked and transformed on a process pool as soon as it is local, and the
+            result is written to download_dir/parsed/ - memory doesn't grow with the number of workbooks
+        - results are read back and committed one at a time in published date order, so a versioned table's
+            history (and as_of reads) come out the same as if the releases had been ingested as they came out
+        - a release published before the newest one already in the table (e.g. a source that failed on an
+            earlier run, retried) is refused rather than committed: its figures would overwrite newer ones,
+            and as_of would no longer work. Such releases are counted under "refused" and logged as errors -
+            to add them, backfill every source again into a new location.
+
+    validation_sample, if given, checks the output schema of each workbook on that many sampled rows.
+        With views, the materialized views (src/views.py) are refreshed after each commit, and with revisions
+        the figures each workbook revises are added to the revision feed (src/revisions.py).
+
+    Resumable - every commit is recorded in the ingestion manifest straight away, and workbooks already
+        in it (same filename and content hash) are skipped, as are finished downloads.
+    """
+    manifest = load_manifest(location)
+    parsed_dir = os.path.join(download_dir, "parsed")
+    os.makedirs(parsed_dir, exist_ok=True)
+    progress = {"sources": len(sources), "fetched": 0, "skipped": 0, "parsed": 0, "committed": 0, "failed": 0, "refused": 0}
+    parsed = []
+
+    def report(stage: str, source: str) -> None:
+        logging.info(f"Backfill {stage} {source} - {progress}")
+
+    with ThreadPoolExecutor(max_workers=download_workers) as downloads, ProcessPoolExecutor(max_workers=parse_workers) as parsers:
+        fetches = {downloads.submit(fetch_source, source, download_dir, cache_dir): source for source in sources}
+        parses = {}
+        for future in as_completed(fetches):
+            source = fetches[future]
+            try:
+                path, content_hash = future.result()
+            except Exception as e:
+                progress["failed"] += 1
+                logging.exception(f"Backfill download failed for {source}: {e}")
+                continue
+            progress["fetched"] += 1
+
+            filename = retrieve_filename(source)
+            if not is_new_content(manifest, filename, content_hash=content_hash):
+                progress["skipped"] += 1
+                report("skipped (already ingested)", source)
+                continue
+            parsed_path = os.path.join(parsed_dir, f"{content_hash[:16]}-{filename}.parquet")
+            parses[parsers.submit(parse_to_file, path, filename, parsed_path, validation_sample)] = (source, filename, content_hash, parsed_path)
+            report("fetched", source)
+
+        for future in as_completed(parses):
+            source, filename, content_hash, parsed_path = parses[future]
+            try:
+                published_date_ts = future.result()
+            except Exception as e:
+                progress["failed"] += 1
+                logging.exception(f"Backfill parse failed for {source}: {e}")
+                continue
+            progress["parsed"] += 1
+            parsed.append((published_date_ts, filename, source, content_hash, parsed_path))
+            report("parsed", source)
+
+    latest = latest_published(manifest)
+    for published_date_ts, filename, source, content_hash, parsed_path in sorted(parsed, key=lambda p: (p[0], p[1])):
+        if latest is not None and str(published_date_ts.date()) < latest:
+            progress["refused"] += 1
+            logging.error(
+                f"Backfill refused {source} - published {published_date_ts.date()}, before the newest release in "
+                f"the table ({latest}), so committing it would overwrite newer figures"
+            )
+            os.remove(parsed_path)
+            continue
+        final_df = compact_df(pd.read_parquet(parsed_path))
+        save_release(
+            final_df,
+            location,
+            output_format = output_format,
+            write_mode = write_mode,
+            published_date = published_date_ts,
+            filename = filename,
+            views = views,
+            revisions = revisions
+        )
+        record_ingest(
+            manifest,
+            filename = filename,
+            url = source if is_url(source) else None,
+            content_hash = content_hash,
+            published_date = published_date_ts.date(),
+            rows = len(final_df)
+        )
+        save_manifest(manifest, location)
+        os.remove(parsed_path)
+        progress["committed"] += 1
+        report("committed", source)
+
+    return progress
@@ -1,7 +1,27 @@
+import functools
+import logging
 import numpy as np
 import pandas as pd 
 import pandera as pa 
-from src.transform import retrieve_year_quarter
+from src.transform import retrieve_year_quarter, is_compact
+from src.instrumentation import instrumented
+
+# rules of the input checks, shared by the separate checks and the single pass engine (input_check_report)
+min_rows = 10
+min_keyword_counts = {
+    "production": 1, 
+    "import": 1, 
+    "export": 1, 
+    "crude oil": 3, 
+    "ngls": 3, 
+    "feedstock": 3
+}
+max_null_share = 0.1
+negatives_allowed = (
+    "stock change", 
+    "transfers", 
+    "statistical difference"
+)
 
 def input_rows_check(df: pd.DataFrame) -> None:
     """
@@ -18,24 +38,15 @@ def input_rows_check(df: pd.DataFrame) -> None:
     """
 
     # minimum row count
-    assert len(df) >= 10, "input excel - too little rows, please investigate"
+    assert len(df) >= min_rows, "input excel - too little rows, please investigate"
 
     # expected values and value counts 
-    val_cnts_min = {
-        "production": 1, 
-        "import": 1, 
-        "export": 1, 
-        "crude oil": 3, 
-        "ngls": 3, 
-        "feedstock": 3
-    }
-
     val_cnts = {}
 
-    for k in val_cnts_min:
+    for k in min_keyword_counts:
         val_cnts[k] = (df[df.columns[0]].str.contains(k)).sum()
 
-    assert all(val_cnts[key] >= val_cnts_min[key] for key in val_cnts_min), "input excel - not enough repetitions of materials"
+    assert all(val_cnts[key] >= min_keyword_counts[key] for key in min_keyword_counts), "input excel - not enough repetitions of materials"
 
 def input_duplicate_rows(df: pd.DataFrame) -> None:
     """
@@ -49,7 +60,7 @@ def input_nulls_check(df: pd.DataFrame) -> None:
     - ensures there are no nulls in column 1
     """
     assert not df[df.columns[0]].isnull().any(), "input excel - unexpected nulls in first column, resources"
-    assert df.iloc[:, 1:].isnull().mean().mean() <= 0.1, "input excel - nulls make up more than 10% of dataset, please investigate"
+    assert df.iloc[:, 1:].isnull().mean().mean() <= max_null_share, "input excel - nulls make up more than 10% of dataset, please investigate"
 
 def input_temporal_integrity(df: pd.DataFrame) -> None:
     """
@@ -76,26 +87,97 @@ def input_allowable_negative_quantities(df: pd.DataFrame) -> None:
     """
     Checks if there are any negative values for resources that don't expect a negative value
     """
-    starts_with = (
-        "stock change", 
-        "transfers", 
-        "statistical difference"
-    )
+    starts_with = negatives_allowed
 
     condition_df = df[~df[df.columns[0]].str.lower().str.startswith(starts_with)]
 
     assert (condition_df[df.columns[1:]] >= 0).all().all(), "input excel - negative values for unexpected resources"
 
+def input_check_report(df: pd.DataFrame) -> list[dict]:
+    """
+    Same rules as input_rows_check, input_nulls_check, input_duplicate_rows, input_temporal_integrity and 
+        input_allowable_negative_quantities, run in one pass. Nothing stops at the first failure - 
+        every failing rule is returned as {"rule", "message", "detail"}, so one run shows all the problems.
+
+    What the rules share is worked out once: the lowercased resource column, one mask per keyword, 
+        the figures as a float array with its null mask, and the parsed column headers. 
+        Duplicate rows are found by row hash rather than by comparing every column.
+    """
+    failures = []
+
+    def fail(rule: str, message: str, **detail) -> None:
+        failures.append({"rule": rule, "message": message, "detail": detail})
+
+    resource = df[df.columns[0]]
+    resource_lower = resource.astype(object).str.lower()
+    keyword_masks = {
+        kw: resource_lower.str.contains(kw, regex=False).fillna(False).to_numpy(dtype=bool) 
+        for kw in min_keyword_counts
+    }
+    try:
+        figures = df.iloc[:, 1:].to_numpy(dtype=float, na_value=np.nan)
+    except (TypeError, ValueError) as e:
+        fail("numeric", "input excel - figures are not numeric", error=str(e))
+        figures = None
+
+    # rows
+    if len(df) < min_rows:
+        fail("rows", "input excel - too little rows, please investigate", rows=len(df), minimum=min_rows)
+    short = {kw: int(mask.sum()) for kw, mask in keyword_masks.items() if mask.sum() < min_keyword_counts[kw]}
+    if short:
+        fail("keywords", "input excel - not enough repetitions of materials", counts=short, minimum=min_keyword_counts)
+
+    # nulls
+    resource_nulls = resource.isnull().to_numpy()
+    if resource_nulls.any():
+        fail("resource_nulls", "input excel - unexpected nulls in first column, resources", rows=np.flatnonzero(resource_nulls).tolist())
+    if figures is not None and figures.size:
+        null_share = float(np.isnan(figures).mean())
+        if null_share > max_null_share:
+            fail("null_share", "input excel - nulls make up more than 10% of dataset, please investigate", null_share=round(null_share, 4))
+
+    # duplicates - rows are hashed first, and only rows sharing a hash are compared in full
+    row_hashes = pd.util.hash_pandas_object(df, index=False)
+    candidates = row_hashes.duplicated(keep=False).to_numpy()
+    duplicated = np.zeros(len(df), dtype=bool)
+    if candidates.any():
+        duplicated[candidates] = df[candidates].duplicated().to_numpy()
+    if duplicated.any():
+        fail("duplicates", "input excel - resources repeated", resources=resource[duplicated].tolist())
+
+    # temporal integrity - on the headers only
+    year_quarters = [retrieve_year_quarter(str(col)) for col in df.columns[1:]]
+    if year_quarters != sorted(year_quarters):
+        fail("column_order", "input excel - unexpected ordering of columns", columns=year_quarters)
+    periods = pd.Series([(yq[:4], yq[-1]) for yq in year_quarters], dtype=object)
+    year_counts = pd.Series([yq[:4] for yq in year_quarters], dtype=object).value_counts()
+    if (year_counts > 4).any():
+        fail("quarters_per_year", "input excel - too many quarters for a year", years=year_counts[year_counts > 4].index.tolist())
+    if periods.duplicated().any():
+        fail("repeated_periods", "input excel - repeated year and quarter", periods=[" ".join(p) for p in periods[periods.duplicated()]])
+
+    # negatives - nan counts as unexpected too, as (nan >= 0) is False in input_allowable_negative_quantities
+    if figures is not None:
+        checked = ~resource_lower.str.startswith(negatives_allowed).fillna(False).to_numpy(dtype=bool)
+        bad_rows = checked & ~(figures >= 0).all(axis=1)
+        if bad_rows.any():
+            fail("negatives", "input excel - negative values for unexpected resources", resources=resource[bad_rows].tolist())
+
+    return failures
+
+@instrumented()
 def input_checks(df: pd.DataFrame) -> None:
     """
-    Does all the input integrity checks, aside from schema check
+    Does all the input integrity checks, aside from schema check, in one pass (see input_check_report). 
+        Raises an AssertionError listing every failing rule.
     """
-    input_rows_check(df)
-    input_nulls_check(df)
-    input_duplicate_rows(df)
-    input_temporal_integrity(df)
-    input_allowable_negative_quantities(df)
+    failures = input_check_report(df)
+    if failures:
+        for failure in failures:
+            logging.error(f"Input check failed - {failure['rule']}: {failure['detail']}")
+        raise AssertionError("; ".join(failure["message"] for failure in failures))
 
+@instrumented()
 def input_schema_validation(df: pd.DataFrame) -> None:
 
     # First column - doesn't generally have a name, so the column is automatically titled something
@@ -105,15 +187,25 @@ def input_schema_validation(df: pd.DataFrame) -> None:
     for col_idx in range(1,len(df.columns)):
         assert df[df.columns[col_idx]].dtype in (np.int64, np.float64), "input excel type incorrect - should be numeric"
 
-def output_schema_validation(
-    df = pd.DataFrame
-) -> None:
-    # order of columns, because pandera doesn't support
-    column_order = ["resource", "category", "figures", "year", "quarter", "date_published", "date_processed", "filename"]
-    assert list(df.columns) == column_order, "not in correct order or unexpected columns"
-
-    # confirm schema
-    schema = pa.DataFrameSchema({
+@functools.cache
+def output_schema(compact: bool = False) -> pa.DataFrameSchema:
+    """
+    Schema of the output table. The compact version (see compact_dtypes in src/transform.py) expects 
+        categoricals, int16/int8 year and quarter, and a real date for date_published. 
+        Each version is built once, on first use, and reused after that.
+    """
+    if compact:
+        return pa.DataFrameSchema({
+            "resource": pa.Column(pa.Category, nullable=False), 
+            "category": pa.Column(pa.Category, nullable=False), 
+            "figures": pa.Column(pa.Float, nullable=True), 
+            "year": pa.Column(pa.Int16, nullable=False), 
+            "quarter": pa.Column(pa.Int8, nullable=False), 
+            "date_published": pa.Column(pa.DateTime, nullable=False), 
+            "date_processed": pa.Column(pa.DateTime, nullable=False), 
+            "filename": pa.Column(pa.Category, nullable=False)
+        })
+    return pa.DataFrameSchema({
         "resource": pa.Column(pa.String, nullable=False), 
         "category": pa.Column(pa.String, nullable=False), 
         "figures": pa.Column(pa.Float, nullable=True), # Although I saw 0s in there, instead of nulls
@@ -124,6 +216,34 @@ def output_schema_validation(
         "filename": pa.Column(pa.String, nullable=False)
     })
 
+def whole_seconds(timestamps: pd.Series) -> bool:
+    """
+    True when no timestamp has a fraction of a second, i.e. each one prints as '%Y-%m-%d %H:%M:%S'. 
+        Same result as comparing x.strftime('%Y-%m-%d %H:%M:%S') with str(x) row by row, 
+        done as a remainder on the nanosecond integers instead.
+    """
+    nanoseconds = timestamps.to_numpy(dtype="datetime64[ns]").view(np.int64)
+    return bool((nanoseconds % 1_000_000_000 == 0).all())
+
+@instrumented()
+def output_schema_validation(
+    df = pd.DataFrame, 
+    sample: int | None = None
+) -> None:
+    """
+    sample, if given, checks that many randomly picked rows rather than all of them (for very large backfills) - 
+        column order and dtypes are still checked on the whole frame, as they cost nothing per row.
+    """
+    # order of columns, because pandera doesn't support
+    column_order = ["resource", "category", "figures", "year", "quarter", "date_published", "date_processed", "filename"]
+    assert list(df.columns) == column_order, "not in correct order or unexpected columns"
+
+    if sample is not None and sample < len(df):
+        df = df.sample(n=sample, random_state=0)
+
+    # confirm schema - compact frames are checked as they are, rather than converted back to strings
+    schema = output_schema(compact=is_compact(df))
+
     try:
         schema.validate(df, lazy=True)
     except pa.errors.SchemaErrors as e:
@@ -131,7 +251,8 @@ def output_schema_validation(
         raise ValueError(f"Errors seen in {error_columns}")
     
     # confirm correct date format
-    assert df['date_processed'].apply(lambda x: x.strftime('%Y-%m-%d %H:%M:%S') == str(x)).all(), "date_processed incorrect time representation"
+    assert whole_seconds(df['date_processed']), "date_processed incorrect time representation"
 
+@instrumented()
 def output_check_duplicates(df: pd.DataFrame) -> None:
     assert not df.duplicated(subset=["category", "year", "quarter", "resource"]).any(), "output dataframe - repeated values"
\ No newline at end of file
@@ -0,0 +1,26 @@
+from src.excel_reader import quarter_sheet, quarter_skiprows
+from src.scraper import oil_link_text
+
+# Energy Trends sections handled by the pipeline. For each one:
+#   - landing_page: gov.uk page listing the section's workbooks
+#   - link_text: regular expression picking the workbook's attachment link (case insensitive)
+#   - sheet_name and skiprows: where the quarterly table sits in the workbook
+#   - location: folder under the output folder its table and manifest go to ("" keeps oil where it always was)
+#   - resource_checks: whether the input integrity checks apply - they expect the crude oil table's rows
+# Only oil so far - add another section once its link text and sheet layout are checked against a real
+#   workbook of it, with a parse test.
+datasets = {
+    "oil": {
+        "landing_page": "https://www.gov.uk/government/statistics/oil-and-oil-products-section-3-energy-trends",
+        "link_text": oil_link_text,
+        "sheet_name": quarter_sheet,
+        "skiprows": quarter_skiprows,
+        "location": "",
+        "resource_checks": True
+    }
+}
+
+def get_dataset(name: str, registry: dict = datasets) -> dict:
+    if name not in registry:
+        raise ValueError(f"Unknown dataset: {name} - expected one of {sorted(registry)}")
+    return registry[name]
@@ -0,0 +1,123 @@
+from __future__ import annotations
+from typing import IO, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# where the two things we need sit in the Energy Trends workbooks
+cover_sheet = "Cover Sheet"
+cover_skiprows = 3
+quarter_sheet = "Quarter"
+quarter_skiprows = 4
+
+_calamine_workbook = False # not looked up yet
+
+def calamine_workbook():
+    """
+    python-calamine's CalamineWorkbook, or None if it isn't installed (optional, falls back to openpyxl). 
+        Looked up on first use, so importing this module stays cheap.
+    """
+    global _calamine_workbook
+    if _calamine_workbook is False:
+        try:
+            from python_calamine import CalamineWorkbook
+        except ImportError:
+            CalamineWorkbook = None
+        _calamine_workbook = CalamineWorkbook
+    return _calamine_workbook
+
+def calamine_available() -> bool:
+    return calamine_workbook() is not None
+
+def _convert_value(value, error_codes: tuple = ()):
+    """
+    Same cell conversion as pandas' own excel readers, so the resulting frame is identical:
+        empty -> "", whole-number floats -> int, excel errors -> nan
+    """
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        if value.is_integer():
+            return int(value)
+        return value
+    if isinstance(value, str) and value in error_codes:
+        return float("nan") # same as np.nan, without importing numpy here
+    return value
+
+def _trim_rows(rows: list[list]) -> list[list]:
+    """
+    Drops trailing empty cells and trailing empty rows, then pads rows to the same width (as pandas does)
+    """
+    last_row_with_data = -1
+    for row_number, row in enumerate(rows):
+        while row and row[-1] == "":
+            row.pop()
+        if row:
+            last_row_with_data = row_number
+    rows = rows[: last_row_with_data + 1]
+    if rows:
+        max_width = max(len(row) for row in rows)
+        rows = [row + [""] * (max_width - len(row)) for row in rows]
+    return rows
+
+def _sheet_rows_openpyxl(workbook, sheet_name: str, max_row: int | None = None) -> list[list]:
+    from openpyxl.cell.cell import ERROR_CODES
+    sheet = workbook[sheet_name]
+    sheet.reset_dimensions()
+    # values_only skips building a Cell object for every cell, and max_row stops the xml parse early
+    return [
+        [_convert_value(value, ERROR_CODES) for value in row]
+        for row in sheet.iter_rows(max_row=max_row, values_only=True)
+    ]
+
+def _sheet_rows_calamine(workbook, sheet_name: str, max_row: int | None = None) -> list[list]:
+    sheet = workbook.get_sheet_by_name(sheet_name)
+    return [
+        [_convert_value(value) for value in row]
+        for row in sheet.to_python(skip_empty_area=False, nrows=max_row)
+    ]
+
+def read_sheet_ranges(
+    source: IO[bytes], 
+    engine: str = "auto", 
+    sheet_name: str = quarter_sheet, 
+    skiprows: int = quarter_skiprows
+) -> tuple[str, pd.DataFrame]:
+    """
+    Reads only what the pipeline needs from the workbook, with the archive opened once:
+        - the single Cover Sheet cell holding the published text (the rows below it are never parsed)
+        - the Quarter sheet, as the same frame pd.read_excel(sheet_name="Quarter", skiprows=4) gives
+            (sheet_name and skiprows can be changed for workbooks laid out differently)
+
+    engine is "openpyxl" (read_only, values only) or "calamine" if python-calamine is installed.
+        "auto" picks calamine when it is available, as it is several times faster on large sheets.
+    """
+    if engine == "auto":
+        engine = "calamine" if calamine_available() else "openpyxl"
+
+    if engine == "calamine":
+        if not calamine_available():
+            raise RuntimeError("calamine engine requested but python-calamine is not installed")
+        workbook = calamine_workbook().from_filelike(source)
+        sheet_rows = _sheet_rows_calamine
+    elif engine == "openpyxl":
+        from openpyxl import load_workbook
+        workbook = load_workbook(source, read_only=True, data_only=True, keep_links=False)
+        sheet_rows = _sheet_rows_openpyxl
+    else:
+        raise ValueError(f"Unknown excel engine: {engine}")
+
+    try:
+        cover_rows = sheet_rows(workbook, cover_sheet, max_row=cover_skiprows + 1)
+        quarter_rows = _trim_rows(sheet_rows(workbook, sheet_name))
+    finally:
+        if hasattr(workbook, "close"):
+            workbook.close()
+
+    if len(cover_rows) <= cover_skiprows or not cover_rows[cover_skiprows]:
+        raise RuntimeError("Issue with retrieving published date: cover sheet cell is empty")
+    published_text = cover_rows[cover_skiprows][0]
+
+    from pandas.io.parsers import TextParser
+    df_quarter = TextParser(quarter_rows, header=0, skiprows=skiprows, skip_blank_lines=False).read()
+    return published_text, df_quarter
@@ -0,0 +1,238 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import shutil
+import tempfile
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import requests
+from requests import Response
+from requests.adapters import HTTPAdapter
+from src.atomic import atomic_write
+
+# running totals for the on-disk cache, handy to log at the end of a run
+cache_stats = {"hits": 0, "misses": 0, "bytes_saved": 0}
+
+# (connect, read) in seconds - a server that stops sending should not stall a run forever
+default_timeout = (5, 60)
+max_backoff = 120
+
+# streamed downloads are read in chunks of this size, and stay in memory until spool_max_memory is passed
+chunk_size = 1024 * 1024
+spool_max_memory = 8 * 1024 * 1024
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session(pool_size: int = 10) -> requests.Session:
+    """
+    One shared session for the whole process, so the landing page and the workbook 
+        (both on gov.uk hosts) reuse pooled keep-alive connections instead of a new TCP/TLS handshake each time. 
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+def close_session() -> None:
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+def backoff_delay(attempt: int, base_delay: float, cap: float = max_backoff) -> float:
+    """
+    Exponential backoff with full jitter - anywhere between 0 and base_delay * 2^attempt (capped), 
+        so retries from several runs don't hit the server in lockstep. 
+    """
+    return random.uniform(0, min(cap, base_delay * (2 ** attempt)))
+
+def retry_after_seconds(response: Response, cap: float = max_backoff) -> float | None:
+    """
+    Reads a Retry-After header, which is either a number of seconds or an HTTP date. 
+        Capped at cap seconds, so a server asking for a day's wait can't stall the run for a day. 
+    """
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return min(cap, float(value))
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return min(cap, max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds()))
+
+def spool_response(
+    response: Response, 
+    max_memory: int = spool_max_memory
+) -> tuple[tempfile.SpooledTemporaryFile, str]:
+    """
+    Writes a stream=True response chunk by chunk into a SpooledTemporaryFile, hashing as it goes. 
+
+    The body is never held as one bytes object, and the file (rewound to the start) can be 
+        handed straight to pd.ExcelFile. Returns the file and the sha256 hex digest of the content. 
+    """
+    digest = hashlib.sha256()
+    spool = tempfile.SpooledTemporaryFile(max_size=max_memory)
+    try:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            if chunk:
+                digest.update(chunk)
+                spool.write(chunk)
+    except Exception:
+        spool.close()
+        raise
+    finally:
+        response.close()
+    spool.seek(0)
+    return spool, digest.hexdigest()
+
+def save_body(response: Response, path: str) -> str:
+    """
+    Copies the spooled body of a stream=True response to path, in chunks, and closes the spool. 
+        The file only gets its name once complete (see atomic_write). 
+    """
+    with response.body_file as body_file:
+        return atomic_write(path, lambda f: shutil.copyfileobj(body_file, f, chunk_size), "wb")
+
+def content_sha256(response: Response) -> str:
+    """
+    sha256 of the response body - already worked out for streamed and cached responses
+    """
+    digest = getattr(response, "sha256", None)
+    if isinstance(digest, str):
+        return digest
+    response.sha256 = hashlib.sha256(response.content).hexdigest()
+    return response.sha256
+
+def reset_cache_stats() -> None:
+    for k in cache_stats:
+        cache_stats[k] = 0
+
+def cache_paths(cache_dir: str, url: str) -> tuple[str, str]:
+    """
+    Each url is stored as two files named after the sha256 of the url:
+        - <key>.body holds the raw bytes of the response
+        - <key>.json holds the url, validators (ETag, Last-Modified) and size
+    """
+    key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, f"{key}.body"), os.path.join(cache_dir, f"{key}.json")
+
+def load_cache_entry(cache_dir: str, url: str) -> dict | None:
+    """
+    Returns the stored metadata for a url, or None if nothing (or only half of an entry) is cached
+    """
+    body_path, meta_path = cache_paths(cache_dir, url)
+    if not (os.path.exists(body_path) and os.path.exists(meta_path)):
+        return None
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable cache entry for {url}: {e}")
+        return None
+
+def conditional_headers(entry: dict | None) -> dict:
+    """
+    Builds If-None-Match / If-Modified-Since from a cache entry, so the server can reply with a 304
+    """
+    headers = {}
+    if not entry:
+        return headers
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+def store_cache_entry(cache_dir: str, url: str, response: Response) -> None:
+    """
+    Stores a 200 response if the server gave us at least one validator - without one,
+        there is nothing to revalidate against, so caching would be pointless.
+
+    Any parsed output kept next to an older body is removed, as it no longer matches.
+    Streamed responses are copied from their spooled file rather than loaded into memory.
+    """
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    if not (etag or last_modified):
+        return
+
+    os.makedirs(cache_dir, exist_ok=True)
+    body_path, meta_path = cache_paths(cache_dir, url)
+    parsed_path = f"{body_path}.parsed.pkl"
+    if os.path.exists(parsed_path):
+        os.remove(parsed_path)
+
+    body_file = getattr(response, "body_file", None)
+    if body_file is not None:
+        atomic_write(body_path, lambda f: shutil.copyfileobj(body_file, f, chunk_size), "wb")
+        size = os.path.getsize(body_path)
+        body_file.seek(0)
+    else:
+        atomic_write(body_path, lambda f: f.write(response.content), "wb")
+        size = len(response.content)
+
+    meta = {
+        "url": url,
+        "etag": etag,
+        "last_modified": last_modified,
+        "content_type": response.headers.get("Content-Type"),
+        "size": size,
+        "sha256": content_sha256(response)
+    }
+    atomic_write(meta_path, lambda f: json.dump(meta, f), "w")
+    response.cache_body_path = body_path
+
+def response_from_cache(cache_dir: str, url: str, entry: dict, stream: bool = False) -> Response:
+    """
+    Rebuilds a 200 response from the stored body, used when the server replies 304 Not Modified. 
+
+    With stream=True the stored file is opened rather than read, the same as a streamed download. 
+    """
+    body_path, _ = cache_paths(cache_dir, url)
+
+    response = Response()
+    response.status_code = 200
+    response.url = url
+    if stream:
+        response.body_file = open(body_path, "rb")
+    else:
+        with open(body_path, "rb") as f:
+            response._content = f.read()
+    if entry.get("sha256"):
+        response.sha256 = entry["sha256"]
+    if entry.get("etag"):
+        response.headers["ETag"] = entry["etag"]
+    if entry.get("last_modified"):
+        response.headers["Last-Modified"] = entry["last_modified"]
+    if entry.get("content_type"):
+        response.headers["Content-Type"] = entry["content_type"]
+    response.from_cache = True
+    response.cache_body_path = body_path
+    return response
+
+def is_from_cache(response: Response) -> bool:
+    return getattr(response, "from_cache", False) is True
+
+def parsed_cache_path(response: Response) -> str | None:
+    """
+    Where the parsed version of a cached body can be kept, so a 304 also skips the re-parse
+    """
+    body_path = getattr(response, "cache_body_path", None)
+    if not isinstance(body_path, str):
+        return None
+    return f"{body_path}.parsed.pkl"
@@ -0,0 +1,165 @@
+import contextlib
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+
+# per-stage metrics of a run (wall and CPU time, peak memory, rows in and out), written as json lines.
+# Stages are only measured inside instrumented_run - otherwise the decorator costs one check per call.
+_run = None
+_lock = threading.Lock()
+_local = threading.local() # stack of open stages, per thread
+
+def _rows(value) -> int | None:
+    """
+    Row count of a frame, or of the first frame in a tuple (e.g. get_info's (date, frame))
+    """
+    if isinstance(value, tuple):
+        return next((rows for rows in map(_rows, value) if rows is not None), None)
+    if hasattr(value, "shape") and hasattr(value, "columns"):
+        return int(value.shape[0])
+    return None
+
+def _stack() -> list:
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+@contextlib.contextmanager
+def stage(name: str, rows_in: int | None = None):
+    """
+    Measures the block as one stage of the current run. Yields a dict - set "rows_out" in it if known.
+        Peak memory (tracemalloc) is the most allocated above the start of the stage, nested stages included.
+    """
+    if _run is None:
+        yield {}
+        return
+    stack = _stack()
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        if stack:
+            stack[-1]["max_seen"] = max(stack[-1]["max_seen"], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+    frame = {
+        "stage": name,
+        "parent": stack[-1]["stage"] if stack else None,
+        "depth": len(stack),
+        "rows_in": rows_in,
+        "rows_out": None,
+        "start_mem": tracemalloc.get_traced_memory()[0] if tracing else 0,
+        "max_seen": 0
+    }
+    stack.append(frame)
+    started = datetime.now()
+    wall, cpu = time.perf_counter(), time.process_time()
+    error = None
+    try:
+        yield frame
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        stack.pop()
+        peak = None
+        if tracing:
+            frame["max_seen"] = max(frame["max_seen"], tracemalloc.get_traced_memory()[1])
+            peak = round((frame["max_seen"] - frame["start_mem"]) / 1e6, 3)
+            if stack:
+                stack[-1]["max_seen"] = max(stack[-1]["max_seen"], frame["max_seen"])
+        record({
+            "stage": name,
+            "parent": frame["parent"],
+            "depth": frame["depth"],
+            "started": started.isoformat(timespec="milliseconds"),
+            "wall_s": round(wall, 6),
+            "cpu_s": round(cpu, 6),
+            "peak_mb": peak,
+            "rows_in": frame["rows_in"],
+            "rows_out": frame["rows_out"],
+            "error": error
+        })
+
+def instrumented(name: str | None = None):
+    """
+    Decorator measuring each call as a stage (see stage) named after the function. rows_in is the row
+        count of the first frame among the arguments, rows_out that of the result.
+    """
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _run is None:
+                return func(*args, **kwargs)
+            rows_in = next((rows for rows in map(_rows, list(args) + list(kwargs.values())) if rows is not None), None)
+            with stage(stage_name, rows_in=rows_in) as frame:
+                result = func(*args, **kwargs)
+                frame["rows_out"] = _rows(result)
+                return result
+        return wrapper
+    return decorator
+
+def record(metrics: dict) -> None:
+    if _run is None:
+        return
+    with _lock:
+        _run["stages"].append(metrics)
+
+@contextlib.contextmanager
+def instrumented_run(
+    metrics_path: str,
+    trace_memory: bool = True,
+    profile_path: str | None = None,
+    run_id: str | None = None
+):
+    """
+    Collects the stages of everything run inside it, then appends them to metrics_path as json lines -
+        one per stage, then a "run" line with the totals - so runs can be compared over time.
+
+    - trace_memory turns on tracemalloc for peak memory (it slows allocation heavy code down, so can be turned off)
+    - profile_path, if given, also dumps a cProfile of the run there (open with pstats or snakeviz)
+    """
+    global _run
+    run = {"run_id": run_id or uuid.uuid4().hex[:12], "stages": []}
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    profiler = None
+    if profile_path:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    _run = run
+    try:
+        with stage("run"):
+            yield run
+    finally:
+        _run = None
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+        if started_tracing:
+            tracemalloc.stop()
+        write_metrics(run, metrics_path)
+
+def write_metrics(run: dict, metrics_path: str) -> None:
+    if os.path.dirname(metrics_path):
+        os.makedirs(os.path.dirname(metrics_path), exist_ok=True)
+    with open(metrics_path, "a", encoding="utf-8") as f:
+        for metrics in run["stages"]:
+            f.write(json.dumps({"run_id": run["run_id"], **metrics}) + "\n")
+    logging.info(f"Run {run['run_id']} - {len(run['stages'])} stage metrics written to {metrics_path}")
+
+def read_metrics(metrics_path: str, run_id: str | None = None) -> list[dict]:
+    """
+    Stage metrics from a metrics file - of one run, or all of them
+    """
+    with open(metrics_path, "r", encoding="utf-8") as f:
+        metrics = [json.loads(line) for line in f if line.strip()]
+    return [m for m in metrics if run_id is None or m["run_id"] == run_id]
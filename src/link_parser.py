@@ -0,0 +1,81 @@
+import codecs
+import re
+from html.parser import HTMLParser
+
+attachment_class = "gem-c-attachment__link" # class gov.uk gives the links to attached files
+feed_size = 64 * 1024
+
+class StopParsing(Exception):
+    pass
+
+class AttachmentLinkParser(HTMLParser):
+    """
+    Collects (title, href) of the attachment links in a gov.uk page as it is fed, without building a tree.
+        With link_text given (a regular expression, case insensitive), parsing stops at the first link
+        whose title matches - it is then in .match.
+    """
+    def __init__(self, link_text: str | None = None):
+        super().__init__(convert_charrefs=True)
+        self.pattern = re.compile(link_text, re.IGNORECASE) if link_text else None
+        self.links = []
+        self.match = None
+        self._href = None
+        self._text = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag != "a":
+            return
+        attrs = dict(attrs)
+        if attachment_class in (attrs.get("class") or "").split() and attrs.get("href"):
+            self._href = attrs["href"]
+            self._text = []
+
+    def handle_data(self, data):
+        if self._href is not None:
+            self._text.append(data)
+
+    def handle_endtag(self, tag):
+        if tag != "a" or self._href is None:
+            return
+        link = (" ".join("".join(self._text).split()), self._href)
+        self._href = None
+        self.links.append(link)
+        if self.pattern and self.pattern.search(link[0]):
+            self.match = link
+            raise StopParsing
+
+def _feed(parser: AttachmentLinkParser, content: bytes, encoding: str | None = None) -> None:
+    """
+    Feeds the page in chunks, decoded incrementally, so a match near the top skips the rest of the page
+    """
+    decoder = codecs.getincrementaldecoder(encoding or "utf-8")(errors="replace")
+    try:
+        for start in range(0, len(content), feed_size):
+            parser.feed(decoder.decode(content[start:start + feed_size]))
+        parser.feed(decoder.decode(b"", final=True))
+        parser.close()
+    except StopParsing:
+        pass
+
+def attachment_links(content: bytes, encoding: str | None = None) -> list[tuple[str, str]]:
+    """
+    All attachment links of a page as (title, href), in page order, in one pass
+    """
+    parser = AttachmentLinkParser()
+    _feed(parser, content, encoding)
+    return parser.links
+
+def find_attachment_link(content: bytes, link_text: str, encoding: str | None = None) -> str | None:
+    """
+    href of the first attachment link whose title matches link_text, or None
+    """
+    parser = AttachmentLinkParser(link_text)
+    _feed(parser, content, encoding)
+    return parser.match[1] if parser.match else None
+
+def match_link(links: list[tuple[str, str]], link_text: str) -> str | None:
+    """
+    Same match as find_attachment_link, on links already collected by attachment_links
+    """
+    pattern = re.compile(link_text, re.IGNORECASE)
+    return next((href for title, href in links if pattern.search(title)), None)
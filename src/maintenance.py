@@ -0,0 +1,209 @@
+import logging
+import os
+import time
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from src.atomic import atomic_write
+from src.storage import (
+    table_path,
+    partition_path,
+    read_partition,
+    write_parquet_file,
+    check_not_versioned,
+    log_dirname,
+    row_group_size,
+    staged_prefix,
+    swap_partition_files,
+    recover_partition_swaps
+)
+from src.versioning import is_versioned, active_files, latest_version, read_commit, read_files, write_commit
+from src.transform import compact_df
+from src.query import list_data_files, partition_pattern
+
+# file maintenance of the stored table, as DeltaTable.md's OPTIMIZE / ZORDER / VACUUM:
+# - optimize compacts the files of each partition, rows clustered on the columns filtered on most, so each
+#   file and row group holds a narrow range of them and its min/max statistics let readers skip it
+# - vacuum removes data files no version of the table uses any more
+cluster_columns = ["category", "resource"]
+target_file_rows = 1_000_000 # rows per file when a partition is rewritten
+clustered_row_group_rows = row_group_size # row groups skip on their min/max once partitions outgrow one
+layout_key = b"clustered_by"
+vacuum_min_age = 3600 # seconds - younger unreferenced files may belong to a write still in progress
+
+def layout_tag(columns: list[str], zorder: bool) -> bytes:
+    return f"{'zorder' if zorder else 'sort'}:{','.join(columns)}".encode()
+
+def _ranks(values: pd.Series) -> np.ndarray:
+    """
+    Dense rank of each value in sorted order - categoricals read back from parquet keep their
+        dictionary order, which isn't sorted
+    """
+    _, ranks = np.unique(values.astype(str).to_numpy(), return_inverse=True)
+    return ranks.astype(np.uint64)
+
+def zorder_key(df: pd.DataFrame, columns: list[str]) -> np.ndarray:
+    """
+    Interleaves the bits of each column's rank, so rows close on every column end up close together -
+        unlike a plain sort, which only clusters well on the first column
+    """
+    ranks = [_ranks(df[column]) for column in columns]
+    bits = max(int(r.max()).bit_length() if len(r) else 0 for r in ranks)
+    key = np.zeros(len(df), dtype=np.uint64)
+    for bit in range(bits):
+        for position, rank in enumerate(ranks):
+            key |= ((rank >> np.uint64(bit)) & np.uint64(1)) << np.uint64(bit * len(ranks) + position)
+    return key
+
+def cluster(df: pd.DataFrame, columns: list[str] = cluster_columns, zorder: bool = False) -> pd.DataFrame:
+    if zorder:
+        order = np.argsort(zorder_key(df, columns), kind="stable")
+    else:
+        order = np.lexsort([_ranks(df[column]) for column in reversed(columns)])
+    return df.iloc[order].reset_index(drop=True)
+
+def is_clustered(paths: list[str], tag: bytes) -> bool:
+    """
+    A partition already optimized with this layout - one file (or more, if it's over target_file_rows), all tagged
+    """
+    if not paths:
+        return True
+    tags = [(pq.read_schema(path).metadata or {}).get(layout_key) for path in paths]
+    return all(t == tag for t in tags) and (len(paths) == 1 or pq.read_metadata(paths[0]).num_rows >= target_file_rows)
+
+def _write_clustered(df: pd.DataFrame, directory: str, tag: bytes, prefix: str = "part-") -> list[str]:
+    return [
+        write_parquet_file(
+            df.iloc[start:start + target_file_rows], 
+            directory, 
+            metadata={layout_key: tag}, 
+            row_group_rows=clustered_row_group_rows, 
+            prefix=prefix
+        )
+        for start in range(0, len(df), target_file_rows)
+    ]
+
+def _partitions(relative_paths) -> dict[tuple[int, int], list[str]]:
+    partitions = {}
+    for relative in relative_paths:
+        year, quarter = partition_pattern.match(relative).groups()
+        partitions.setdefault((int(year), int(quarter)), []).append(relative)
+    return partitions
+
+def optimize(location: str = "", columns: list[str] = cluster_columns, zorder: bool = False) -> dict:
+    """
+    Rewrites each partition of the table whose files aren't laid out this way yet: its files compacted into
+        files of up to target_file_rows rows, with rows sorted (or Z-ordered) on columns, in row groups of
+        clustered_row_group_rows. The rows themselves don't change.
+
+    - versioned tables get one commit swapping the files (tagged with the latest published date, so as_of is
+        unaffected) - the replaced files stay on disk for older versions until vacuum
+    - on the plain parquet table the new files are swapped in for the old ones (see swap_partition_files), so a
+        crash never leaves a partition's rows there twice - swaps an earlier run left part way are finished first
+    - DeltaTable.csv has no files or statistics to work with - it is only rewritten in key order
+    """
+    tag = layout_tag(columns, zorder)
+    stats = {"partitions_optimized": 0, "files_before": 0, "files_after": 0}
+    if not os.path.isdir(table_path(location)):
+        csv_path = f"{location}DeltaTable.csv"
+        if os.path.exists(csv_path):
+            df = compact_df(pd.read_csv(csv_path, parse_dates=["date_processed"]))
+            df = cluster(df, ["year", "quarter"] + columns)
+            atomic_write(csv_path, lambda tmp_path: df.to_csv(tmp_path, index=False))
+            stats.update(files_before=1, files_after=1)
+        logging.info(f"Optimize - {stats}")
+        return stats
+
+    base = table_path(location)
+    versioned = is_versioned(location)
+    if not versioned:
+        check_not_versioned(location)
+        recover_partition_swaps(location)
+    current = active_files(location) if versioned else {}
+    add, remove = {}, []
+    for (year, quarter), relatives in sorted(_partitions(list_data_files(location)).items()):
+        paths = [os.path.join(base, relative) for relative in relatives]
+        stats["files_before"] += len(paths)
+        if is_clustered(paths, tag):
+            stats["files_after"] += len(paths)
+            continue
+        directory = partition_path(location, year, quarter)
+        if versioned:
+            written = _write_clustered(cluster(read_files(location, relatives), columns, zorder), directory, tag)
+        else:
+            staged = _write_clustered(cluster(read_partition(location, year, quarter), columns, zorder), directory, tag, staged_prefix)
+            written = swap_partition_files(directory, staged, paths)
+        stats["files_after"] += len(written)
+        stats["partitions_optimized"] += 1
+        if versioned:
+            for path in written:
+                add[os.path.relpath(path, base)] = {
+                    "year": year,
+                    "quarter": quarter,
+                    "rows": pq.read_metadata(path).num_rows,
+                    "date_published": current[relatives[0]]["date_published"],
+                    "filename": "optimize"
+                }
+            remove.extend(relatives)
+    if add:
+        latest = read_commit(location, latest_version(location))
+        stats["version"] = write_commit(location, add, remove, latest["date_published"], "optimize")
+    logging.info(f"Optimize - {stats}")
+    return stats
+
+def referenced_files(location: str = "", retain_versions: int | None = None) -> set[str]:
+    """
+    Data files (relative to the table) used by the latest retain_versions + 1 versions of a versioned table,
+        or by any version if retain_versions is None
+    """
+    latest = latest_version(location)
+    if latest < 0:
+        return set()
+    oldest = 0 if retain_versions is None else max(0, latest - retain_versions)
+    referenced = set(active_files(location, oldest))
+    for version in range(oldest + 1, latest + 1):
+        referenced.update(read_commit(location, version)["add"])
+    return referenced
+
+def vacuum(
+    location: str = "",
+    retain_versions: int | None = None,
+    min_age: float = vacuum_min_age,
+    dry_run: bool = False
+) -> list[str]:
+    """
+    Deletes the table's files nothing reads any more, and returns them (relative to the table):
+        - data files of a versioned table no retained version uses (see referenced_files) - versions
+            older than that can no longer be read, so as_of before them no longer works
+        - temp files left behind by writes that crashed
+    On the plain parquet table, partition swaps a crash interrupted are finished (see recover_partition_swaps).
+
+    Files younger than min_age seconds are left alone, as they may belong to a write still in progress.
+    """
+    base = table_path(location)
+    if not os.path.isdir(base):
+        return []
+    if is_versioned(location):
+        referenced = referenced_files(location, retain_versions)
+    else:
+        referenced = None
+        recover_partition_swaps(location)
+    now = time.time()
+    removed = []
+    for directory, subdirectories, files in os.walk(base):
+        subdirectories[:] = [d for d in subdirectories if d != log_dirname]
+        for name in files:
+            path = os.path.join(directory, name)
+            relative = os.path.relpath(path, base)
+            if name.startswith(".tmp-"):
+                unused = True
+            elif name.endswith(".parquet") and referenced is not None:
+                unused = relative not in referenced
+            else:
+                continue
+            if unused and now - os.path.getmtime(path) >= min_age:
+                removed.append(relative)
+                if not dry_run:
+                    os.remove(path)
+    logging.info(f"Vacuum - {len(removed)} files {'to remove' if dry_run else 'removed'} from {base}")
+    return sorted(removed)
@@ -0,0 +1,97 @@
+import json
+import logging
+import os
+from datetime import datetime
+from src.atomic import atomic_write
+
+def manifest_path(csv_location: str = "") -> str:
+    return f"{csv_location}manifest.json"
+
+def manifest_from_csv(csv_location: str = "") -> dict:
+    """
+    One-off bootstrap for tables written before the manifest existed.
+        The full scan of DeltaTable.csv only happens here, and the result is saved, so it is never repeated.
+
+    There are no urls or hashes for those ingests, so they are left empty.
+    """
+    manifest = {"latest": {}, "ingests": []}
+    csv_path = f"{csv_location}DeltaTable.csv"
+    if not os.path.exists(csv_path):
+        return manifest
+
+    import pandas as pd # only needed for this one-off
+    df = pd.read_csv(csv_path, usecols=["filename", "date_published"])
+    for (filename, date_published), rows in df.groupby(["filename", "date_published"], sort=False).size().items():
+        record_ingest(manifest, filename=filename, url=None, content_hash=None, published_date=date_published, rows=int(rows))
+    save_manifest(manifest, csv_location)
+    logging.info(f"Manifest bootstrapped from {csv_path} with {len(manifest['latest'])} files")
+    return manifest
+
+def load_manifest(csv_location: str = "") -> dict:
+    """
+    Reads the ingestion manifest. It holds every ingest (filename, url, content hash, published date, row count)
+        and a 'latest' lookup keyed by filename, so checking a file is a dictionary lookup.
+    """
+    path = manifest_path(csv_location)
+    if not os.path.exists(path):
+        return manifest_from_csv(csv_location)
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(manifest: dict, csv_location: str = "") -> None:
+    """
+    Written with atomic_write, so a crash never leaves half a manifest behind
+    """
+    atomic_write(manifest_path(csv_location), lambda f: json.dump(manifest, f, indent=1), "w")
+
+def record_ingest(
+    manifest: dict,
+    filename: str,
+    url: str | None,
+    content_hash: str | None,
+    published_date: str,
+    rows: int
+) -> dict:
+    """
+    Adds an ingest to the manifest (in memory - save_manifest writes it out)
+    """
+    record = {
+        "filename": filename,
+        "url": url,
+        "sha256": content_hash,
+        "date_published": str(published_date),
+        "rows": rows,
+        "ingested_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    }
+    manifest["ingests"].append(record)
+    manifest["latest"][filename] = record
+    return record
+
+def latest_published(manifest: dict) -> str | None:
+    """
+    Published date (YYYY-MM-DD) of the newest release ingested, or None if there are none
+    """
+    dates = [str(ingest["date_published"])[:10] for ingest in manifest["ingests"] if ingest.get("date_published")]
+    return max(dates) if dates else None
+
+def is_new_content(
+    manifest: dict,
+    filename: str,
+    url: str | None = None,
+    content_hash: str | None = None
+) -> bool:
+    """
+    - an unseen filename is new
+    - with a content hash, the file is new if the hash differs from the last ingest of that filename
+        (a republished workbook that kept its name)
+    - with only a url, a different url to last time is treated as new, so it gets downloaded and hashed.
+        gov.uk puts republished attachments under a new media path even when the name stays the same.
+    """
+    entry = manifest["latest"].get(filename)
+    if entry is None:
+        return True
+    if content_hash is not None:
+        return entry.get("sha256") != content_hash
+    if url is not None and entry.get("url") is not None:
+        return entry["url"] != url
+    return False
@@ -0,0 +1,149 @@
+import io
+import logging
+import os
+from datetime import datetime
+import pandas as pd
+from src.excel_reader import quarter_sheet, quarter_skiprows
+from src.scraper import read_workbook
+from src.transform import transform_quarter_df, save_csv
+from src.data_integrity import (
+    input_schema_validation, 
+    input_checks, 
+    output_schema_validation, 
+    output_check_duplicates
+)
+from src.storage import save_parquet, merge_parquet, merge_csv
+from src.versioning import commit_merge
+from src.validation_index import check_increment, index_path, load_index, update_index, save_index
+from src.views import refresh_views
+from src.revisions import diff_stored, save_revisions
+from src.instrumentation import instrumented
+
+def transform_and_validate(
+    info_df: pd.DataFrame, 
+    published_date: datetime, 
+    filename: str, 
+    resource_checks: bool = True, 
+    validation_sample: int | None = None, 
+    index: pd.DataFrame | None = None
+) -> pd.DataFrame:
+    """
+    Everything between reading a workbook and saving it, shared by main.py, the backfill and the dataset runner:
+        input schema and integrity checks, the fused transform, then output schema and duplicate checks.
+
+    resource_checks=False skips the input integrity checks, which expect the rows of the crude oil table 
+        (other datasets in src/datasets.py still get the schema, output and duplicate checks). 
+    validation_sample, if given, checks the output schema on that many sampled rows (see output_schema_validation). 
+    index, the stored table's validation index (see src/validation_index.py), switches the output checks 
+        to incremental - only rows new or changed since the last ingest are checked.
+    """
+    input_schema_validation(info_df)
+    if resource_checks:
+        input_checks(info_df)
+
+    final_df = transform_quarter_df(
+        info_df, 
+        published_date = published_date, 
+        filename = filename, 
+        compact = True # categoricals, small ints and a date type - writes the same csv
+    )
+
+    if index is None:
+        output_schema_validation(final_df, sample = validation_sample)
+        output_check_duplicates(final_df) # easier to do here than with input
+    else:
+        check_increment(index, final_df, sample = validation_sample)
+    return final_df
+
+def parse_workbook(
+    source: str | bytes, 
+    filename: str, 
+    sheet_name: str = quarter_sheet, 
+    skiprows: int = quarter_skiprows, 
+    resource_checks: bool = True, 
+    validation_sample: int | None = None
+) -> tuple[datetime, pd.DataFrame]:
+    """
+    Reads a workbook (a local path, or its bytes) and transforms it. Meant to run in a worker process, 
+        as reading the excel file and transforming it is CPU bound - so everything passed in and out pickles.
+    """
+    with (open(source, "rb") if isinstance(source, str) else io.BytesIO(source)) as f:
+        published_date_ts, info_df = read_workbook(f, sheet_name=sheet_name, skiprows=skiprows)
+    final_df = transform_and_validate(
+        info_df, 
+        published_date = published_date_ts, 
+        filename = filename, 
+        resource_checks = resource_checks, 
+        validation_sample = validation_sample
+    )
+    return published_date_ts, final_df
+
+@instrumented()
+def save_output(
+    final_df: pd.DataFrame, 
+    location: str, 
+    output_format: str, 
+    write_mode: str, 
+    published_date: datetime, 
+    filename: str
+) -> None:
+    """
+    - output_format: "csv" for DeltaTable.csv, or "parquet" for the year/quarter partitioned DeltaTable folder
+    - write_mode: "merge" upserts, "overwrite" replaces, "versioned" (parquet only) upserts through the transaction log
+    """
+    if output_format == "parquet" and write_mode == "versioned":
+        commit_merge(final_df, location, date_published = published_date.date(), filename = filename)
+    elif output_format == "parquet" and write_mode == "merge":
+        merge_parquet(final_df, location)
+    elif output_format == "parquet" and write_mode == "overwrite":
+        save_parquet(final_df, location)
+    elif output_format == "csv" and write_mode == "merge":
+        merge_csv(final_df, location)
+    elif output_format == "csv" and write_mode == "overwrite":
+        save_csv(final_df, location)
+    else:
+        raise ValueError(f"Unsupported output_format/write_mode: {output_format}/{write_mode}")
+    logging.info(f"Saved {len(final_df)} rows from {filename} ({output_format}, {write_mode})")
+
+def save_release(
+    final_df: pd.DataFrame, 
+    location: str, 
+    output_format: str, 
+    write_mode: str, 
+    published_date: datetime, 
+    filename: str, 
+    index: pd.DataFrame | None = None, 
+    views: bool = False, 
+    revisions: bool = False
+) -> None:
+    """
+    Saves a release and brings everything kept alongside the table in step with it. main.py, the backfill 
+        and the dataset runner all save through here:
+        - with revisions, the stored figures the release revises are worked out first (see src/revisions.py),
+            as the save replaces them
+        - save_output
+        - the validation index (see src/validation_index.py) is updated, so an incremental check never runs
+            against an index the table has moved past
+        - with views, the materialized views are refreshed (see src/views.py)
+        - with revisions, the revisions are added to the feed
+
+    index is the one already loaded for the checks, if any - otherwise the stored index is updated, if there is one 
+        (without one, the next load_index bootstraps it from the table, which is up to date).
+    """
+    revised = diff_stored(final_df, location) if revisions else None
+    if index is None and os.path.exists(index_path(location)):
+        index = load_index(location)
+    save_output(
+        final_df, 
+        location, 
+        output_format = output_format, 
+        write_mode = write_mode, 
+        published_date = published_date, 
+        filename = filename
+    )
+    if index is not None:
+        save_index(update_index(index, final_df, write_mode = write_mode), location)
+    if views:
+        refresh_views(final_df, location, write_mode = write_mode)
+    if revised is not None:
+        save_revisions(revised, location)
@@ -0,0 +1,232 @@
+import json
+import logging
+import os
+import re
+from typing import Iterator
+import pandas as pd
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from src.atomic import atomic_write
+from src.storage import table_path, partition_columns, partition_schema, column_order, is_data_file
+from src.versioning import is_versioned, active_files, read_files
+from src.transform import compact_df
+
+# per file statistics of the parquet table, cached next to the data (folders and files starting with "_"
+# are skipped when pyarrow lists the data files): DeltaTable/_partition_index.json
+index_filename = "_partition_index.json"
+stats_columns = ["category", "resource"] # min/max kept per file, on top of the year and quarter of its folder
+partition_pattern = re.compile(r"year=(\d+)[/\\]quarter=(\d+)[/\\]")
+csv_chunk_rows = 256 * 1024
+
+def partition_index_path(location: str = "") -> str:
+    return os.path.join(table_path(location), index_filename)
+
+def list_data_files(location: str = "", version: int | None = None) -> list[str]:
+    """
+    Data files of the table (at a version, if versioned), relative to the table folder.
+        Only folder listings - no file is opened.
+    """
+    if is_versioned(location):
+        return sorted(active_files(location, version))
+    base = table_path(location)
+    files = []
+    for year_dir in sorted(os.listdir(base)):
+        if not year_dir.startswith("year="):
+            continue
+        for quarter_dir in sorted(os.listdir(os.path.join(base, year_dir))):
+            directory = os.path.join(base, year_dir, quarter_dir)
+            files.extend(
+                os.path.join(year_dir, quarter_dir, f) for f in sorted(os.listdir(directory)) if is_data_file(f)
+            )
+    return files
+
+def file_stats(path: str) -> dict:
+    """
+    Rows and min/max of stats_columns of one data file, from its footer. A column whose row groups
+        don't all have statistics gets None, and is never pruned on.
+    """
+    metadata = pq.read_metadata(path)
+    stats = {"rows": metadata.num_rows, "size": os.path.getsize(path), "mtime_ns": os.stat(path).st_mtime_ns}
+    positions = {metadata.schema.column(i).name: i for i in range(metadata.num_columns)}
+    for column in stats_columns:
+        values = []
+        for group in range(metadata.num_row_groups):
+            statistics = metadata.row_group(group).column(positions[column]).statistics if column in positions else None
+            if statistics is None or not statistics.has_min_max:
+                values = None
+                break
+            values.append((statistics.min, statistics.max))
+        if values:
+            stats[column] = [min(v[0] for v in values), max(v[1] for v in values)]
+        else:
+            stats[column] = None
+    return stats
+
+def _read_index(location: str) -> dict:
+    path = partition_index_path(location)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _write_index(index: dict, location: str) -> None:
+    atomic_write(partition_index_path(location), lambda f: json.dump(index, f), "w")
+
+def partition_index(location: str = "", version: int | None = None) -> dict:
+    """
+    {relative path: {"year", "quarter", "rows", <min/max of stats_columns>}} for every data file of the table.
+        Kept in _partition_index.json - only files added (or rewritten) since the last read have their
+        footer opened, and entries of files no longer in the table are dropped.
+    """
+    base = table_path(location)
+    cached = _read_index(location)
+    index, changed = {}, False
+    for relative in list_data_files(location, version):
+        full_path = os.path.join(base, relative)
+        entry = cached.get(relative)
+        stat = os.stat(full_path)
+        if entry is None or entry["size"] != stat.st_size or entry["mtime_ns"] != stat.st_mtime_ns:
+            year, quarter = partition_pattern.match(relative).groups()
+            entry = {"year": int(year), "quarter": int(quarter), **file_stats(full_path)}
+            changed = True
+        index[relative] = entry
+    # with an older version only some files are listed - keep the others' entries for later reads
+    if version is not None and is_versioned(location):
+        index_to_save = {**cached, **index}
+    else:
+        index_to_save = index
+        changed = changed or len(index) != len(cached)
+    if changed:
+        _write_index(index_to_save, location)
+    return index
+
+def _in_range(values: list | None, stats: list | None) -> bool:
+    if values is None or stats is None:
+        return True
+    low, high = stats
+    return any(low <= value <= high for value in values)
+
+def matching_files(
+    location: str = "",
+    years: list[int] | None = None,
+    quarters: list[int] | None = None,
+    categories: list[str] | None = None,
+    resources: list[str] | None = None,
+    version: int | None = None
+) -> list[str]:
+    """
+    Data files that can hold rows matching the filters: pruned on the partition of each file,
+        then on the min/max of category and resource in it
+    """
+    index = partition_index(location, version)
+    selected = [
+        relative for relative, entry in index.items()
+        if (years is None or entry["year"] in years)
+        and (quarters is None or entry["quarter"] in quarters)
+        and _in_range(categories, entry.get("category"))
+        and _in_range(resources, entry.get("resource"))
+    ]
+    logging.debug(f"Query - {len(selected)} of {len(index)} files to read")
+    return selected
+
+def row_filter(
+    years: list[int] | None = None,
+    quarters: list[int] | None = None,
+    categories: list[str] | None = None,
+    resources: list[str] | None = None
+):
+    """
+    The filters as one pyarrow expression, pushed down to the row groups (skipped on their statistics) and then rows
+    """
+    condition = None
+    for column, values in zip(["year", "quarter", "category", "resource"], [years, quarters, categories, resources]):
+        if values is None:
+            continue
+        column_condition = ds.field(column).isin(list(values))
+        condition = column_condition if condition is None else condition & column_condition
+    return condition
+
+def _csv_batches(
+    location: str,
+    filters: dict,
+    columns: list[str],
+    batch_size: int
+) -> Iterator[pd.DataFrame]:
+    """
+    DeltaTable.csv can't be pruned - it is streamed in chunks reading only the needed columns
+    """
+    needed = [c for c in column_order if c in columns or filters.get(c) is not None]
+    chunks = pd.read_csv(
+        f"{location}DeltaTable.csv",
+        usecols=needed,
+        chunksize=batch_size,
+        parse_dates=["date_processed"] if "date_processed" in needed else False
+    )
+    for chunk in chunks:
+        mask = pd.Series(True, index=chunk.index)
+        for column, values in filters.items():
+            if values is not None:
+                mask &= chunk[column].isin(values)
+        if mask.any():
+            yield compact_df(chunk.loc[mask, columns].reset_index(drop=True))
+
+def _parquet_batches(
+    location: str,
+    relative_paths: list[str],
+    condition,
+    columns: list[str],
+    batch_size: int
+) -> Iterator[pd.DataFrame]:
+    base = table_path(location)
+    dataset = ds.dataset(
+        [os.path.join(base, p) for p in relative_paths],
+        format="parquet",
+        partitioning=ds.partitioning(partition_schema, flavor="hive"),
+        partition_base_dir=base
+    )
+    for batch in dataset.to_batches(columns=columns, filter=condition, batch_size=batch_size):
+        if batch.num_rows:
+            yield compact_df(batch.to_pandas())
+
+def read_table(
+    location: str = "",
+    years: list[int] | None = None,
+    quarters: list[int] | None = None,
+    categories: list[str] | None = None,
+    resources: list[str] | None = None,
+    columns: list[str] | None = None,
+    version: int | None = None,
+    batch_size: int | None = None
+) -> pd.DataFrame | Iterator[pd.DataFrame]:
+    """
+    Rows of the stored table matching every filter given (each a list of accepted values), e.g.
+        read_table(years=[2023], categories=["import"], resources=["crude oil & ngls"], columns=["quarter", "figures"]).
+
+    On the parquet table (versioned or not - version picks an older one) only the files whose partition and
+        category/resource statistics can match are opened (see matching_files), only the requested columns
+        are read, and the filters are pushed down to the row groups. Falls back to scanning DeltaTable.csv.
+
+    Returns one frame sorted by year and quarter, or with batch_size an iterator of frames of at most
+        that many rows, in no particular order.
+    """
+    columns = list(columns or column_order)
+    filters = {"year": years, "quarter": quarters, "category": categories, "resource": resources}
+    if not os.path.isdir(table_path(location)):
+        if not os.path.exists(f"{location}DeltaTable.csv"):
+            return iter([]) if batch_size else pd.DataFrame(columns=columns)
+        batches = _csv_batches(location, filters, columns, batch_size or csv_chunk_rows)
+        if batch_size:
+            return batches
+        parts = list(batches)
+        if not parts:
+            return compact_df(pd.DataFrame(columns=columns))
+        df = pd.concat(parts, ignore_index=True)
+        return compact_df(df).sort_values([c for c in partition_columns if c in columns], kind="stable", ignore_index=True)
+
+    relative_paths = matching_files(location, years, quarters, categories, resources, version)
+    condition = row_filter(years, quarters, categories, resources)
+    if batch_size:
+        if not relative_paths:
+            return iter([])
+        return _parquet_batches(location, relative_paths, condition, columns, batch_size)
+    return read_files(location, relative_paths, filter=condition, columns=columns)
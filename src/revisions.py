@@ -0,0 +1,110 @@
+import logging
+import os
+import numpy as np
+import pandas as pd
+from src.atomic import atomic_write
+from src.storage import merge_keys
+from src.transform import compact_df
+from src.query import read_table
+from src.validation_index import key_hash
+from src.instrumentation import instrumented
+
+# feed of the figures each release revised, one file per release: <location>revisions/<date>_<workbook>.parquet
+revisions_dirname = "revisions"
+revision_columns = merge_keys + [
+    "old_figures", "new_figures", "change", "pct_change", "old_date_published", "new_date_published", "filename"
+]
+
+def revisions_path(location: str = "") -> str:
+    return f"{location}{revisions_dirname}"
+
+def _join_keys(stored: pd.DataFrame, incoming: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Positions in incoming and in stored of the keys both have
+    """
+    stored_keys, incoming_keys = key_hash(stored), key_hash(incoming)
+    order = np.argsort(stored_keys) # keys are unique here, so the sort needn't be stable (the default is ~4x faster)
+    sorted_keys = stored_keys[order]
+    if (sorted_keys[1:] == sorted_keys[:-1]).any():
+        joined = incoming[merge_keys].assign(new_row=np.arange(len(incoming))).merge(
+            stored[merge_keys].assign(old_row=np.arange(len(stored))), on=merge_keys, how="inner"
+        )
+        return joined["new_row"].to_numpy(), joined["old_row"].to_numpy()
+    # searching in sorted order keeps the binary searches cache friendly
+    needle_order = np.argsort(incoming_keys)
+    positions = np.empty(len(incoming_keys), dtype=np.intp)
+    positions[needle_order] = np.searchsorted(sorted_keys, incoming_keys[needle_order])
+    positions = np.minimum(positions, len(sorted_keys) - 1)
+    found = sorted_keys[positions] == incoming_keys
+    return np.flatnonzero(found), order[positions[found]]
+
+def diff_frames(stored: pd.DataFrame, incoming: pd.DataFrame) -> pd.DataFrame:
+    """
+    Rows of incoming whose key is stored with different figures (nan and nan count as the same, a figure
+        filled in or blanked out counts as revised), as a revisions table - see revision_columns.
+
+    Joined on one 64-bit hash of the keys (see key_hash) rather than on the four key columns - a binary search
+        of the incoming hashes in the sorted stored ones, as in split_delta. The keys of the revised rows are then
+        compared in full, and if any stored hashes repeat the join is made on the key columns, so a hash
+        collision can't show up as (or hide) a revision.
+    """
+    if stored.empty or incoming.empty:
+        return compact_df(pd.DataFrame(columns=revision_columns))
+    new_row, old_row = _join_keys(stored, incoming)
+    new_figures = incoming["figures"].to_numpy(dtype=float)[new_row]
+    old_figures = stored["figures"].to_numpy(dtype=float)[old_row]
+    revised = ~((new_figures == old_figures) | (np.isnan(new_figures) & np.isnan(old_figures)))
+    new_row, old_row = new_row[revised], old_row[revised]
+
+    new_keys = incoming[merge_keys].iloc[new_row].reset_index(drop=True)
+    old_keys = stored[merge_keys].iloc[old_row].reset_index(drop=True)
+    same_key = (new_keys.astype(str) == old_keys.astype(str)).all(axis=1).to_numpy()
+    new_row, old_row = new_row[same_key], old_row[same_key]
+
+    revisions = incoming[merge_keys].iloc[new_row].reset_index(drop=True)
+    revisions["old_figures"] = stored["figures"].to_numpy(dtype=float)[old_row]
+    revisions["new_figures"] = incoming["figures"].to_numpy(dtype=float)[new_row]
+    revisions["change"] = revisions["new_figures"] - revisions["old_figures"]
+    revisions["pct_change"] = (revisions["change"] / revisions["old_figures"].abs()).replace([np.inf, -np.inf], np.nan)
+    revisions["old_date_published"] = stored["date_published"].to_numpy()[old_row]
+    revisions["new_date_published"] = incoming["date_published"].to_numpy()[new_row]
+    revisions["filename"] = incoming["filename"].to_numpy()[new_row]
+    revisions = revisions.astype({"old_date_published": "datetime64[s]", "new_date_published": "datetime64[s]"})
+    return compact_df(revisions).sort_values(merge_keys, kind="stable", ignore_index=True)
+
+@instrumented()
+def diff_stored(incoming: pd.DataFrame, location: str = "") -> pd.DataFrame:
+    """
+    Revisions incoming makes to the stored table (see diff_frames). Only the stored rows of the years
+        incoming covers, and only the columns compared, are read (see read_table).
+    """
+    years = sorted(int(year) for year in pd.unique(incoming["year"]))
+    stored = read_table(location, years=years, columns=merge_keys + ["figures", "date_published"])
+    revisions = diff_frames(stored, incoming)
+    logging.info(f"Revisions - {len(revisions)} stored figures revised")
+    return revisions
+
+def save_revisions(revisions: pd.DataFrame, location: str = "") -> str | None:
+    """
+    Adds a release's revisions to the feed (nothing is written when it revised nothing)
+    """
+    if revisions.empty:
+        return None
+    published = pd.Timestamp(revisions["new_date_published"].iloc[0]).strftime("%Y-%m-%d")
+    filename = os.path.splitext(str(revisions["filename"].iloc[0]))[0]
+    path = os.path.join(revisions_path(location), f"{published}_{filename}.parquet")
+    return atomic_write(path, lambda tmp_path: revisions.to_parquet(tmp_path, index=False))
+
+def read_revisions(location: str = "", since: str | None = None) -> pd.DataFrame:
+    """
+    The revision feed - every release's revisions, oldest release first, or only those published on or after since
+    """
+    path = revisions_path(location)
+    files = sorted(f for f in os.listdir(path) if f.endswith(".parquet")) if os.path.isdir(path) else []
+    if since is not None:
+        since = pd.Timestamp(since).strftime("%Y-%m-%d")
+        files = [f for f in files if f[:10] >= since]
+    if not files:
+        return compact_df(pd.DataFrame(columns=revision_columns))
+    revisions = pd.concat([pd.read_parquet(os.path.join(path, f)) for f in files], ignore_index=True)
+    return compact_df(revisions)
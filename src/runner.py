@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import os
+from urllib.parse import urljoin
+from concurrent.futures import Executor, ProcessPoolExecutor
+from src.scraper import extract_from_link, retrieve_filename, confirm_new_file
+from src.http_client import save_body
+from src.link_parser import attachment_links, match_link
+from src.manifest import load_manifest, save_manifest, record_ingest
+from src.pipeline import parse_workbook, save_release
+
+async def fetch(
+    link: str,
+    limit: asyncio.Semaphore,
+    cache_dir: str | None = None,
+    stream: bool = False
+):
+    """
+    extract_from_link on a worker thread, holding one of the global request slots while it runs
+        (retry waits included, so a struggling server doesn't get more requests than the limit allows)
+    """
+    async with limit:
+        return await asyncio.to_thread(extract_from_link, link=link, retries=2, cache_dir=cache_dir, stream=stream)
+
+async def fetch_links(
+    landing_page: str,
+    limit: asyncio.Semaphore,
+    cache_dir: str | None = None
+) -> list[tuple[str, str]]:
+    landing_response = await fetch(landing_page, limit, cache_dir=cache_dir)
+    return attachment_links(landing_response.content)
+
+async def run_dataset(
+    name: str,
+    dataset: dict,
+    location: str,
+    limit: asyncio.Semaphore,
+    executor: Executor,
+    cache_dir: str | None = None,
+    output_format: str = "csv",
+    write_mode: str = "merge",
+    download_if_not_new: bool = False,
+    download_dir: str = "downloads/",
+    views: bool = False,
+    revisions: bool = False,
+    pages: dict | None = None
+) -> dict:
+    """
+    Same steps as main() for one dataset of the registry (see src/datasets.py). Requests go through
+        the shared limit, parsing and transforming go to the executor, and saving runs on a thread,
+        so the event loop is free to move the other datasets along meanwhile.
+
+    views and revisions keep the dataset's materialized views and revision feed up to date (see save_release).
+    Workbooks are copied from the download spool into download_dir for the worker, and removed once parsed.
+    pages holds the attachment links of each landing page (as tasks), shared between the datasets of a run -
+        datasets on the same landing page fetch and parse it once.
+
+    Never raises - failures are logged and reported in the returned status, so one broken dataset
+        doesn't stop the others.
+    """
+    location = f"{location}{dataset['location']}"
+    if location:
+        os.makedirs(location, exist_ok=True)
+    status = {"dataset": name, "status": None, "filename": None, "rows": 0}
+    pages = {} if pages is None else pages
+    try:
+        landing_page = dataset["landing_page"]
+        if landing_page not in pages:
+            pages[landing_page] = asyncio.ensure_future(fetch_links(landing_page, limit, cache_dir=cache_dir))
+        href = match_link(await pages[landing_page], dataset["link_text"])
+        if href is None:
+            raise RuntimeError(f"File link not found - {dataset['link_text']}")
+        excel_link = urljoin(landing_page, href)
+        status["filename"] = excel_filename = retrieve_filename(excel_link)
+
+        if not confirm_new_file(excel_filename, download_if_not_new, location, excel_link=excel_link):
+            status["status"] = "unchanged"
+            return status
+
+        excel_response = await fetch(excel_link, limit, cache_dir=cache_dir, stream=True)
+        content_hash = excel_response.sha256
+        if not confirm_new_file(excel_filename, download_if_not_new, location, content_hash=content_hash):
+            excel_response.body_file.close()
+            status["status"] = "unchanged"
+            return status
+
+        # the worker reads the workbook from disk, so it's never held whole in memory or pickled as bytes
+        path = await asyncio.to_thread(save_body, excel_response, os.path.join(download_dir, f"{name}-{excel_filename}"))
+        try:
+            published_date_ts, final_df = await asyncio.get_running_loop().run_in_executor(
+                executor,
+                parse_workbook,
+                path,
+                excel_filename,
+                dataset["sheet_name"],
+                dataset["skiprows"],
+                dataset["resource_checks"]
+            )
+        finally:
+            os.remove(path)
+
+        await asyncio.to_thread(
+            save_release,
+            final_df,
+            location,
+            output_format,
+            write_mode,
+            published_date_ts,
+            excel_filename,
+            views = views,
+            revisions = revisions
+        )
+        manifest = load_manifest(location)
+        record_ingest(
+            manifest,
+            filename = excel_filename,
+            url = excel_link,
+            content_hash = content_hash,
+            published_date = published_date_ts.date(),
+            rows = len(final_df)
+        )
+        save_manifest(manifest, location)
+        status.update({"status": "ingested", "rows": len(final_df)})
+    except Exception as e:
+        logging.exception(f"Dataset {name} failed: {e}")
+        status.update({"status": "failed", "error": str(e)})
+    return status
+
+async def run_datasets(
+    datasets: dict,
+    location: str,
+    cache_dir: str | None = None,
+    output_format: str = "csv",
+    write_mode: str = "merge",
+    download_if_not_new: bool = False,
+    download_dir: str = "downloads/",
+    views: bool = False,
+    revisions: bool = False,
+    max_concurrency: int = 4,
+    parse_workers: int | None = None
+) -> list[dict]:
+    """
+    Runs every dataset given (name -> registry entry) at once. At most max_concurrency requests are
+        in flight across all of them, and workbooks are parsed on a process pool of parse_workers,
+        so N datasets take about as long as the slowest one rather than the sum.
+        Returns each dataset's status, in the order given.
+    """
+    limit = asyncio.Semaphore(max_concurrency)
+    pages = {}
+    with ProcessPoolExecutor(max_workers=parse_workers) as executor:
+        statuses = await asyncio.gather(*(
+            run_dataset(
+                name,
+                dataset,
+                location,
+                limit,
+                executor,
+                cache_dir = cache_dir,
+                output_format = output_format,
+                write_mode = write_mode,
+                download_if_not_new = download_if_not_new,
+                download_dir = download_dir,
+                views = views,
+                revisions = revisions,
+                pages = pages
+            )
+            for name, dataset in datasets.items()
+        ))
+    for status in statuses:
+        logging.info(f"Dataset run - {status}")
+    return statuses
@@ -1,49 +1,128 @@
-import numpy as np
-import pandas as pd 
+from __future__ import annotations
 import requests
 import time
 from requests import Response
-from bs4 import BeautifulSoup
 import io
 import re
 import os
 from datetime import datetime
-import dateutil.parser
 import logging
+from typing import TYPE_CHECKING
+from src.http_client import (
+    default_timeout,
+    get_session,
+    retry_after_seconds,
+    backoff_delay,
+    spool_response,
+    cache_stats,
+    load_cache_entry,
+    conditional_headers,
+    store_cache_entry,
+    response_from_cache,
+    is_from_cache,
+    parsed_cache_path
+)
+from src.manifest import load_manifest, is_new_content
+from src.link_parser import find_attachment_link
+from src.excel_reader import quarter_sheet, quarter_skiprows
+from src.instrumentation import instrumented
 
-def extract_from_link(link: str, retries: int, delay: int = 10) -> Response:
+# pandas, bs4, dateutil and the excel readers are imported where they are used, so a run that finds
+# no new file (landing page, link, manifest lookup) never loads them - see benchmarks/bench_startup.py
+if TYPE_CHECKING:
+    import pandas as pd
+
+oil_link_text = "Supply and use of crude oil, natural gas liquids and feedstocks"
+
+@instrumented()
+def extract_from_link(
+    link: str, 
+    retries: int, 
+    delay: float = 10, 
+    cache_dir: str | None = None, 
+    timeout: tuple[float, float] = default_timeout, 
+    stream: bool = False
+) -> Response:
     """
-    Gets content from actual government site.
+    Gets content from actual government site, through the shared pooled session.
     Attempts a number of retries. Each time it does not work, an error is logged with, along with status code. 
+    Between attempts it waits with exponential backoff and jitter (delay is the base), unless the server 
+        sends a Retry-After header, which is respected (up to max_backoff seconds). Timeouts are (connect, read) in seconds. 
+
+    If cache_dir is given, previous responses are revalidated with If-None-Match/If-Modified-Since. 
+        A 304 reply means the stored body is returned instead of being downloaded again. 
+
+    With stream=True (used for the workbook) the body is spooled to a temporary file in chunks and hashed 
+        on the way in - see response.body_file and response.sha256. 
 
     If NOTHING is retrieved, the rest of the code is useless, so a RuntimeError is thrown to stop the code. 
     """
+    entry = load_cache_entry(cache_dir, link) if cache_dir else None
+    headers = conditional_headers(entry)
+    session = get_session()
+    response = None
+    last_issue = None
 
     for r in range(retries):
-        response = requests.get(link)
-        if response.status_code == 200:
-            return response
-        logging.error(f"Issue with get request from link - {response.status_code}")
-        time.sleep(delay)
+        try:
+            response = session.get(link, headers=headers, timeout=timeout, stream=stream)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            response = None
+            last_issue = f"{type(e).__name__}: {e}"
+            logging.error(f"Issue with get request from link - {last_issue}")
+        else:
+            if response.status_code == 304 and entry:
+                cache_stats["hits"] += 1
+                cache_stats["bytes_saved"] += entry.get("size", 0)
+                logging.info(f"Not modified since last download, using cached copy - {link}")
+                return response_from_cache(cache_dir, link, entry, stream=stream)
+            if response.status_code == 200:
+                if stream:
+                    response.body_file, response.sha256 = spool_response(response)
+                if cache_dir:
+                    cache_stats["misses"] += 1
+                    store_cache_entry(cache_dir, link, response)
+                return response
+            last_issue = f"status code {response.status_code}"
+            if stream:
+                response.close()
+            logging.error(f"Issue with get request from link - {response.status_code}")
+
+        if r < retries - 1:
+            wait = retry_after_seconds(response)
+            time.sleep(wait if wait is not None else backoff_delay(r, delay))
     
-    raise RuntimeError(f"Unsuccessful get request from link after {retries} attempts. Last status code: {response.status_code}")
+    raise RuntimeError(f"Unsuccessful get request from link after {retries} attempts. Last issue: {last_issue}")
 
-def get_excel_link(response: Response) -> str:
+@instrumented()
+def get_excel_link(response: Response, link_text: str = oil_link_text, fast_parser: bool = True) -> str:
     """
     Loops through all elements in response content, where the class attribute is:
         'govuk-link gem-c-attachment__link'
 
-    Going through the list, if one of them has the specific text, then it is selected
+    Going through the list, if one of them has the specific text, then it is selected. 
+        link_text is a regular expression searched for in the link text (case insensitive) - 
+        by default the crude oil table of the oil section. 
+
+    The fast parser streams the page through an HTMLParser and stops at the matching link (see src/link_parser.py). 
+        fast_parser=False builds the full BeautifulSoup tree, as it originally did. 
 
     If nothing is found, the rest of the code in main.py is futile, so throws an error. 
     """
+    if fast_parser:
+        excel_link = find_attachment_link(response.content, link_text)
+        if excel_link:
+            return excel_link
+        raise RuntimeError(f"File link not found - {link_text}")
+
+    from bs4 import BeautifulSoup
     soup = BeautifulSoup(response.content, "html.parser")
     links = soup.find_all("a", class_="govuk-link gem-c-attachment__link")
     for link in links:
-        if "Supply and use of crude oil, natural gas liquids and feedstocks" in link.text:
+        if re.search(link_text, link.text, re.IGNORECASE):
             excel_link = link["href"]
             return excel_link
-    raise RuntimeError(f"File link not found - Supply and use of crude oil, natural gas liquids and feedstocks")
+    raise RuntimeError(f"File link not found - {link_text}")
 
 def retrieve_filename(excel_link: str) -> str:
     """
@@ -52,10 +131,13 @@ def retrieve_filename(excel_link: str) -> str:
     """
     return excel_link.split("/")[-1]
 
+@instrumented()
 def confirm_new_file( 
     current_filename: str, 
     download_if_not_new: bool = False, 
     csv_location: str = "",
+    excel_link: str | None = None,
+    content_hash: str | None = None
 ) -> bool:
     """
     Checks to see if there's a new file or not. If there is, then we can carry on through 
@@ -65,21 +147,26 @@ def confirm_new_file(
     - current_filename is the filename extracted from the excel link. 
     - download_if_not_new suggests that, if a file is detected and it is NOT new 
         in reference to the existing DeltaTable.csv, it will still download (to see how it works)
-    - csv_location is the folder from the root directory which hosts the csv file from
-         which we can read the previous filename from
+    - csv_location is the folder from the root directory which hosts the ingestion manifest 
+        (manifest.json, next to DeltaTable.csv) from which we look up previous ingests
+    - excel_link, if given, flags a known filename as new when it now sits under a different link
+    - content_hash, if given (after download), flags a known filename as new when its content has changed
     """
 
     if download_if_not_new:
         return True
 
-    csv_path = f"{csv_location}DeltaTable.csv"
+    # in reality, this process would be a scalar query from a table on the cloud
+    manifest = load_manifest(csv_location)
+    return is_new_content(manifest, current_filename, url=excel_link, content_hash=content_hash)
 
-    if os.path.exists(csv_path):
-        df = pd.read_csv(csv_path) # in reality, this process would have a scalar query from a table on the cloud
-        unique_values = df["filename"].unique().tolist()
-        if current_filename in unique_values:
-            return False
-    return True
+def parse_published_date(published_text: str) -> datetime:
+    """
+    The first line of the cover sheet text ends with the published date, e.g. "... 30 July 2024"
+    """
+    import dateutil.parser
+    published_date_str = " ".join(published_text.split("\n")[0].split(" ")[-3:])
+    return dateutil.parser.parse(published_date_str)
 
 def extract_published_date(excel_file: pd.ExcelFile) -> datetime:
     """
@@ -87,29 +174,85 @@ def extract_published_date(excel_file: pd.ExcelFile) -> datetime:
 
     Use of dateutil.parser, as it is applicable to a range of date formats. 
     """
+    import pandas as pd
     try:
         df_published_info = pd.read_excel(excel_file, sheet_name="Cover Sheet", skiprows=3, header=None)
-        published_date_str = " ".join(df_published_info.iloc[0,0].split("\n")[0].split(" ")[-3:])
-        published_date_ts = dateutil.parser.parse(published_date_str)
-        return published_date_ts
+        return parse_published_date(df_published_info.iloc[0,0])
     except Exception as e:
         raise RuntimeError(f"Issue with retrieving published date: {e}")
 
-def extract_resource_df(excel_file: pd.ExcelFile) -> pd.DataFrame:
+def lower_resource_column(df_quarter: pd.DataFrame) -> pd.DataFrame:
+    df_quarter[df_quarter.columns[0]] = df_quarter[df_quarter.columns[0]].str.lower() # lowers so it's easy to debug
+    return df_quarter
+
+def extract_resource_df(
+    excel_file: pd.ExcelFile, 
+    sheet_name: str = quarter_sheet, 
+    skiprows: int = quarter_skiprows
+) -> pd.DataFrame:
     """
     Extracts the main df from the Quarter tab with the resource production, import, export, and other info. 
     """
-    df_quarter = pd.read_excel(excel_file, sheet_name="Quarter", skiprows=4)
-    df_quarter[df_quarter.columns[0]] = df_quarter[df_quarter.columns[0]].str.lower() # lowers so it's easy to debug
-    return df_quarter
+    import pandas as pd
+    df_quarter = pd.read_excel(excel_file, sheet_name=sheet_name, skiprows=skiprows)
+    return lower_resource_column(df_quarter)
+
+def read_workbook(
+    source, 
+    fast_reader: bool = True, 
+    engine: str = "auto", 
+    sheet_name: str = quarter_sheet, 
+    skiprows: int = quarter_skiprows
+) -> tuple[datetime, pd.DataFrame]:
+    """
+    Reads the published date and Quarter worksheet (or sheet_name, for other datasets) from a workbook file object. 
+
+    The fast reader streams just the two sheet ranges needed in one pass (see src/excel_reader.py). 
+        fast_reader=False goes through pd.ExcelFile and pd.read_excel, as it originally did. 
+    """
+    if not fast_reader:
+        import pandas as pd
+        with pd.ExcelFile(source) as stored_excel_file:
+            df_quarter = extract_resource_df(stored_excel_file, sheet_name=sheet_name, skiprows=skiprows)
+            published_date_ts = extract_published_date(stored_excel_file)
+        return published_date_ts, df_quarter
+
+    from src.excel_reader import read_sheet_ranges
+    published_text, df_quarter = read_sheet_ranges(source, engine=engine, sheet_name=sheet_name, skiprows=skiprows)
+    try:
+        published_date_ts = parse_published_date(published_text)
+    except Exception as e:
+        raise RuntimeError(f"Issue with retrieving published date: {e}")
+    return published_date_ts, lower_resource_column(df_quarter)
             
-def get_info(response: Response = None) -> tuple[datetime, pd.DataFrame]:
+@instrumented()
+def get_info(
+    response: Response = None, 
+    fast_reader: bool = True, 
+    engine: str = "auto"
+) -> tuple[datetime, pd.DataFrame]:
     """
     Produces a published date timestamp and the dataframe from Quarter worksheet
+
+    If the response came from the http cache and was parsed before, the stored result is reused. 
+    Streamed responses are read from their spooled file, which is closed once parsed. 
+    fast_reader and engine are passed on to read_workbook. 
     """
+    import pandas as pd
+    body_file = getattr(response, "body_file", None)
+    parsed_path = parsed_cache_path(response)
+    try:
+        if parsed_path and is_from_cache(response) and os.path.exists(parsed_path):
+            logging.info("Workbook not modified - reusing previously parsed worksheets")
+            return pd.read_pickle(parsed_path)
+
+        source = body_file if body_file is not None else io.BytesIO(response.content)
+        published_date_ts, df_quarter = read_workbook(source, fast_reader=fast_reader, engine=engine)
+    finally:
+        if body_file is not None:
+            body_file.close()
 
-    stored_excel_file = pd.ExcelFile(io.BytesIO(response.content))
-    df_quarter = extract_resource_df(stored_excel_file)
-    published_date_ts = extract_published_date(stored_excel_file)
+    if parsed_path:
+        pd.to_pickle((published_date_ts, df_quarter), parsed_path)
     return published_date_ts, df_quarter
 
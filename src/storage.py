@@ -0,0 +1,322 @@
+import hashlib
+import json
+import logging
+import os
+import uuid
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from src.atomic import atomic_write
+from src.transform import compact_df, is_compact
+
+# hive style layout under the output folder: DeltaTable/year=YYYY/quarter=Q/part-<id>.parquet
+table_dirname = "DeltaTable"
+partition_columns = ["year", "quarter"]
+merge_keys = ["year", "quarter", "category", "resource"]
+column_order = ["resource", "category", "figures", "year", "quarter", "date_published", "date_processed", "filename"]
+partition_schema = pa.schema([("year", pa.int16()), ("quarter", pa.int8())])
+log_dirname = "_log" # transaction log of a versioned table, see src/versioning.py
+# a partition's files are replaced through a swap (see swap_partition_files): the new files are written under
+# staged names readers skip, then _swap.json records which to rename and which to remove
+staged_prefix = "_staged-"
+swap_filename = "_swap.json"
+compression = "zstd"
+row_group_size = 64 * 1024
+
+def table_path(location: str = "") -> str:
+    return os.path.join(location, table_dirname) if location else table_dirname
+
+def partition_path(location: str, year: int, quarter: int) -> str:
+    return os.path.join(table_path(location), f"year={year}", f"quarter={quarter}")
+
+def stored_partitions(location: str = "") -> list[tuple[int, int]]:
+    """
+    (year, quarter) of each partition folder of the table - from folder names only
+    """
+    base = table_path(location)
+    partitions = []
+    for year_dir in (sorted(os.listdir(base)) if os.path.isdir(base) else []):
+        if not year_dir.startswith("year="):
+            continue
+        for quarter_dir in sorted(os.listdir(os.path.join(base, year_dir))):
+            if quarter_dir.startswith("quarter="):
+                partitions.append((int(year_dir[len("year="):]), int(quarter_dir[len("quarter="):])))
+    return partitions
+
+def check_not_versioned(location: str = "") -> None:
+    """
+    Files of a versioned table stay on disk after they are replaced (older versions still use them), 
+        so listing or rewriting partition folders directly would give wrong results
+    """
+    if os.path.isdir(os.path.join(table_path(location), log_dirname)):
+        raise RuntimeError(f"{table_path(location)} is a versioned table - use src.versioning to read and write it")
+
+def is_data_file(name: str) -> bool:
+    """
+    Leaves out temp files of writes in progress (or that crashed), as pyarrow does when listing a folder
+    """
+    return name.endswith(".parquet") and not name.startswith((".", "_"))
+
+def partition_files(location: str, year: int, quarter: int) -> list[str]:
+    path = partition_path(location, year, quarter)
+    if not os.path.isdir(path):
+        return []
+    return sorted(os.path.join(path, f) for f in os.listdir(path) if is_data_file(f))
+
+def content_hash(df: pd.DataFrame) -> str:
+    """
+    Fingerprint of a partition's rows, leaving out date_processed - which changes on every run
+        even when nothing else does. Stored in the parquet footer, so comparing costs one metadata read.
+    """
+    hashed = pd.util.hash_pandas_object(df.drop(columns=["date_processed"], errors="ignore"), index=False)
+    return hashlib.sha256(hashed.to_numpy().tobytes()).hexdigest()
+
+def stored_content_hash(path: str) -> str | None:
+    metadata = pq.read_schema(path).metadata or {}
+    value = metadata.get(b"content_hash")
+    return value.decode() if value else None
+
+def write_parquet_file(
+    df: pd.DataFrame, 
+    directory: str, 
+    fingerprint: str | None = None, 
+    metadata: dict[bytes, bytes] | None = None, 
+    row_group_rows: int = row_group_size, 
+    prefix: str = "part-"
+) -> str:
+    """
+    Writes one file of a partition (partition columns left out, as the folder names hold them).
+        Written to a temp name then renamed, so readers never see half a file. Files to be swapped in
+        later are written with prefix=staged_prefix (see swap_partition_files).
+    """
+    os.makedirs(directory, exist_ok=True)
+    table = pa.Table.from_pandas(df.drop(columns=partition_columns, errors="ignore"), preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        **(metadata or {}),
+        b"content_hash": (fingerprint or content_hash(df)).encode()
+    })
+    path = os.path.join(directory, f"{prefix}{uuid.uuid4().hex}.parquet")
+    # temp name starting with "." - skipped when data files are listed, and removed by vacuum if left behind
+    return atomic_write(
+        path, 
+        lambda tmp_path: pq.write_table(table, tmp_path, compression=compression, row_group_size=row_group_rows, write_statistics=True), 
+        tmp_path = os.path.join(directory, f".tmp-{os.path.basename(path)}")
+    )
+
+def finish_partition_swap(directory: str) -> None:
+    """
+    Carries out the swap recorded in a partition's _swap.json - staged files renamed to their final names, then
+        the files they replace removed, then _swap.json. Each step is skipped if already done, so a swap that
+        stopped part way is finished by calling this again.
+    """
+    swap_path = os.path.join(directory, swap_filename)
+    with open(swap_path, "r", encoding="utf-8") as f:
+        swap = json.load(f)
+    for staged, final in swap["staged"].items():
+        if os.path.exists(os.path.join(directory, staged)):
+            os.replace(os.path.join(directory, staged), os.path.join(directory, final))
+    for name in swap["replaced"]:
+        if os.path.exists(os.path.join(directory, name)):
+            os.remove(os.path.join(directory, name))
+    os.remove(swap_path)
+
+def swap_partition_files(directory: str, staged_paths: list[str], replaced_paths: list[str]) -> list[str]:
+    """
+    Replaces a partition's files with files written under staged names (write_parquet_file with staged_prefix),
+        and returns their final paths. Once _swap.json is written the swap is finished even if this stops part
+        way (see recover_partition_swaps) - before that, only staged files nobody reads are left behind.
+    """
+    staged = {os.path.basename(path): os.path.basename(path).replace(staged_prefix, "part-", 1) for path in staged_paths}
+    swap_path = os.path.join(directory, swap_filename)
+    swap = {"staged": staged, "replaced": [os.path.basename(path) for path in replaced_paths]}
+    atomic_write(swap_path, lambda f: json.dump(swap, f), "w")
+    finish_partition_swap(directory)
+    return [os.path.join(directory, final) for final in staged.values()]
+
+def replace_partition(df: pd.DataFrame, location: str, year: int, quarter: int, fingerprint: str | None = None) -> str:
+    """
+    Writes df as the only file of its partition - staged, then swapped in for the files there (see swap_partition_files)
+    """
+    directory = partition_path(location, year, quarter)
+    existing = partition_files(location, year, quarter)
+    staged = write_parquet_file(df, directory, fingerprint, prefix=staged_prefix)
+    return swap_partition_files(directory, [staged], existing)[0]
+
+def recover_partition_swaps(location: str = "") -> int:
+    """
+    Finishes the partition swaps a crash interrupted, and removes staged files of swaps that never got as far as
+        _swap.json (the files they were to replace are all still there). Returns the partitions repaired.
+    """
+    repaired = 0
+    for year, quarter in stored_partitions(location):
+        directory = partition_path(location, year, quarter)
+        names = os.listdir(directory)
+        if swap_filename in names:
+            finish_partition_swap(directory)
+        elif any(name.startswith(staged_prefix) for name in names):
+            for name in names:
+                if name.startswith(staged_prefix):
+                    os.remove(os.path.join(directory, name))
+        else:
+            continue
+        repaired += 1
+    if repaired:
+        logging.warning(f"Parquet - {repaired} partitions left part way through a file swap repaired in {table_path(location)}")
+    return repaired
+
+def save_parquet(
+    df: pd.DataFrame,
+    location: str = ""
+) -> list[tuple[int, int]]:
+    """
+    Writes the output frame as parquet, partitioned by YEAR and subpartitioned by QUARTER (see DeltaTable.md).
+        The whole table is replaced, as with save_csv: stored partitions the frame has no rows in are removed,
+        the same as the validation index and the views are rebuilt from the frame alone on "overwrite".
+
+    A partition whose stored rows are the same as the incoming ones (ignoring date_processed) is left alone,
+        so a run only rewrites the partitions it changed - and those are swapped in (see replace_partition),
+        so a crash never leaves a partition's rows there twice or not at all. Returns the (year, quarter)
+        partitions written or removed.
+    """
+    check_not_versioned(location)
+    recover_partition_swaps(location)
+    written = []
+    for (year, quarter), df_part in df.groupby(partition_columns, sort=True, observed=True):
+        year, quarter = int(year), int(quarter)
+        fingerprint = content_hash(df_part)
+        existing = partition_files(location, year, quarter)
+        if len(existing) == 1 and stored_content_hash(existing[0]) == fingerprint:
+            continue
+        replace_partition(df_part, location, year, quarter, fingerprint)
+        written.append((year, quarter))
+    incoming = set(zip(df["year"].astype(int), df["quarter"].astype(int)))
+    removed = []
+    for year, quarter in stored_partitions(location):
+        if (year, quarter) in incoming:
+            continue
+        directory = partition_path(location, year, quarter)
+        existing = partition_files(location, year, quarter)
+        if existing:
+            swap_partition_files(directory, [], existing)
+            removed.append((year, quarter))
+        for folder in [directory, os.path.dirname(directory)]:
+            if not os.listdir(folder):
+                os.rmdir(folder)
+    logging.info(f"Parquet - {len(written)} partitions written to and {len(removed)} removed from {table_path(location)}")
+    return sorted(written + removed)
+
+def read_partition(location: str, year: int, quarter: int) -> pd.DataFrame:
+    """
+    All rows stored in one partition, with year and quarter put back from the folder names
+    """
+    files = partition_files(location, year, quarter)
+    if not files:
+        return pd.DataFrame(columns=column_order)
+    df = pq.read_table(files).to_pandas()
+    df["year"] = year
+    df["quarter"] = quarter
+    return compact_df(df[column_order])
+
+def merge_frames(
+    existing: pd.DataFrame,
+    incoming: pd.DataFrame,
+    keys: list[str] = merge_keys
+) -> tuple[pd.DataFrame, dict]:
+    """
+    Upsert of incoming into existing on (year, quarter, category, resource), as described in DeltaTable.md:
+        - keys not stored yet are inserted
+        - stored keys are only replaced when figures changed (nan and nan count as the same),
+            so unchanged rows keep their original date_published, date_processed and filename
+        - stored keys missing from incoming are kept
+
+    Done as hash joins on the keys, with no row by row comparison. Returns the merged frame and counts.
+    """
+    if existing.empty:
+        return incoming.reset_index(drop=True), {"inserted": len(incoming), "updated": 0, "unchanged": 0}
+
+    joined = incoming[keys + ["figures"]].merge(
+        existing[keys + ["figures"]], on=keys, how="left", suffixes=("", "_old"), indicator=True
+    )
+    assert len(joined) == len(incoming), "stored table - repeated keys, please investigate"
+    is_new = (joined["_merge"] == "left_only").to_numpy()
+    same = (joined["figures"] == joined["figures_old"]) | (joined["figures"].isna() & joined["figures_old"].isna())
+    is_changed = ~is_new & ~same.to_numpy()
+
+    upserts = incoming[is_new | is_changed]
+    replaced = existing[keys].merge(
+        upserts[keys], on=keys, how="left", indicator=True
+    )["_merge"].to_numpy() == "both"
+
+    kept = existing[~replaced]
+    merged = pd.concat([part for part in [kept, upserts] if len(part)], ignore_index=True)
+    if is_compact(incoming):
+        merged = compact_df(merged)
+    stats = {"inserted": int(is_new.sum()), "updated": int(is_changed.sum()), "unchanged": int((~is_new & ~is_changed).sum())}
+    return merged, stats
+
+def merge_parquet(
+    df: pd.DataFrame,
+    location: str = ""
+) -> dict:
+    """
+    Upserts the output frame into the parquet table. Only the partitions the incoming rows fall in are read,
+        and only partitions with inserted or updated rows are rewritten (see replace_partition).
+    """
+    check_not_versioned(location)
+    recover_partition_swaps(location)
+    totals = {"inserted": 0, "updated": 0, "unchanged": 0, "partitions_written": 0}
+    for (year, quarter), df_part in df.groupby(partition_columns, sort=True, observed=True):
+        year, quarter = int(year), int(quarter)
+        merged, stats = merge_frames(read_partition(location, year, quarter), df_part)
+        for k in stats:
+            totals[k] += stats[k]
+        if stats["inserted"] == 0 and stats["updated"] == 0:
+            continue
+        replace_partition(merged, location, year, quarter)
+        totals["partitions_written"] += 1
+    logging.info(f"Parquet merge - {totals}")
+    return totals
+
+def merge_csv(
+    df: pd.DataFrame,
+    location: str = ""
+) -> dict:
+    """
+    Upserts the output frame into DeltaTable.csv. A single csv can't be read by partition, 
+        but the result is still written with atomic_write, so a failed run never leaves a half written table.
+    """
+    csv_path = f"{location}DeltaTable.csv"
+    if os.path.exists(csv_path):
+        existing = compact_df(pd.read_csv(csv_path, parse_dates=["date_processed"]))
+    else:
+        existing = pd.DataFrame(columns=column_order)
+    merged, stats = merge_frames(existing, compact_df(df))
+    if stats["inserted"] or stats["updated"] or not os.path.exists(csv_path):
+        atomic_write(csv_path, lambda tmp_path: merged.to_csv(tmp_path, index=False))
+    logging.info(f"CSV merge - {stats}")
+    return stats
+
+def read_parquet_table(
+    location: str = "",
+    years: list[int] | None = None,
+    quarters: list[int] | None = None
+) -> pd.DataFrame:
+    """
+    Reads the parquet table back in the output column order and compact types. Filtering by year/quarter
+        prunes on the folder names, so files of other periods are never opened.
+    """
+    path = table_path(location)
+    if not os.path.isdir(path):
+        return pd.DataFrame(columns=column_order)
+    check_not_versioned(location)
+    dataset = ds.dataset(path, format="parquet", partitioning=ds.partitioning(partition_schema, flavor="hive"))
+    condition = None
+    if years is not None:
+        condition = ds.field("year").isin(years)
+    if quarters is not None:
+        quarter_condition = ds.field("quarter").isin(quarters)
+        condition = quarter_condition if condition is None else condition & quarter_condition
+    df = dataset.to_table(filter=condition).to_pandas()
+    return compact_df(df[column_order]).sort_values(partition_columns, kind="stable", ignore_index=True)
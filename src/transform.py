@@ -1,13 +1,13 @@
 import numpy as np
 import pandas as pd 
-import pandera as pa 
-import requests
-from requests import Response
-from bs4 import BeautifulSoup
-import io
-import os
 import re
 from datetime import datetime
+from src.instrumentation import instrumented
+
+# category keywords, in order of priority, and the keywords marking rows a category applies to
+pie_keywords = ["production", "import", "export"]
+pie_resource_keywords = ["production", "import", "export", "crude oil", "ngl", "feedstocks"]
+pie_resource_pattern = re.compile("|".join(re.escape(kw) for kw in pie_resource_keywords))
 
 def retrieve_year_quarter(col: str) -> str:
     match = re.match(r"(\d{4})\D+(\d)", col)
@@ -28,7 +28,7 @@ def retrieve_pie_category(first_col_value):
     """
     pie - production OR import OR export (OR other)
     """
-    for kw in ["production", "import", "export"]:
+    for kw in pie_keywords:
         if kw in first_col_value:
             return kw
     return np.nan
@@ -38,25 +38,39 @@ def nullify_category_if_not_pie(row):
     An additional step to ensure that the 'category' column values are made null
         when production, export, or import values are not appropriate.
     """
-    for kw in ["production", 'import', 'export', "crude oil", "ngl", "feedstocks"]:
+    for kw in pie_resource_keywords:
         if kw in row.iloc[0]:
             return row["category"]
     return np.nan
 
+def assign_pie_category(resource: pd.Series, groups: np.ndarray | None = None) -> pd.Series:
+    """
+    Vectorized version of retrieve_pie_category -> ffill -> nullify_category_if_not_pie -> fillna("other"), 
+        with identical output. 
+
+    np.select keeps the keyword priority of retrieve_pie_category (production, then import, then export), 
+        which a single regex extract would not, as it returns whichever keyword appears first in the text. 
+    groups (one label per row, e.g. the sheet it came from) keeps the forward fill within each group. 
+    """
+    resource = resource.astype(object)
+    conditions = [resource.str.contains(kw, regex=False).fillna(False).to_numpy(dtype=bool) for kw in pie_keywords]
+    category = pd.Series(np.select(conditions, pie_keywords, default=None), index=resource.index, dtype=object)
+
+    # will apply export to where it does not apply
+    category = category.ffill() if groups is None else category.groupby(groups).ffill()
+    applies = resource.str.contains(pie_resource_pattern).fillna(False).to_numpy(dtype=bool)
+    return category.where(applies).fillna("other") # fix the above
+
+@instrumented()
 def extract_pie_df(
     df: pd.DataFrame
 ) -> pd.DataFrame:
     df_pie = df.copy()
-    df_pie["category"] = df_pie[df_pie.columns[0]].apply(retrieve_pie_category)
-    # reorder - to help with further cleaning efforts
-    df_pie.insert(1, "category", df_pie.pop("category"))
-
-    # assign categories
-    df_pie["category"] = df_pie["category"].ffill() # will apply export to where it does not apply
-    df_pie["category"] = df_pie.apply(nullify_category_if_not_pie, axis=1) # fix the above - 1
-    df_pie["category"] = df_pie["category"].fillna("other") # fix the above - 2
+    # assign categories, inserted second - to help with further cleaning efforts
+    df_pie.insert(1, "category", assign_pie_category(df_pie[df_pie.columns[0]]))
     return df_pie
 
+@instrumented()
 def melt_df(
     df: pd.DataFrame
 ) -> pd.DataFrame: 
@@ -65,6 +79,7 @@ def melt_df(
     df_melted = df_melted.rename(columns={df.columns[0]: "resource"})
     return df_melted
 
+@instrumented()
 def clean_df(
     df: pd.DataFrame
 ) -> pd.DataFrame:
@@ -82,6 +97,7 @@ def clean_df(
 
     return clean_df
 
+@instrumented()
 def add_dates(
     df: pd.DataFrame, 
     published_date: datetime
@@ -91,6 +107,7 @@ def add_dates(
     dated_df["date_processed"] = pd.to_datetime(datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
     return dated_df
 
+@instrumented()
 def add_filename(
     df: pd.DataFrame, 
     filename: str
@@ -99,6 +116,156 @@ def add_filename(
     f_df["filename"] = filename
     return f_df
 
+# compact output types - categoricals for the repeated strings, small ints, and a real date
+compact_dtypes = {
+    "resource": "category",
+    "category": "category",
+    "year": "int16",
+    "quarter": "int8",
+    "date_published": "datetime64[s]",
+    "filename": "category"
+}
+
+def compact_df(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converts an output frame (e.g. from the stage by stage chain, or read back from csv) to the compact types. 
+        figures stays float64, as narrowing it would change the stored values. 
+    """
+    return df.astype({col: dtype for col, dtype in compact_dtypes.items() if col in df.columns})
+
+def is_compact(df: pd.DataFrame) -> bool:
+    return "year" in df.columns and df["year"].dtype == np.int16
+
+def parse_year_quarter_columns(columns) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Year and quarter for each quarter column header, worked out once per header 
+        (melt_df + clean_df do it once per melted row). Raises ValueError on a header 
+        that isn't a year and quarter, as clean_df does. 
+    """
+    years, quarters = [], []
+    for col in columns:
+        parts = retrieve_year_quarter(str(col)).split(" ")
+        if len(parts) != 2:
+            raise ValueError(f"unexpected year and quarter format in column: {col}")
+        years.append(int(parts[0]))
+        quarters.append(int(parts[1]))
+    return np.array(years, dtype=np.int64), np.array(quarters, dtype=np.int64)
+
+@instrumented()
+def transform_quarter_df(
+    df: pd.DataFrame, 
+    published_date: datetime, 
+    filename: str, 
+    compact: bool = True
+) -> pd.DataFrame:
+    """
+    Fused version of extract_pie_df -> melt_df -> clean_df -> add_dates -> add_filename. 
+        The values (and the csv written from it) are the same as the chain's. 
+
+    - category is assigned and notes are removed once per resource, then repeated for each quarter
+    - year and quarter are built as integer columns straight from the parsed headers
+    - the output frame is built once from arrays, without the copies between stages
+    - with compact, the columns come out in compact_dtypes (categoricals, int16/int8 and a date) 
+        rather than the chain's object strings and int64
+    """
+    resource = df[df.columns[0]]
+    value_columns = df.columns[1:]
+    n_rows, n_cols = len(df), len(value_columns)
+
+    years, quarters = parse_year_quarter_columns(value_columns)
+    category = assign_pie_category(resource)
+    resource_clean = resource.str.split("[", n=1).str[0].str.strip()
+
+    # melt order is column by column, so per-row values are tiled and per-column values repeated
+    resource_cat = pd.Categorical(resource_clean)
+    category_cat = pd.Categorical(category)
+    out = {
+        "resource": pd.Categorical.from_codes(np.tile(resource_cat.codes, n_cols), dtype=resource_cat.dtype),
+        "category": pd.Categorical.from_codes(np.tile(category_cat.codes, n_cols), dtype=category_cat.dtype),
+        "figures": df[value_columns].to_numpy().ravel("F"),
+        "year": np.repeat(years.astype(compact_dtypes["year"]), n_rows),
+        "quarter": np.repeat(quarters.astype(compact_dtypes["quarter"]), n_rows),
+        "date_published": np.repeat(np.datetime64(published_date.date(), "s"), n_rows * n_cols),
+        "date_processed": pd.to_datetime(datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
+        "filename": pd.Categorical([filename]).repeat(n_rows * n_cols),
+    }
+    final_df = pd.DataFrame(out, index=pd.RangeIndex(n_rows * n_cols))
+    return final_df if compact else chain_types(final_df)
+
+def chain_types(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Back from compact_dtypes to the types the stage by stage chain gives - object strings, int64 and a string date
+    """
+    df = df.astype({
+        "resource": object, 
+        "category": object, 
+        "year": np.int64, 
+        "quarter": np.int64, 
+        "filename": object
+    })
+    df["date_published"] = df["date_published"].dt.strftime("%Y-%m-%d")
+    return df
+
+@instrumented()
+def transform_quarter_dfs(
+    sheets: list[tuple[pd.DataFrame, datetime, str]], 
+    compact: bool = True
+) -> pd.DataFrame:
+    """
+    transform_quarter_df over many Quarter sheets at once, each given as (frame, published date, filename) - e.g. 
+        every release of a backfill. The rows are those of transform_quarter_df on each sheet in turn, concatenated, 
+        but each step runs once over all the sheets rather than once per sheet:
+
+    - every distinct quarter header is parsed once, and the sheets are stacked into one resources x quarters matrix 
+        over the quarters any of them has (a quarter a sheet doesn't have gives it no rows, not nan rows)
+    - category assignment (forward filled within each sheet) and note removal run once over all the resources
+    - the melt is one gather from the matrix, in each sheet's own column order
+    figures come out as float64. Raises ValueError if a sheet has two columns for the same quarter.
+    """
+    if not sheets:
+        raise ValueError("no sheets to transform")
+    headers = list(dict.fromkeys(str(col) for df, _, _ in sheets for col in df.columns[1:]))
+    years, quarters = parse_year_quarter_columns(headers)
+    periods, header_period = np.unique(years * 10 + quarters, return_inverse=True)
+    period_of = dict(zip(headers, header_period))
+
+    sizes = np.array([len(df) for df, _, _ in sheets])
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    figures = np.full((int(sizes.sum()), len(periods)), np.nan)
+    cell_rows, cell_periods, cells = [], [], []
+    for (df, _, filename), start, n_rows in zip(sheets, starts, sizes):
+        columns = np.array([period_of[str(col)] for col in df.columns[1:]], dtype=np.intp)
+        if len(np.unique(columns)) != len(columns):
+            raise ValueError(f"more than one column for the same quarter in {filename}")
+        figures[start:start + n_rows, columns] = df[df.columns[1:]].to_numpy(dtype=float, na_value=np.nan)
+        # melt order is column by column, as in transform_quarter_df
+        cell_rows.append(np.tile(np.arange(start, start + n_rows), len(columns)))
+        cell_periods.append(np.repeat(columns, n_rows))
+        cells.append(n_rows * len(columns))
+    cell_rows, cell_periods, cells = np.concatenate(cell_rows), np.concatenate(cell_periods), np.array(cells)
+
+    resource = pd.concat([df[df.columns[0]] for df, _, _ in sheets], ignore_index=True)
+    category = assign_pie_category(resource, groups=np.repeat(np.arange(len(sheets)), sizes))
+    resource_clean = resource.str.split("[", n=1).str[0].str.strip()
+
+    resource_cat = pd.Categorical(resource_clean)
+    category_cat = pd.Categorical(category)
+    filename_cat = pd.Categorical([filename for _, _, filename in sheets])
+    published = np.array([np.datetime64(published_date.date(), "s") for _, published_date, _ in sheets])
+    out = {
+        "resource": pd.Categorical.from_codes(resource_cat.codes[cell_rows], dtype=resource_cat.dtype),
+        "category": pd.Categorical.from_codes(category_cat.codes[cell_rows], dtype=category_cat.dtype),
+        "figures": figures[cell_rows, cell_periods],
+        "year": (periods // 10).astype(compact_dtypes["year"])[cell_periods],
+        "quarter": (periods % 10).astype(compact_dtypes["quarter"])[cell_periods],
+        "date_published": np.repeat(published, cells),
+        "date_processed": pd.to_datetime(datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
+        "filename": pd.Categorical.from_codes(np.repeat(filename_cat.codes, cells), dtype=filename_cat.dtype),
+    }
+    final_df = pd.DataFrame(out, index=pd.RangeIndex(len(cell_rows)))
+    return final_df if compact else chain_types(final_df)
+
+@instrumented()
 def save_csv(
     df: pd.DataFrame, 
     location: str = ""
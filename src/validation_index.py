@@ -0,0 +1,200 @@
+import logging
+import os
+import numpy as np
+import pandas as pd
+from src.atomic import atomic_write
+from src.storage import merge_keys, table_path, read_parquet_table
+from src.versioning import is_versioned, read_version
+from src.transform import compact_df
+from src.data_integrity import output_schema_validation
+from src.instrumentation import instrumented
+
+# key index of the stored table: one row per (year, quarter, category, resource) with a hash of its figures,
+# so a new workbook can be checked against history without reading the table
+index_columns = merge_keys + ["key_hash", "row_hash"]
+revision_window = 8 # quarters back from the newest one in a workbook where revised figures are expected
+warning_rules = {"unexpected_revisions"} # logged, but don't stop the run
+
+def index_path(location: str = "") -> str:
+    return f"{location}validation_index.parquet"
+
+def row_hash(df: pd.DataFrame) -> np.ndarray:
+    return pd.util.hash_pandas_object(df["figures"], index=False).to_numpy()
+
+def key_hash(keys: pd.DataFrame) -> np.ndarray:
+    """
+    One integer per (year, quarter, category, resource), so lookups are a single hash table probe 
+        rather than a join on four columns. Categoricals hash the same as the strings they hold.
+    """
+    return pd.util.hash_pandas_object(compact_df(keys[merge_keys]), index=False).to_numpy()
+
+def build_index(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Kept sorted by key_hash, so looking keys up is a binary search - no hash table is built over the index
+    """
+    index = compact_df(df[merge_keys]).reset_index(drop=True)
+    index["key_hash"] = key_hash(index)
+    index["row_hash"] = row_hash(df)
+    return index.sort_values("key_hash", kind="stable", ignore_index=True)
+
+def empty_index() -> pd.DataFrame:
+    return build_index(pd.DataFrame(columns=merge_keys + ["figures"]).astype({"year": int, "quarter": int, "figures": float}))
+
+def index_from_table(location: str = "") -> pd.DataFrame:
+    """
+    One-off bootstrap for tables stored before the index existed - the full read of the table
+        (DeltaTable.csv, or the parquet table, versioned or not) only happens here, and the result is saved.
+    """
+    csv_path = f"{location}DeltaTable.csv"
+    if is_versioned(location):
+        df = read_version(location)
+    elif os.path.isdir(table_path(location)):
+        df = read_parquet_table(location)
+    elif os.path.exists(csv_path):
+        df = pd.read_csv(csv_path, usecols=merge_keys + ["figures"])
+    else:
+        return empty_index()
+    index = build_index(df)
+    save_index(index, location)
+    logging.info(f"Validation index bootstrapped from {location or 'root'} with {len(index)} keys")
+    return index
+
+def load_index(location: str = "") -> pd.DataFrame:
+    path = index_path(location)
+    if not os.path.exists(path):
+        return index_from_table(location)
+    return compact_df(pd.read_parquet(path, columns=index_columns))
+
+def save_index(index: pd.DataFrame, location: str = "") -> None:
+    atomic_write(index_path(location), lambda tmp_path: index.to_parquet(tmp_path, index=False))
+
+def split_delta(
+    index: pd.DataFrame, 
+    incoming: pd.DataFrame, 
+    incoming_keys: np.ndarray | None = None, 
+    order: np.ndarray | None = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Masks over incoming of the rows whose key isn't in the index (new) and whose figures differ from it (changed). 
+        incoming_keys and their sort order can be passed in when already worked out.
+    """
+    incoming_keys = key_hash(incoming) if incoming_keys is None else incoming_keys
+    stored_keys = index["key_hash"].to_numpy()
+    if not len(stored_keys):
+        return np.ones(len(incoming), dtype=bool), np.zeros(len(incoming), dtype=bool)
+    # searching in sorted order keeps the binary searches cache friendly (about 4x faster on large frames)
+    order = np.argsort(incoming_keys, kind="stable") if order is None else order
+    positions = np.empty(len(incoming_keys), dtype=np.intp)
+    positions[order] = np.searchsorted(stored_keys, incoming_keys[order])
+    positions = np.minimum(positions, len(stored_keys) - 1)
+    is_new = stored_keys[positions] != incoming_keys
+    is_changed = ~is_new & (index["row_hash"].to_numpy()[positions] != row_hash(incoming))
+    return is_new, is_changed
+
+def period_number(year, quarter) -> np.ndarray:
+    return np.asarray(year, dtype=np.int64) * 4 + np.asarray(quarter, dtype=np.int64) - 1
+
+def periods_present(year, quarter) -> np.ndarray:
+    """
+    Sorted distinct periods - counted with bincount, as there are only a few hundred possible values
+    """
+    periods = period_number(year, quarter)
+    if not len(periods):
+        return periods
+    return np.flatnonzero(np.bincount(periods - periods.min())) + periods.min()
+
+def period_label(period: int) -> str:
+    return f"{period // 4} Q{period % 4 + 1}"
+
+def incremental_check_report(
+    index: pd.DataFrame,
+    incoming: pd.DataFrame,
+    window: int | None = revision_window
+) -> tuple[list[dict], np.ndarray]:
+    """
+    Checks a new output frame against the stored table's index, looking only at what the workbook changes.
+        Failures come back as {"rule", "message", "detail"}, as in input_check_report:
+        - duplicates: keys repeated in the workbook
+        - period_gaps: quarters missing between the latest stored one and the workbook's newest one
+        - unexpected_revisions: changed figures more than window quarters before the workbook's newest quarter
+
+    Also returns the mask of new or changed rows.
+    """
+    failures = []
+
+    def fail(rule: str, message: str, **detail) -> None:
+        failures.append({"rule": rule, "message": message, "detail": detail})
+
+    # repeated keys - equal key hashes sit next to each other once sorted, 
+    #   and only rows sharing a hash are compared in full
+    incoming_keys = key_hash(incoming)
+    order = np.argsort(incoming_keys, kind="stable")
+    same_as_next = incoming_keys[order][1:] == incoming_keys[order][:-1]
+    candidates = np.zeros(len(incoming), dtype=bool)
+    candidates[order[1:][same_as_next]] = True
+    candidates[order[:-1][same_as_next]] = True
+    repeated = np.zeros(len(incoming), dtype=bool)
+    if candidates.any():
+        repeated[candidates] = incoming[candidates].duplicated(subset=merge_keys).to_numpy()
+    if repeated.any():
+        fail("duplicates", "output dataframe - repeated values", keys=incoming.loc[repeated, merge_keys].astype(str).values.tolist())
+        return failures, np.ones(len(incoming), dtype=bool)
+
+    is_new, is_changed = split_delta(index, incoming, incoming_keys, order)
+    if not len(incoming):
+        return failures, is_new | is_changed
+
+    incoming_periods = periods_present(incoming["year"], incoming["quarter"])
+    stored_periods = periods_present(index["year"], index["quarter"])
+    start = min(incoming_periods[0], stored_periods[-1]) if len(stored_periods) else incoming_periods[0]
+    expected = np.arange(start, incoming_periods[-1] + 1)
+    missing = np.setdiff1d(expected, np.union1d(incoming_periods, stored_periods))
+    if len(missing):
+        fail("period_gaps", "output dataframe - quarters missing", periods=[period_label(p) for p in missing])
+
+    if window is not None and is_changed.any():
+        changed_periods = period_number(incoming["year"], incoming["quarter"])[is_changed]
+        too_old = changed_periods <= incoming_periods[-1] - window
+        if too_old.any():
+            revised = incoming.loc[is_changed].loc[too_old, merge_keys]
+            fail(
+                "unexpected_revisions",
+                f"output dataframe - figures revised more than {window} quarters back",
+                keys=revised.astype(str).values.tolist()
+            )
+    return failures, is_new | is_changed
+
+@instrumented()
+def check_increment(
+    index: pd.DataFrame,
+    incoming: pd.DataFrame,
+    sample: int | None = None,
+    window: int | None = revision_window
+) -> dict:
+    """
+    Incremental version of output_schema_validation + output_check_duplicates: the schema is only checked
+        on new or changed rows, and the rest against the index (see incremental_check_report). Raises an
+        AssertionError listing every failing rule, other than warning_rules, which are only logged.
+    """
+    failures, delta = incremental_check_report(index, incoming, window=window)
+    output_schema_validation(incoming[delta], sample=sample)
+    for failure in failures:
+        logging.warning(f"Incremental check - {failure['rule']}: {failure['detail']}")
+    blocking = [failure for failure in failures if failure["rule"] not in warning_rules]
+    if blocking:
+        raise AssertionError("; ".join(failure["message"] for failure in blocking))
+    stats = {"rows": len(incoming), "delta": int(delta.sum()), "warnings": len(failures)}
+    logging.info(f"Incremental check - {stats}")
+    return stats
+
+def update_index(index: pd.DataFrame, incoming: pd.DataFrame, write_mode: str = "merge") -> pd.DataFrame:
+    """
+    The index after incoming is saved - upserted for "merge"/"versioned" (keys missing from incoming are kept,
+        as merge_frames does), or replaced for "overwrite"
+    """
+    incoming_index = build_index(incoming)
+    if write_mode == "overwrite" or index.empty:
+        return incoming_index
+    replaced = np.isin(index["key_hash"].to_numpy(), incoming_index["key_hash"].to_numpy())
+    updated = compact_df(pd.concat([index[~replaced], incoming_index], ignore_index=True))
+    return updated.sort_values("key_hash", kind="stable", ignore_index=True)
@@ -0,0 +1,215 @@
+import json
+import logging
+import os
+from datetime import date, datetime
+import pandas as pd
+import pyarrow.dataset as ds
+from src.storage import (
+    table_path,
+    partition_columns,
+    partition_path,
+    partition_schema,
+    column_order,
+    log_dirname,
+    write_parquet_file,
+    merge_frames
+)
+from src.transform import compact_df
+
+# append-only transaction log, kept next to the data files: DeltaTable/_log/<version>.json
+# (folders starting with "_" are skipped when pyarrow lists the data files)
+checkpoint_interval = 10
+
+def log_path(location: str = "") -> str:
+    return os.path.join(table_path(location), log_dirname)
+
+def is_versioned(location: str = "") -> bool:
+    return os.path.isdir(log_path(location))
+
+def _commit_file(location: str, version: int) -> str:
+    return os.path.join(log_path(location), f"{version:020d}.json")
+
+def _checkpoint_file(location: str, version: int) -> str:
+    return os.path.join(log_path(location), f"{version:020d}.checkpoint.json")
+
+def _versions_in_log(location: str, suffix: str) -> list[int]:
+    if not is_versioned(location):
+        return []
+    return sorted(int(f[:20]) for f in os.listdir(log_path(location)) if f.endswith(suffix) and f[:20].isdigit() and f[20:] == suffix)
+
+def latest_version(location: str = "") -> int:
+    """
+    Latest committed version, or -1 for a table with no commits
+    """
+    versions = _versions_in_log(location, ".json")
+    return versions[-1] if versions else -1
+
+def read_commit(location: str, version: int) -> dict:
+    with open(_commit_file(location, version), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _write_exclusive(path: str, content: dict) -> None:
+    """
+    Writes a log file without ever replacing an existing one - if two runs race for the same version,
+        the second fails rather than silently overwriting the first one's commit.
+    """
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(content, f, indent=1)
+    try:
+        os.link(tmp_path, path)
+    except FileExistsError:
+        raise RuntimeError(f"Version already committed by another writer: {os.path.basename(path)}")
+    finally:
+        os.remove(tmp_path)
+
+def _latest_checkpoint(location: str, at_or_before: int | None = None) -> dict | None:
+    versions = [v for v in _versions_in_log(location, ".checkpoint.json") if at_or_before is None or v <= at_or_before]
+    if not versions:
+        return None
+    with open(_checkpoint_file(location, versions[-1]), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _replay(location: str, version: int) -> tuple[dict, list]:
+    """
+    Active data files and (version, date_published) pairs as of a version. Starts from the nearest
+        checkpoint at or before it, so at most checkpoint_interval commits are replayed.
+    """
+    checkpoint = _latest_checkpoint(location, at_or_before=version)
+    files = dict(checkpoint["files"]) if checkpoint else {}
+    versions = [tuple(v) for v in checkpoint["versions"]] if checkpoint else []
+    start = checkpoint["version"] + 1 if checkpoint else 0
+    for v in range(start, version + 1):
+        commit = read_commit(location, v)
+        for path in commit["remove"]:
+            files.pop(path, None)
+        for path, info in commit["add"].items():
+            files[path] = info
+        versions.append((v, commit["date_published"]))
+    return files, versions
+
+def active_files(location: str = "", version: int | None = None) -> dict:
+    """
+    Data files making up the table at a version (latest by default), keyed by path relative to the table
+    """
+    version = latest_version(location) if version is None else version
+    if version < 0:
+        return {}
+    return _replay(location, version)[0]
+
+def write_checkpoint(location: str, version: int) -> None:
+    files, versions = _replay(location, version)
+    _write_exclusive(_checkpoint_file(location, version), {"version": version, "files": files, "versions": versions})
+
+def write_commit(
+    location: str,
+    add: dict,
+    remove: list[str],
+    date_published: str,
+    filename: str
+) -> int:
+    """
+    Appends a commit to the log listing the data files added and removed, tagged with the published date
+        and filename of the workbook behind it. Data files are never deleted here - older versions still
+        point to them (see src.maintenance.vacuum). Every checkpoint_interval commits a checkpoint is written.
+    """
+    os.makedirs(log_path(location), exist_ok=True)
+    version = latest_version(location) + 1
+    _write_exclusive(_commit_file(location, version), {
+        "version": version,
+        "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "date_published": str(date_published),
+        "filename": filename,
+        "add": add,
+        "remove": remove
+    })
+    if version > 0 and version % checkpoint_interval == 0:
+        write_checkpoint(location, version)
+    return version
+
+def read_files(location: str, relative_paths: list[str], filter=None, columns: list[str] | None = None) -> pd.DataFrame:
+    """
+    Reads the given data files, with year and quarter put back from the partition folders
+    """
+    if not relative_paths:
+        return pd.DataFrame(columns=columns or column_order)
+    base = table_path(location)
+    dataset = ds.dataset(
+        [os.path.join(base, p) for p in relative_paths],
+        format="parquet",
+        partitioning=ds.partitioning(partition_schema, flavor="hive"),
+        partition_base_dir=base
+    )
+    df = dataset.to_table(filter=filter, columns=columns).to_pandas()
+    df = compact_df(df[columns or column_order])
+    return df.sort_values([c for c in partition_columns if c in df.columns], kind="stable", ignore_index=True)
+
+def commit_merge(
+    df: pd.DataFrame,
+    location: str,
+    date_published: str,
+    filename: str
+) -> dict:
+    """
+    Versioned version of merge_parquet. Touched partitions are merged and written as new files, and
+        one commit records the new files and the ones they replace. Nothing is committed if nothing changed.
+    """
+    current = active_files(location)
+    by_partition = {}
+    for path, info in current.items():
+        by_partition.setdefault((info["year"], info["quarter"]), []).append(path)
+
+    totals = {"inserted": 0, "updated": 0, "unchanged": 0, "partitions_written": 0, "version": None}
+    add, remove = {}, []
+    for (year, quarter), df_part in df.groupby(partition_columns, sort=True, observed=True):
+        year, quarter = int(year), int(quarter)
+        existing_paths = by_partition.get((year, quarter), [])
+        merged, stats = merge_frames(read_files(location, existing_paths), df_part)
+        for k in stats:
+            totals[k] += stats[k]
+        if stats["inserted"] == 0 and stats["updated"] == 0:
+            continue
+        new_path = write_parquet_file(merged, partition_path(location, year, quarter))
+        add[os.path.relpath(new_path, table_path(location))] = {
+            "year": year,
+            "quarter": quarter,
+            "rows": len(merged),
+            "date_published": str(date_published),
+            "filename": filename
+        }
+        remove.extend(existing_paths)
+        totals["partitions_written"] += 1
+
+    if add:
+        totals["version"] = write_commit(location, add, remove, date_published, filename)
+    logging.info(f"Versioned merge - {totals}")
+    return totals
+
+def version_as_of(location: str, as_of_date: date | str) -> int:
+    """
+    Latest version whose workbook was published on or before the date, or -1 if none was.
+        Assumes commits are made in published date order (as the pipeline and backfill do).
+    """
+    as_of_date = str(pd.Timestamp(as_of_date).date())
+    version = latest_version(location)
+    if version < 0:
+        return -1
+    checkpoint = _latest_checkpoint(location)
+    versions = [tuple(v) for v in checkpoint["versions"]] if checkpoint else []
+    for v in range(checkpoint["version"] + 1 if checkpoint else 0, version + 1):
+        versions.append((v, read_commit(location, v)["date_published"]))
+    known = [v for v, published in versions if published <= as_of_date]
+    return known[-1] if known else -1
+
+def read_version(location: str = "", version: int | None = None) -> pd.DataFrame:
+    return read_files(location, sorted(active_files(location, version)))
+
+def as_of(location: str, as_of_date: date | str) -> pd.DataFrame:
+    """
+    The table as it was known on a date - only figures published by then, so nothing from the future
+        leaks into e.g. a forecasting dataset (see DeltaTable.md). Rebuilt from the log, no snapshots.
+    """
+    version = version_as_of(location, as_of_date)
+    if version < 0:
+        return pd.DataFrame(columns=column_order)
+    return read_version(location, version)
@@ -0,0 +1,242 @@
+import logging
+import os
+import numpy as np
+import pandas as pd
+from src.atomic import atomic_write
+from src.storage import merge_keys, merge_frames
+from src.query import read_table
+from src.transform import compact_df
+from src.validation_index import period_number
+
+# aggregates analysts would otherwise regroup the long table for, kept up to date on every ingest.
+# One file per view and year, so a refresh only reads and rewrites the years it changes:
+# <location>views/<name>/year=YYYY.parquet
+views_dirname = "views"
+group_keys = ["year", "quarter", "category"]
+view_columns = {
+    # per (year, quarter, category): sum of the figures of its resources, and how many have a figure
+    "totals": group_keys + ["total", "resources"],
+    # per (year, quarter, category, resource): its figures and their share of the category total.
+    #   Also the copy of the table's figures the other views are refreshed from.
+    "shares": merge_keys + ["figures", "share"],
+    # per (year, quarter, category, resource): change on the quarter before and on the same quarter a year before
+    "changes": merge_keys + ["figures", "qoq_change", "qoq_pct", "yoy_change", "yoy_pct"],
+}
+view_keys = {"totals": group_keys, "shares": merge_keys, "changes": merge_keys}
+lags = {"qoq": 1, "yoy": 4} # in quarters
+fingerprints_filename = "_periods.parquet" # fingerprint of the rows of each quarter, written last
+
+def views_path(location: str = "") -> str:
+    return f"{location}{views_dirname}"
+
+def view_path(location: str, name: str) -> str:
+    return os.path.join(views_path(location), name)
+
+def view_file(location: str, name: str, year: int) -> str:
+    return os.path.join(view_path(location, name), f"year={year}.parquet")
+
+def fingerprints_path(location: str = "") -> str:
+    return os.path.join(views_path(location), fingerprints_filename)
+
+def _periods(df: pd.DataFrame) -> np.ndarray:
+    return period_number(df["year"], df["quarter"])
+
+def _in_periods(df: pd.DataFrame, periods) -> np.ndarray:
+    return np.isin(_periods(df), periods)
+
+def _years(periods) -> list[int]:
+    return sorted({int(p) // 4 for p in periods})
+
+def _sorted(df: pd.DataFrame, keys: list[str]) -> pd.DataFrame:
+    return compact_df(df).sort_values(keys, kind="stable", ignore_index=True)
+
+def build_totals(base: pd.DataFrame) -> pd.DataFrame:
+    grouped = base.groupby(group_keys, observed=True, sort=False)["figures"]
+    totals = pd.DataFrame({"total": grouped.sum(min_count=1), "resources": grouped.count().astype(np.int16)})
+    return _sorted(totals.reset_index(), group_keys)
+
+def build_shares(base: pd.DataFrame, totals: pd.DataFrame) -> pd.DataFrame:
+    shares = base[merge_keys + ["figures"]].merge(totals[group_keys + ["total"]], on=group_keys, how="left")
+    # a category totalling 0 has no meaningful shares
+    shares["share"] = (shares["figures"] / shares["total"]).replace([np.inf, -np.inf], np.nan)
+    return _sorted(shares[view_columns["shares"]], merge_keys)
+
+def build_changes(base: pd.DataFrame) -> pd.DataFrame:
+    """
+    Each row is joined to the same (category, resource) lag quarters earlier, on period numbers -
+        so a missing quarter gives no change rather than one against the wrong quarter
+    """
+    series = base[merge_keys + ["figures"]].reset_index(drop=True)
+    series["period"] = _periods(series)
+    changes = series
+    for name, lag in lags.items():
+        earlier = series[["category", "resource", "period", "figures"]].rename(columns={"figures": f"{name}_base"})
+        earlier["period"] += lag
+        changes = changes.merge(earlier, on=["category", "resource", "period"], how="left")
+        changes[f"{name}_change"] = changes["figures"] - changes[f"{name}_base"]
+        changes[f"{name}_pct"] = (changes[f"{name}_change"] / changes[f"{name}_base"].abs()).replace([np.inf, -np.inf], np.nan)
+    return _sorted(changes[view_columns["changes"]], merge_keys)
+
+def build_views(base: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    totals = build_totals(base)
+    return {"totals": totals, "shares": build_shares(base, totals), "changes": build_changes(base)}
+
+def period_fingerprints(df: pd.DataFrame) -> pd.Series:
+    """
+    Per period, the sum (wrapping around) of the hashes of its (key, figures) rows - the same whatever
+        order the rows come in, so a release's quarters can be compared to the stored ones without a join
+    """
+    hashes = pd.util.hash_pandas_object(compact_df(df[merge_keys + ["figures"]]), index=False).to_numpy()
+    periods, positions = np.unique(_periods(df), return_inverse=True)
+    sums = np.zeros(len(periods), dtype=np.uint64)
+    np.add.at(sums, positions, hashes)
+    return pd.Series(sums, index=periods)
+
+def load_fingerprints(location: str = "") -> pd.Series | None:
+    path = fingerprints_path(location)
+    if not os.path.exists(path):
+        return None
+    df = pd.read_parquet(path)
+    return pd.Series(df["fingerprint"].to_numpy(), index=df["period"].to_numpy())
+
+def _save_parquet(df: pd.DataFrame, path: str) -> None:
+    atomic_write(path, lambda tmp_path: df.to_parquet(tmp_path, index=False))
+
+def save_fingerprints(fingerprints: pd.Series, location: str = "") -> None:
+    df = pd.DataFrame({"period": fingerprints.index.to_numpy(dtype=np.int64), "fingerprint": fingerprints.to_numpy(dtype=np.uint64)})
+    _save_parquet(df.sort_values("period", ignore_index=True), fingerprints_path(location))
+
+def stored_years(location: str, name: str) -> list[int]:
+    path = view_path(location, name)
+    if not os.path.isdir(path):
+        return []
+    return sorted(int(f[len("year="):-len(".parquet")]) for f in os.listdir(path) if f.startswith("year=") and f.endswith(".parquet"))
+
+def read_view(name: str, location: str = "", years: list[int] | None = None) -> pd.DataFrame:
+    """
+    A view, sorted by its keys - or only the given years of it, without opening the other files
+    """
+    if name not in view_columns:
+        raise ValueError(f"Unknown view: {name} - views are {', '.join(view_columns)}")
+    present = set(stored_years(location, name))
+    # each file is sorted, so reading them in year order keeps the whole view sorted
+    parts = [pd.read_parquet(view_file(location, name, year)) for year in sorted(years or present) if year in present]
+    if not parts:
+        return compact_df(pd.DataFrame(columns=view_columns[name]))
+    return compact_df(pd.concat(parts, ignore_index=True))
+
+def write_view_years(df: pd.DataFrame, location: str, name: str, years: list[int]) -> None:
+    """
+    Replaces the files of the given years with the rows of df in them (removing those left with none)
+    """
+    year_values = df["year"].to_numpy()
+    for year in years:
+        rows = df[year_values == year]
+        if len(rows):
+            _save_parquet(rows.reset_index(drop=True), view_file(location, name, year))
+        elif os.path.exists(view_file(location, name, year)):
+            os.remove(view_file(location, name, year))
+
+def load_views(location: str = "") -> dict[str, pd.DataFrame] | None:
+    """
+    All of every view, or None if they haven't been built
+    """
+    if load_fingerprints(location) is None:
+        return None
+    return {name: read_view(name, location) for name in view_columns}
+
+def rebuild_views(base: pd.DataFrame, location: str = "") -> None:
+    # without fingerprints the views count as not built, so a rebuild stopped part way is started again
+    if os.path.exists(fingerprints_path(location)):
+        os.remove(fingerprints_path(location))
+    views = build_views(base)
+    for name, df in views.items():
+        years = sorted(set(stored_years(location, name)) | set(int(y) for y in df["year"].unique()))
+        write_view_years(df, location, name, years)
+    save_fingerprints(period_fingerprints(base), location)
+
+def changed_periods(base: pd.DataFrame, incoming: pd.DataFrame) -> np.ndarray:
+    """
+    Sorted periods (see period_number) with rows inserted or figures changed by incoming. Hash join on the keys,
+        as in merge_frames.
+    """
+    joined = incoming[merge_keys + ["figures"]].merge(
+        base[merge_keys + ["figures"]], on=merge_keys, how="left", suffixes=("", "_old"), indicator=True
+    )
+    same = (joined["figures"] == joined["figures_old"]) | (joined["figures"].isna() & joined["figures_old"].isna())
+    changed = (joined["_merge"] == "left_only").to_numpy() | ~same.to_numpy()
+    return np.unique(_periods(joined[changed]))
+
+def _update_view(location: str, name: str, refreshed: pd.DataFrame, periods: np.ndarray) -> None:
+    years = _years(periods)
+    current = read_view(name, location, years=years)
+    kept = current[~_in_periods(current, periods)]
+    updated = _sorted(pd.concat([part for part in [kept, refreshed] if len(part)], ignore_index=True), view_keys[name])
+    write_view_years(updated, location, name, years)
+
+def refresh_views(incoming: pd.DataFrame, location: str = "", write_mode: str = "merge") -> dict:
+    """
+    Brings the views up to date with an ingest saved with write_mode. With "merge"/"versioned":
+        - quarters whose rows hash the same as the stored ones (see period_fingerprints) are skipped
+        - the rest are merged with the stored figures (as merge_frames does for the table), and the totals and
+            shares of the quarters with changed figures are recomputed, with the changes of those quarters and
+            of the quarters one and four later (which are measured against them)
+        - the fingerprints of those quarters are dropped before any view is written and saved again last, so
+            a refresh that stops part way is finished by the next one
+        - only the years holding those quarters are read and rewritten
+    The views are rebuilt from incoming for "overwrite". When they don't exist yet they are built from the
+        stored table, with incoming merged in in case it isn't saved yet (one full read, as when the validation
+        index is bootstrapped) - incoming alone would leave out the quarters it doesn't cover.
+    """
+    incoming = compact_df(incoming[merge_keys + ["figures"]])
+    stored_fingerprints = load_fingerprints(location)
+    if write_mode == "overwrite" or stored_fingerprints is None:
+        base = incoming
+        if write_mode != "overwrite":
+            stored = read_table(location, columns=merge_keys + ["figures"])
+            base, _ = merge_frames(compact_df(stored), incoming)
+        rebuild_views(base, location)
+        stats = {"rebuilt": True, "periods_refreshed": len(np.unique(_periods(base)))}
+        logging.info(f"Views - {stats}")
+        return stats
+
+    incoming_fingerprints = period_fingerprints(incoming)
+    positions = stored_fingerprints.index.get_indexer(incoming_fingerprints.index)
+    same = (positions >= 0) & (stored_fingerprints.to_numpy()[positions] == incoming_fingerprints.to_numpy())
+    candidates = incoming_fingerprints.index.to_numpy()[~same]
+    if not len(candidates):
+        logging.info("Views - nothing changed")
+        return {"rebuilt": False, "periods_refreshed": 0}
+
+    incoming = incoming[_in_periods(incoming, candidates)]
+    base = read_view("shares", location, years=_years(candidates))[merge_keys + ["figures"]]
+    base = base[_in_periods(base, candidates)]
+    # quarters without a fingerprint are new, or were being refreshed by a run that stopped part way - its
+    #   views may already hold the new figures (so they don't show as changed), but not all of them are updated
+    unfinished = candidates[~np.isin(candidates, stored_fingerprints.index.to_numpy())]
+    periods = np.union1d(changed_periods(base, incoming), unfinished)
+    merged, _ = merge_frames(base, incoming)
+
+    if len(periods):
+        # marked unfinished before any view is written
+        save_fingerprints(stored_fingerprints[~stored_fingerprints.index.isin(periods)], location)
+        merged_changed = merged[_in_periods(merged, periods)]
+        totals = build_totals(merged_changed)
+        _update_view(location, "totals", totals, periods)
+        _update_view(location, "shares", build_shares(merged_changed, totals), periods)
+
+        # changes of the quarters after a changed one move too, and need the quarters they are measured against
+        change_periods = np.unique(np.concatenate([periods + lag for lag in [0, *lags.values()]]))
+        needed = np.unique(np.concatenate([change_periods - lag for lag in [0, *lags.values()]]))
+        window = read_view("shares", location, years=_years(needed))[merge_keys + ["figures"]]
+        changes = build_changes(window[_in_periods(window, needed)])
+        _update_view(location, "changes", changes[_in_periods(changes, change_periods)], change_periods)
+
+    # fingerprints of the rows now stored - where the table keeps rows a release doesn't have, they stay
+    #   different from the release's, and those quarters are compared again on the next ingest
+    refreshed = period_fingerprints(merged)
+    kept = stored_fingerprints[~stored_fingerprints.index.isin(refreshed.index)]
+    save_fingerprints(pd.concat([kept, refreshed]), location)
+    stats = {"rebuilt": False, "periods_refreshed": len(periods)}
+    logging.info(f"Views - {stats}")
+    return stats
@@ -0,0 +1,43 @@
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from benchmarks.synthetic import quarter_frame
+from src.transform import transform_quarter_df
+
+# workbooks and outputs shared by the test modules - plain functions, imported with `from conftest import ...`
+
+def quarter_df(figures_offset: float = 0.0) -> pd.DataFrame:
+    return pd.DataFrame({
+        "Column1": ["indigenous production", "crude oil [note 1]", "imports", "exports", "total supply"],
+        "2023 1st quarter": [10.0, 8.0, 5.0, 3.0, 12.0],
+        "2023 2nd quarter": [11.0, 9.0, 6.0, 4.0, 13.0],
+        "2024 1st quarter": [12.0 + figures_offset, 10.0, 7.0, np.nan, 14.0],
+    })
+
+def output_df(figures_offset: float = 0.0) -> pd.DataFrame:
+    return transform_quarter_df(quarter_df(figures_offset), datetime(2024, 7, 30), "ET_3.1_JUL_24.xlsx")
+
+def release_df(q2_figures: list[float], published: datetime, filename: str) -> pd.DataFrame:
+    """
+    Output of a small two quarter release - 2023 Q1 is the same in every one, 2023 Q2 holds q2_figures
+    """
+    df = pd.DataFrame({
+        "Column1": ["indigenous production", "crude oil", "imports", "exports"],
+        "2023 1st quarter": [10.0, 8.0, 5.0, 3.0],
+        "2023 2nd quarter": q2_figures,
+    })
+    return transform_quarter_df(df, published, filename)
+
+history = transform_quarter_df(quarter_frame(n_years=6, start_year=2019), datetime(2024, 7, 30), "ET_3.1_JUL_24.xlsx")
+
+def release(start_year: int = 2019, n_years: int = 4) -> pd.DataFrame:
+    """
+    Output of a workbook covering n_years from start_year, with figures consistent across releases
+    """
+    years = history["year"]
+    return history[(years >= start_year) & (years < start_year + n_years)].reset_index(drop=True)
+
+def revise(df: pd.DataFrame, year: int, quarter: int) -> pd.DataFrame:
+    df = df.copy()
+    df.loc[(df["year"] == year) & (df["quarter"] == quarter), "figures"] += 1
+    return df
@@ -0,0 +1,101 @@
+import functools
+import json
+import os
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import pandas as pd
+import pytest
+from benchmarks.synthetic import write_workbook
+from src.backfill import load_sources, backfill
+from src.http_client import close_session
+from src.manifest import load_manifest
+from src.versioning import latest_version, read_commit, as_of, read_version
+from src.views import load_views, build_views
+from src.revisions import read_revisions
+
+releases = [
+    ("ET_3.1_SEP_24.xlsx", "26 September 2024", 2),
+    ("ET_3.1_JUN_24.xlsx", "27 June 2024", 0),
+    ("ET_3.1_JUL_24.xlsx", "30 July 2024", 1),
+]
+
+@pytest.fixture
+def workbook_dir(tmp_path):
+    directory = tmp_path / "workbooks"
+    directory.mkdir()
+    for filename, published, seed in releases:
+        write_workbook(str(directory / filename), n_blocks=1, n_years=2, published=published, seed=seed)
+    return directory
+
+@pytest.fixture
+def server_url(workbook_dir):
+    close_session()
+    handler = functools.partial(SimpleHTTPRequestHandler, directory=str(workbook_dir))
+    handler.log_message = lambda *args: None
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    close_session()
+    server.shutdown()
+    server.server_close()
+
+def test_load_sources(tmp_path):
+    text_path = tmp_path / "sources.txt"
+    text_path.write_text("# past releases\nhttps://a/ET_1.xlsx\n\nlocal/ET_2.xlsx\nhttps://a/ET_1.xlsx\n")
+    assert load_sources(str(text_path)) == ["https://a/ET_1.xlsx", "local/ET_2.xlsx"]
+
+    manifest_path = tmp_path / "manifest.json"
+    manifest_path.write_text(json.dumps({"latest": {}, "ingests": [{"url": "https://a/ET_1.xlsx"}, {"url": None}]}))
+    assert load_sources(str(manifest_path)) == ["https://a/ET_1.xlsx"]
+
+def test_backfill_commits_in_published_order_and_resumes(tmp_path, workbook_dir, server_url):
+    location = f"{tmp_path}/table/"
+    # a mix of urls and local files, listed out of published order
+    sources = [
+        f"{server_url}/{releases[0][0]}", 
+        str(workbook_dir / releases[1][0]), 
+        f"{server_url}/{releases[2][0]}",
+        str(workbook_dir / "missing.xlsx")
+    ]
+    progress = backfill(sources, location, download_dir=f"{tmp_path}/downloads", download_workers=2, parse_workers=2, views=True, revisions=True)
+    assert progress["committed"] == 3 and progress["failed"] == 1
+
+    assert [read_commit(location, v)["filename"] for v in range(latest_version(location) + 1)] == [
+        "ET_3.1_JUN_24.xlsx", "ET_3.1_JUL_24.xlsx", "ET_3.1_SEP_24.xlsx"
+    ]
+    assert set(as_of(location, "2024-07-01")["filename"]) == {"ET_3.1_JUN_24.xlsx"}
+    assert len(load_manifest(location)["ingests"]) == 3
+    # views refreshed commit by commit end up as if built from the final table
+    views, expected = load_views(location), build_views(read_version(location))
+    for name in expected:
+        pd.testing.assert_frame_equal(views[name], expected[name], check_categorical=False)
+    # the first release had nothing to revise, the other two (other seeds) revise every figure
+    feed = read_revisions(location)
+    assert list(feed["filename"].unique()) == ["ET_3.1_JUL_24.xlsx", "ET_3.1_SEP_24.xlsx"]
+    assert len(feed) == 2 * len(read_version(location))
+    # parsed releases are spilled to the download folder until committed, then removed
+    assert os.listdir(f"{tmp_path}/downloads/parsed") == []
+
+    # a rerun (e.g. after a crash) skips what was already committed
+    progress = backfill(sources[:3], location, download_dir=f"{tmp_path}/downloads", download_workers=2, parse_workers=2)
+    assert progress["skipped"] == 3 and progress["committed"] == 0
+    assert latest_version(location) == 2
+
+def test_backfill_retry_after_a_failed_source_refuses_older_releases(tmp_path, workbook_dir, caplog):
+    location = f"{tmp_path}/table/"
+    sources = [str(workbook_dir / filename) for filename, _, _ in releases]
+    june = workbook_dir / releases[1][0]
+    june.rename(workbook_dir / "moved.xlsx") # the June source fails, July and September are committed
+    progress = backfill(sources, location, download_dir=f"{tmp_path}/downloads", parse_workers=1)
+    assert progress["committed"] == 2 and progress["failed"] == 1
+    before = read_version(location)
+
+    (workbook_dir / "moved.xlsx").rename(june)
+    progress = backfill(sources, location, download_dir=f"{tmp_path}/downloads", parse_workers=1)
+    assert progress["skipped"] == 2 and progress["refused"] == 1 and progress["committed"] == 0
+    assert "ET_3.1_JUN_24.xlsx" in caplog.text
+    # June's figures never go over September's
+    assert latest_version(location) == 1
+    pd.testing.assert_frame_equal(read_version(location), before)
+    assert "ET_3.1_JUN_24.xlsx" not in load_manifest(location)["latest"]
+    assert os.listdir(f"{tmp_path}/downloads/parsed") == []
@@ -0,0 +1,17 @@
+from benchmarks.suite import run_size, compare, save_results, load_results
+
+def test_run_size_times_every_stage():
+    timings = run_size(n_blocks=1, n_years=2, repeats=1)
+    assert {"get_info openpyxl", "input_checks", "melt_df", "transform_quarter_df", "save_csv", "end to end (csv)"} <= set(timings)
+    assert all(seconds > 0 for seconds in timings.values())
+
+def test_compare_against_baseline(tmp_path):
+    baseline = {"sizes": {"small": {"seconds": {"melt_df": 0.1, "save_csv": 0.2, "clean_df": 0.001}}}}
+    save_results(baseline, f"{tmp_path}/baseline.json")
+    results = {"sizes": {
+        "small": {"seconds": {"melt_df": 0.2, "save_csv": 0.21, "clean_df": 0.002, "new_stage": 1.0}},
+        "large": {"seconds": {"melt_df": 5.0}}
+    }}
+    regressions = compare(results, load_results(f"{tmp_path}/baseline.json"), tolerance=0.25)
+    # save_csv is within tolerance, clean_df's slowdown is timer noise, and nothing to compare the rest with
+    assert [(r["size"], r["stage"], r["ratio"]) for r in regressions] == [("small", "melt_df", 2.0)]
@@ -10,8 +10,13 @@ from src.data_integrity import (
     input_temporal_integrity,
     input_allowable_negative_quantities,
     input_checks, 
-    output_schema_validation
+    input_check_report,
+    output_schema,
+    output_schema_validation,
+    output_check_duplicates,
+    whole_seconds
 )
+from src.transform import compact_df
 
 @pytest.mark.parametrize(
     "df_data, expected_error", 
@@ -159,6 +164,64 @@ def test_input_checks(df_data, expected_error):
     else:
         input_checks(df)
 
+def separate_checks_fail(df: pd.DataFrame) -> set[str]:
+    failed = set()
+    for check in [input_rows_check, input_nulls_check, input_duplicate_rows, input_temporal_integrity, input_allowable_negative_quantities]:
+        try:
+            check(df)
+        except AssertionError:
+            failed.add(check.__name__)
+    return failed
+
+rule_to_check = {
+    "rows": "input_rows_check",
+    "keywords": "input_rows_check",
+    "resource_nulls": "input_nulls_check",
+    "null_share": "input_nulls_check",
+    "duplicates": "input_duplicate_rows",
+    "column_order": "input_temporal_integrity",
+    "quarters_per_year": "input_temporal_integrity",
+    "repeated_periods": "input_temporal_integrity",
+    "negatives": "input_allowable_negative_quantities"
+}
+
+good_input = {
+    "resource": [
+        "production", "feedstock", "crude oil", "crude oil", "crude oil", 
+        "ngls", "ngls", "ngls", "feedstock", "feedstock", "import", "export", "stock change"
+    ],
+    "2023 1st Quarter": [10, 20, 50, 60, 70, 50, 30, 40, 10, 50, 80, 90, -5],
+    "2023 2nd Quarter": [10, 10, 10, 10, 10, 10, 10, 10, 10, 10, 10, 10, 10]
+}
+
+@pytest.mark.parametrize(
+    "changes, expected_rules",
+    [
+        (lambda df: df, set()),
+        (lambda df: df.iloc[:6], {"rows", "keywords"}),
+        (lambda df: df.assign(**{"2023 1st Quarter": df["2023 1st Quarter"].where(df.index != 0, -1)}), {"negatives"}),
+        (lambda df: df.assign(**{"2023 2nd Quarter": np.nan}), {"null_share", "negatives"}), # nan also fails the negatives check
+        (lambda df: pd.concat([df, df.iloc[[1]]], ignore_index=True), {"duplicates"}),
+        (lambda df: df[["resource", "2023 2nd Quarter", "2023 1st Quarter"]], {"column_order"}),
+        (lambda df: df.assign(**{"2023 Quarter 1": 1.0}), {"repeated_periods", "column_order"}),
+        (lambda df: df.assign(**{f"2024 Q{q}": 1.0 for q in [1, 2, 3, 4]}).assign(**{"2024 Q9": 1.0}), {"quarters_per_year"}),
+    ]
+)
+def test_input_check_report_matches_separate_checks(changes, expected_rules):
+    df = changes(pd.DataFrame(good_input))
+    failures = input_check_report(df)
+    assert {f["rule"] for f in failures} == expected_rules
+    assert {rule_to_check[f["rule"]] for f in failures} == separate_checks_fail(df)
+
+def test_input_checks_reports_every_failure():
+    df = pd.DataFrame(good_input).iloc[:6]
+    df.loc[0, "2023 1st Quarter"] = -1
+    with pytest.raises(AssertionError) as e:
+        input_checks(df)
+    assert "too little rows" in str(e.value) and "negative values" in str(e.value)
+    negatives = [f for f in input_check_report(df) if f["rule"] == "negatives"][0]
+    assert negatives["detail"]["resources"] == ["production"]
+
 @pytest.mark.parametrize(
     "df_data, expected_exception", 
     [
@@ -255,4 +318,68 @@ def test_output_schema_validation(df_data, expected_exception):
         with pytest.raises(expected_exception):
             output_schema_validation(df)
     else:
-        output_schema_validation(df)
\ No newline at end of file
+        output_schema_validation(df)
+
+@pytest.mark.parametrize(
+    "overrides, expected_exception",
+    [
+        ({}, None),
+        ({"year": [2023, 2023]}, ValueError), # int64 year in an otherwise compact frame
+        ({"resource": ["oil", None]}, ValueError),
+    ]
+)
+def test_output_schema_validation_compact(overrides, expected_exception):
+    df = compact_df(pd.DataFrame({
+        "resource": ["oil", "ngls"],
+        "category": ["production", "import"],
+        "figures": [100.0, np.nan],
+        "year": [2023, 2023],
+        "quarter": [1, 1],
+        "date_published": ["2023-07-30", "2023-07-30"],
+        "date_processed": [datetime.now().replace(microsecond=0)] * 2,
+        "filename": ["file.csv", "file.csv"]
+    }))
+    for col, values in overrides.items():
+        df[col] = pd.Series(values, dtype=df[col].dtype if col == "resource" else None)
+    if expected_exception:
+        with pytest.raises(expected_exception):
+            output_schema_validation(df)
+    else:
+        output_schema_validation(df)
+        output_check_duplicates(df)
+
+@pytest.mark.parametrize(
+    "timestamps",
+    [
+        [datetime(2024, 7, 30, 9, 30, 5)] * 3,
+        [datetime(2024, 7, 30, 9, 30, 5), datetime(2024, 7, 30, 9, 30, 5, 1)],
+        [pd.Timestamp("2024-07-30 09:30:05.000000001")],
+        [datetime(2024, 7, 30)],
+    ]
+)
+def test_whole_seconds_same_as_strftime(timestamps):
+    series = pd.Series(pd.to_datetime(timestamps))
+    expected = series.apply(lambda x: x.strftime('%Y-%m-%d %H:%M:%S') == str(x)).all()
+    assert whole_seconds(series) == expected
+
+def test_output_schema_built_once():
+    assert output_schema(compact=True) is output_schema(compact=True)
+    assert output_schema(compact=False) is not output_schema(compact=True)
+
+def test_output_schema_validation_sampled():
+    n = 1000
+    df = pd.DataFrame({
+        "resource": ["oil"] * n,
+        "category": ["production"] * n,
+        "figures": np.arange(n, dtype=float),
+        "year": [2023] * n,
+        "quarter": [1] * n,
+        "date_published": ["2023-07-30"] * n,
+        "date_processed": [datetime.now().replace(microsecond=0)] * n,
+        "filename": ["file.csv"] * n
+    })
+    output_schema_validation(df, sample=50)
+
+    # dtypes are checked whatever the sample
+    with pytest.raises(ValueError):
+        output_schema_validation(df.assign(figures=["one hundred"] * n), sample=50)
@@ -0,0 +1,72 @@
+import io
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+from src.excel_reader import read_sheet_ranges, calamine_available
+from src.scraper import read_workbook
+
+def make_workbook_bytes(quarter_rows: list[list], cover_text: str = "Published 30 July 2024\nNext update soon") -> bytes:
+    wb = Workbook()
+    cover = wb.active
+    cover.title = "Cover Sheet"
+    cover["A1"] = "Energy Trends"
+    cover["A4"] = cover_text
+    cover["A6"] = "Contact details"
+    quarter = wb.create_sheet("Quarter")
+    quarter["A1"] = "Supply and use of crude oil"
+    for i, row in enumerate(quarter_rows):
+        for j, value in enumerate(row):
+            quarter.cell(row=5 + i, column=1 + j, value=value)
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+engines = ["openpyxl"] + (["calamine"] if calamine_available() else [])
+
+@pytest.mark.parametrize("engine", engines)
+@pytest.mark.parametrize(
+    "quarter_rows",
+    [
+        # whole numbers, decimals and a gap
+        [
+            ["Column1", "2023 1st quarter", "2023 2nd quarter"],
+            ["Indigenous production", 100, 200.5],
+            ["Crude oil [note 1]", None, 12.25],
+            ["Imports", 300, 0],
+        ],
+        # excel error value, text in a figures column and a trailing empty row
+        [
+            ["Column1", "2023 1st quarter", "2023 2nd quarter", "2023 3rd quarter"],
+            ["Exports", "#N/A", 5, 6],
+            ["Stock change", -4.5, "[x]", 1],
+            [None, None, None, None],
+        ],
+    ]
+)
+def test_fast_reader_matches_read_excel(engine, quarter_rows):
+    data = make_workbook_bytes(quarter_rows)
+    expected_date, expected_df = read_workbook(io.BytesIO(data), fast_reader=False)
+    published_date, df = read_workbook(io.BytesIO(data), fast_reader=True, engine=engine)
+    assert published_date == expected_date
+    pd.testing.assert_frame_equal(df, expected_df)
+
+def test_read_sheet_ranges_cover_text():
+    data = make_workbook_bytes([["Column1", "2023 Q1"], ["Imports", 1]])
+    published_text, _ = read_sheet_ranges(io.BytesIO(data), engine="openpyxl")
+    assert published_text.split("\n")[0] == "Published 30 July 2024"
+
+@pytest.mark.parametrize(
+    "engine, expected_error",
+    [
+        ("xlrd", ValueError),
+    ]
+)
+def test_read_sheet_ranges_bad_engine(engine, expected_error):
+    data = make_workbook_bytes([["Column1", "2023 Q1"], ["Imports", 1]])
+    with pytest.raises(expected_error):
+        read_sheet_ranges(io.BytesIO(data), engine=engine)
+
+def test_missing_published_date():
+    data = make_workbook_bytes([["Column1", "2023 Q1"], ["Imports", 1]], cover_text="no date here")
+    with pytest.raises(RuntimeError):
+        read_workbook(io.BytesIO(data), engine="openpyxl")
@@ -0,0 +1,177 @@
+import hashlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from requests import Response
+from src.http_client import (
+    backoff_delay,
+    retry_after_seconds,
+    close_session,
+    cache_stats,
+    reset_cache_stats,
+    load_cache_entry,
+    conditional_headers,
+    is_from_cache,
+    parsed_cache_path,
+    content_sha256
+)
+from src.scraper import extract_from_link
+
+BODY = b"<html><body>energy trends</body></html>" * 50
+ETAG = '"v1"'
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Stand-in for the gov.uk server: serves BODY with an ETag and honours If-None-Match
+    """
+    protocol_version = "HTTP/1.1" # keep-alive, so connection reuse can be observed
+    requests_seen = []
+    client_ports = set()
+    busy_left = 0
+
+    def do_GET(self):
+        StandInHandler.requests_seen.append(dict(self.headers))
+        StandInHandler.client_ports.add(self.client_address[1])
+        if self.path == "/hang":
+            time.sleep(2)
+        if self.path == "/busy" and StandInHandler.busy_left > 0:
+            StandInHandler.busy_left -= 1
+            self.send_response(503)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.path == "/no-validators":
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(BODY)))
+            self.end_headers()
+            self.wfile.write(BODY)
+            return
+        if self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", ETAG)
+        self.send_header("Last-Modified", "Tue, 30 Jul 2024 09:30:00 GMT")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server_url():
+    close_session()
+    StandInHandler.requests_seen = []
+    StandInHandler.client_ports = set()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    close_session()
+    server.shutdown()
+    server.server_close()
+
+@pytest.mark.parametrize(
+    "entry, expected_headers",
+    [
+        (None, {}),
+        ({"etag": '"abc"', "last_modified": None}, {"If-None-Match": '"abc"'}),
+        (
+            {"etag": '"abc"', "last_modified": "Tue, 30 Jul 2024 09:30:00 GMT"},
+            {"If-None-Match": '"abc"', "If-Modified-Since": "Tue, 30 Jul 2024 09:30:00 GMT"}
+        ),
+    ]
+)
+def test_conditional_headers(entry, expected_headers):
+    assert conditional_headers(entry) == expected_headers
+
+def test_revalidation_hits_cache(server_url, tmp_path):
+    reset_cache_stats()
+    url = f"{server_url}/ET_3.1_JUL_24.xlsx"
+
+    first = extract_from_link(url, retries=1, delay=0, cache_dir=str(tmp_path))
+    assert first.content == BODY
+    assert not is_from_cache(first)
+    assert load_cache_entry(str(tmp_path), url)["etag"] == ETAG
+
+    second = extract_from_link(url, retries=1, delay=0, cache_dir=str(tmp_path))
+    assert second.status_code == 200
+    assert second.content == BODY
+    assert is_from_cache(second)
+    assert StandInHandler.requests_seen[-1].get("If-None-Match") == ETAG
+    assert cache_stats == {"hits": 1, "misses": 1, "bytes_saved": len(BODY)}
+
+def test_no_validators_not_cached(server_url, tmp_path):
+    url = f"{server_url}/no-validators"
+    response = extract_from_link(url, retries=1, delay=0, cache_dir=str(tmp_path))
+    assert response.content == BODY
+    assert load_cache_entry(str(tmp_path), url) is None
+    assert parsed_cache_path(response) is None
+
+@pytest.mark.parametrize("attempt, base_delay", [(0, 1), (1, 1), (3, 2), (20, 10)])
+def test_backoff_delay(attempt, base_delay):
+    for _ in range(20):
+        wait = backoff_delay(attempt, base_delay, cap=60)
+        assert 0 <= wait <= min(60, base_delay * 2 ** attempt)
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        (None, None),
+        ("7", 7.0),
+        ("Wed, 21 Oct 2015 07:28:00 GMT", 0.0), # in the past
+        ("86400", 120.0), # capped at max_backoff
+        ("Fri, 31 Dec 9999 23:59:59 GMT", 120.0),
+        ("soon", None),
+    ]
+)
+def test_retry_after_seconds(header, expected):
+    response = Response()
+    if header is not None:
+        response.headers["Retry-After"] = header
+    assert retry_after_seconds(response) == expected
+
+def test_retry_after_respected(server_url):
+    StandInHandler.busy_left = 2
+    # a large base delay would make the test crawl if backoff were used instead of Retry-After: 0
+    response = extract_from_link(f"{server_url}/busy", retries=3, delay=30)
+    assert response.status_code == 200
+    assert len(StandInHandler.requests_seen) == 3
+
+def test_connection_reused(server_url):
+    extract_from_link(f"{server_url}/landing", retries=1, delay=0)
+    extract_from_link(f"{server_url}/workbook.xlsx", retries=1, delay=0)
+    assert len(StandInHandler.client_ports) == 1
+
+def test_hung_server_times_out(server_url):
+    start = time.perf_counter()
+    with pytest.raises(RuntimeError, match="ReadTimeout"):
+        extract_from_link(f"{server_url}/hang", retries=2, delay=0, timeout=(1, 0.2))
+    assert time.perf_counter() - start < 2
+
+def test_streamed_download_spooled_and_hashed(server_url, tmp_path):
+    url = f"{server_url}/ET_3.1_JUL_24.xlsx"
+    expected_digest = hashlib.sha256(BODY).hexdigest()
+
+    first = extract_from_link(url, retries=1, delay=0, cache_dir=str(tmp_path), stream=True)
+    assert first.body_file.read() == BODY
+    assert first.sha256 == expected_digest
+    assert load_cache_entry(str(tmp_path), url)["sha256"] == expected_digest
+    first.body_file.close()
+
+    # revalidated copy is opened from disk, not read into memory
+    second = extract_from_link(url, retries=1, delay=0, cache_dir=str(tmp_path), stream=True)
+    assert is_from_cache(second)
+    assert second.body_file.read() == BODY
+    assert content_sha256(second) == expected_digest
+    second.body_file.close()
+
+def test_content_sha256_unstreamed():
+    response = Response()
+    response._content = b"abc"
+    assert content_sha256(response) == hashlib.sha256(b"abc").hexdigest()
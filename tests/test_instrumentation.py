@@ -0,0 +1,55 @@
+import os
+from datetime import datetime
+import pstats
+import pytest
+from benchmarks.synthetic import quarter_frame
+from src.instrumentation import instrumented, instrumented_run, stage, read_metrics
+from src.pipeline import transform_and_validate
+
+@instrumented()
+def allocate(df, n: int):
+    bytearray(n) # only has to show up in the stage's peak memory
+    return df.iloc[: len(df) // 2]
+
+@instrumented("failing step")
+def fail():
+    raise ValueError("bad workbook")
+
+def test_inactive_outside_a_run():
+    df = quarter_frame(n_years=1)
+    assert len(allocate(df, 10)) == len(df) // 2
+
+def test_stage_metrics(tmp_path):
+    path = f"{tmp_path}/metrics.jsonl"
+    df = quarter_frame(n_years=1)
+    with instrumented_run(path, run_id="first"):
+        with stage("outer"):
+            allocate(df, 5_000_000)
+        with pytest.raises(ValueError):
+            fail()
+
+    metrics = {m["stage"]: m for m in read_metrics(path, "first")}
+    assert list(metrics) == ["allocate", "outer", "failing step", "run"] # in the order they finished
+    assert metrics["allocate"]["rows_in"] == len(df) and metrics["allocate"]["rows_out"] == len(df) // 2
+    assert metrics["allocate"]["parent"] == "outer" and metrics["allocate"]["depth"] == 2
+    assert metrics["allocate"]["peak_mb"] >= 5 and metrics["outer"]["peak_mb"] >= 5 # nested peaks count for the parent
+    assert metrics["failing step"]["error"] == "ValueError: bad workbook"
+    assert metrics["run"]["wall_s"] >= metrics["outer"]["wall_s"]
+
+    # runs are appended, so they can be compared
+    with instrumented_run(path, trace_memory=False, run_id="second"):
+        allocate(df, 10)
+    assert read_metrics(path, "second")[0]["peak_mb"] is None
+    assert len(read_metrics(path)) == 6
+
+def test_pipeline_stages_and_profile(tmp_path):
+    path, profile_path = f"{tmp_path}/metrics.jsonl", f"{tmp_path}/run.prof"
+    df = quarter_frame(n_years=2)
+    with instrumented_run(path, profile_path=profile_path, run_id="pipeline"):
+        final_df = transform_and_validate(df, datetime(2024, 7, 30), "ET_3.1_JUL_24.xlsx")
+
+    metrics = {m["stage"]: m for m in read_metrics(path)}
+    assert {"input_schema_validation", "input_checks", "transform_quarter_df", "output_schema_validation", "output_check_duplicates"} <= set(metrics)
+    assert metrics["transform_quarter_df"]["rows_in"] == len(df)
+    assert metrics["transform_quarter_df"]["rows_out"] == len(final_df)
+    assert os.path.exists(profile_path) and pstats.Stats(profile_path).total_calls > 0
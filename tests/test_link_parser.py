@@ -0,0 +1,35 @@
+import pytest
+from requests import Response
+from benchmarks.synthetic import landing_page_html, attachment_titles
+import src.link_parser as link_parser
+from src.link_parser import attachment_links, find_attachment_link, match_link
+from src.scraper import get_excel_link
+
+def as_response(content: bytes) -> Response:
+    response = Response()
+    response._content = content
+    response.status_code = 200
+    return response
+
+@pytest.mark.parametrize("position", [0.0, 0.5, 1.0])
+def test_get_excel_link_same_as_soup(position):
+    response = as_response(landing_page_html(n_attachments=9, filler_paragraphs=50, target_position=position))
+    assert get_excel_link(response) == get_excel_link(response, fast_parser=False)
+
+def test_attachment_links():
+    links = attachment_links(landing_page_html(n_attachments=5, filler_paragraphs=10))
+    assert len(links) == 5 # the guidance links in the filler are not attachments
+    assert links[0] == (attachment_titles[0], "https://assets.publishing.service.gov.uk/media/0/ET_0.xlsx")
+    assert match_link(links, r"petroleum products \(ET 3.4") == links[2][1]
+    assert match_link(links, "coal") is None
+
+def test_link_text_across_chunks(monkeypatch):
+    # a small feed size splits tags, titles and the multi-byte character between chunks
+    monkeypatch.setattr(link_parser, "feed_size", 7)
+    content = '<p>£</p><a class="govuk-link gem-c-attachment__link" href="/a.xlsx">Supply and use of\n crude oil – ET 3.1</a>'.encode("utf-8")
+    assert find_attachment_link(content, "supply and use of crude oil – ET") == "/a.xlsx"
+    assert attachment_links(content) == [("Supply and use of crude oil – ET 3.1", "/a.xlsx")]
+
+def test_get_excel_link_not_found():
+    with pytest.raises(RuntimeError, match="File link not found"):
+        get_excel_link(as_response(b'<a class="govuk-link" href="/a.xlsx">Supply and use of crude oil, natural gas liquids and feedstocks</a>'))
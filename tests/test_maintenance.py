@@ -0,0 +1,155 @@
+import json
+import os
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+from benchmarks.synthetic import quarter_frame
+from src.transform import transform_quarter_df
+from src.storage import write_parquet_file, partition_path, partition_files, read_parquet_table, save_parquet, merge_parquet
+from src.versioning import commit_merge, read_version, as_of, active_files
+from src.query import read_table
+from src import maintenance, storage
+from src.storage import swap_filename
+from src.maintenance import optimize, vacuum, cluster, zorder_key, referenced_files
+
+df = transform_quarter_df(quarter_frame(n_blocks=2, n_years=2, start_year=2022), datetime(2024, 7, 30), "ET_3.1_JUL_24.xlsx")
+
+def fragmented_table(location: str, pieces: int = 3) -> None:
+    """
+    Each partition split over several files, as left by appends
+    """
+    for (year, quarter), part in df.groupby(["year", "quarter"], observed=True):
+        for rows in np.array_split(np.arange(len(part)), pieces):
+            write_parquet_file(part.iloc[rows], partition_path(location, int(year), int(quarter)))
+
+def sorted_rows(frame: pd.DataFrame) -> pd.DataFrame:
+    return frame.astype(str).sort_values(["year", "quarter", "category", "resource"], ignore_index=True)
+
+def test_cluster_orders():
+    frame = pd.DataFrame({"category": pd.Categorical(["b", "a", "b", "a"], categories=["b", "a"]), "resource": ["y", "y", "x", "x"]})
+    # sorted on values, not on category order
+    assert cluster(frame, ["category", "resource"]).values.tolist() == [["a", "x"], ["a", "y"], ["b", "x"], ["b", "y"]]
+    # 2 bits each, interleaved: (category rank, resource rank) -> key
+    grid = pd.DataFrame({"category": list("aabb"), "resource": list("xyxy")})
+    assert zorder_key(grid, ["category", "resource"]).tolist() == [0, 2, 1, 3]
+
+def test_optimize_compacts_and_clusters(tmp_path):
+    location = str(tmp_path)
+    fragmented_table(location)
+    before = read_parquet_table(location)
+    stats = optimize(location)
+    assert stats == {"partitions_optimized": 8, "files_before": 24, "files_after": 8}
+    after = read_parquet_table(location)
+    pd.testing.assert_frame_equal(sorted_rows(after), sorted_rows(before))
+
+    path = partition_files(location, 2023, 4)[0]
+    assert pq.read_schema(path).metadata[b"clustered_by"] == b"sort:category,resource"
+    stored = pq.read_table(path).to_pandas()
+    assert list(zip(stored["category"], stored["resource"])) == sorted(zip(stored["category"], stored["resource"]))
+    # already laid out - nothing to do, until the layout asked for changes
+    assert optimize(location)["partitions_optimized"] == 0
+    assert optimize(location, zorder=True)["partitions_optimized"] == 8
+
+def test_optimize_rewrites_partitions_changed_since(tmp_path):
+    location = str(tmp_path)
+    save_parquet(df, location)
+    optimize(location)
+    revised = df[df["year"] == 2023].copy()
+    revised.loc[revised["quarter"] == 2, "figures"] += 1
+    merge_parquet(revised, location)
+    assert optimize(location)["partitions_optimized"] == 1
+
+@pytest.mark.parametrize("stop", ["staging", "swap"])
+def test_optimize_stopped_part_way_never_doubles_rows(tmp_path, monkeypatch, stop):
+    location = str(tmp_path)
+    fragmented_table(location)
+    before = read_parquet_table(location)
+
+    def crash(directory, *args):
+        if stop == "swap": # new files renamed into place, old ones not removed yet
+            with open(os.path.join(directory, swap_filename), "r", encoding="utf-8") as f:
+                for staged, final in json.load(f)["staged"].items():
+                    os.replace(os.path.join(directory, staged), os.path.join(directory, final))
+        raise OSError("disk full")
+    if stop == "staging":
+        monkeypatch.setattr(maintenance, "swap_partition_files", crash)
+    else:
+        monkeypatch.setattr(storage, "finish_partition_swap", crash)
+    with pytest.raises(OSError):
+        optimize(location)
+    monkeypatch.undo()
+    if stop == "staging": # staged files aren't read
+        pd.testing.assert_frame_equal(sorted_rows(read_table(location)), sorted_rows(before))
+
+    # the next run (or a vacuum) sees the swap through, or drops what was staged
+    assert optimize(location)["files_after"] == 8
+    pd.testing.assert_frame_equal(sorted_rows(read_table(location)), sorted_rows(before))
+    assert not any(name.startswith("_") for _, _, names in os.walk(partition_path(location, 2022, 1)) for name in names)
+
+def test_optimize_large_partitions_split(tmp_path, monkeypatch):
+    location = str(tmp_path)
+    save_parquet(df, location)
+    monkeypatch.setattr(maintenance, "target_file_rows", 10)
+    stats = optimize(location)
+    rows = len(df[(df["year"] == 2022) & (df["quarter"] == 1)])
+    assert stats["files_after"] == 8 * -(-rows // 10)
+    assert len(read_table(location)) == len(df)
+
+def test_optimize_versioned_keeps_history(tmp_path):
+    location = str(tmp_path)
+    commit_merge(df, location, "2024-07-30", "ET_3.1_JUL_24.xlsx")
+    revised = df.copy()
+    revised.loc[revised["year"] == 2023, "figures"] += 1
+    commit_merge(revised, location, "2024-08-29", "ET_3.1_AUG_24.xlsx")
+    latest = read_version(location)
+
+    stats = optimize(location)
+    assert stats["version"] == 2 and stats["partitions_optimized"] == 8
+    pd.testing.assert_frame_equal(sorted_rows(read_version(location)), sorted_rows(latest))
+    pd.testing.assert_frame_equal(sorted_rows(as_of(location, "2024-08-30")), sorted_rows(latest))
+    assert as_of(location, "2024-08-01")["figures"].sum() == df["figures"].sum()
+
+def test_vacuum_versioned(tmp_path):
+    location = str(tmp_path)
+    commit_merge(df, location, "2024-07-30", "ET_3.1_JUL_24.xlsx")
+    revised = df.copy()
+    revised.loc[revised["year"] == 2023, "figures"] += 1
+    commit_merge(revised, location, "2024-08-29", "ET_3.1_AUG_24.xlsx")
+    optimize(location)
+    on_disk = lambda: sum(len(files) for _, _, files in os.walk(os.path.join(location, "DeltaTable", "year=2023")))
+
+    # every version still readable - nothing to remove, and recent files are never touched
+    assert vacuum(location, min_age=0) == []
+    assert vacuum(location, retain_versions=0) == []
+    assert on_disk() == 12 # written by version 0, 1 and 2
+
+    removed = vacuum(location, retain_versions=0, min_age=0, dry_run=True)
+    assert len(removed) == 12 and on_disk() == 12 # 8 + 4 + 8 files written, 8 in use
+    assert vacuum(location, retain_versions=0, min_age=0) == removed
+    assert on_disk() == 4
+    assert set(referenced_files(location, retain_versions=0)) == set(active_files(location))
+    assert len(read_version(location)) == len(df)
+
+def test_vacuum_removes_stale_temp_files(tmp_path):
+    location = str(tmp_path)
+    save_parquet(df, location)
+    directory = partition_path(location, 2022, 1)
+    with open(os.path.join(directory, ".tmp-part-crashed.parquet"), "wb") as f:
+        f.write(b"partial")
+    assert len(partition_files(location, 2022, 1)) == 1 # never read as data
+    assert vacuum(location) == [] # may still be being written
+    old = time.time() - 2 * maintenance.vacuum_min_age
+    os.utime(os.path.join(directory, ".tmp-part-crashed.parquet"), (old, old))
+    assert vacuum(location) == [os.path.join("year=2022", "quarter=1", ".tmp-part-crashed.parquet")]
+    assert len(read_parquet_table(location)) == len(df)
+
+def test_optimize_csv(tmp_path):
+    location = f"{tmp_path}/"
+    df.sample(frac=1, random_state=0).to_csv(f"{location}DeltaTable.csv", index=False)
+    optimize(location)
+    stored = pd.read_csv(f"{location}DeltaTable.csv")
+    keys = list(zip(stored["year"], stored["quarter"], stored["category"], stored["resource"]))
+    assert keys == sorted(keys) and len(stored) == len(df)
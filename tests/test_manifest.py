@@ -0,0 +1,60 @@
+import os
+import pandas as pd
+import pytest
+from src.manifest import (
+    load_manifest,
+    save_manifest,
+    record_ingest,
+    is_new_content
+)
+from src.scraper import confirm_new_file
+
+LINK = "https://assets.publishing.service.gov.uk/media/111/ET_3.1_JUL_24.xlsx"
+
+@pytest.fixture
+def manifest():
+    manifest = {"latest": {}, "ingests": []}
+    record_ingest(manifest, "ET_3.1_JUL_24.xlsx", LINK, "aaa", "2024-07-30", 1900)
+    return manifest
+
+@pytest.mark.parametrize(
+    "filename, url, content_hash, expected",
+    [
+        ("ET_3.1_SEP_24.xlsx", None, None, True), # unseen file
+        ("ET_3.1_JUL_24.xlsx", None, None, False), # seen, nothing else to compare
+        ("ET_3.1_JUL_24.xlsx", LINK, None, False), # same link
+        ("ET_3.1_JUL_24.xlsx", LINK.replace("111", "222"), None, True), # republished under a new link
+        ("ET_3.1_JUL_24.xlsx", None, "aaa", False), # same content
+        ("ET_3.1_JUL_24.xlsx", None, "bbb", True), # same name, different content
+    ]
+)
+def test_is_new_content(manifest, filename, url, content_hash, expected):
+    assert is_new_content(manifest, filename, url=url, content_hash=content_hash) == expected
+
+def test_manifest_round_trip(manifest, tmp_path):
+    location = f"{tmp_path}/"
+    save_manifest(manifest, location)
+    loaded = load_manifest(location)
+    assert loaded == manifest
+    assert loaded["latest"]["ET_3.1_JUL_24.xlsx"]["rows"] == 1900
+
+def test_manifest_bootstrapped_from_csv(tmp_path):
+    location = f"{tmp_path}/"
+    pd.DataFrame({
+        "resource": ["crude oil"] * 3,
+        "date_published": ["2024-06-27", "2024-07-30", "2024-07-30"],
+        "filename": ["ET_3.1_JUN_24.xlsx", "ET_3.1_JUL_24.xlsx", "ET_3.1_JUL_24.xlsx"]
+    }).to_csv(f"{location}DeltaTable.csv", index=False)
+
+    manifest = load_manifest(location)
+    assert manifest["latest"]["ET_3.1_JUL_24.xlsx"]["rows"] == 2
+    assert manifest["latest"]["ET_3.1_JUN_24.xlsx"]["date_published"] == "2024-06-27"
+    assert os.path.exists(f"{location}manifest.json")
+
+    # the csv is not read again once the manifest exists
+    os.remove(f"{location}DeltaTable.csv")
+    assert not confirm_new_file("ET_3.1_JUL_24.xlsx", csv_location=location)
+    assert confirm_new_file("ET_3.1_AUG_24.xlsx", csv_location=location)
+
+def test_confirm_new_file_download_if_not_new(tmp_path):
+    assert confirm_new_file("anything.xlsx", download_if_not_new=True, csv_location=f"{tmp_path}/")
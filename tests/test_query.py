@@ -0,0 +1,97 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import output_df
+from src.storage import save_parquet, merge_parquet
+from src.versioning import commit_merge
+from src.query import read_table, matching_files, partition_index, partition_index_path, file_stats
+
+def expected_rows(df: pd.DataFrame, columns: list[str], **filters) -> pd.DataFrame:
+    mask = np.ones(len(df), dtype=bool)
+    for column, values in filters.items():
+        mask &= df[column].isin(values).to_numpy()
+    return df.loc[mask, columns].reset_index(drop=True)
+
+@pytest.mark.parametrize("filters, columns", [
+    ({}, None),
+    ({"years": [2023]}, ["resource", "quarter", "figures"]),
+    ({"years": [2023], "quarters": [2], "categories": ["import"]}, ["resource", "figures"]),
+    ({"resources": ["crude oil", "exports"]}, ["year", "quarter", "resource", "figures"]),
+    ({"years": [2025]}, ["figures"]),
+])
+def test_read_table_matches_filtering_everything(tmp_path, filters, columns):
+    location = str(tmp_path)
+    df = output_df()
+    save_parquet(df, location)
+    result = read_table(location, columns=columns, **filters)
+    names = {"years": "year", "quarters": "quarter", "categories": "category", "resources": "resource"}
+    expected = expected_rows(df, columns or list(df.columns), **{names[k]: v for k, v in filters.items()})
+    assert list(result.columns) == list(expected.columns)
+    pd.testing.assert_frame_equal(
+        result.astype(str).sort_values(list(result.columns), ignore_index=True),
+        expected.astype(str).sort_values(list(expected.columns), ignore_index=True)
+    )
+
+def test_files_are_pruned_on_partition_and_statistics(tmp_path):
+    location = str(tmp_path)
+    save_parquet(output_df(), location)
+    assert len(matching_files(location)) == 3
+    assert [path.split(os.sep)[:2] for path in matching_files(location, years=[2023], quarters=[2])] == [["year=2023", "quarter=2"]]
+    # outside every file's min/max - nothing is opened
+    assert matching_files(location, resources=["aaa"]) == []
+    assert matching_files(location, categories=["zzz"]) == []
+    assert read_table(location, resources=["aaa"]).empty
+
+    stats = file_stats(os.path.join(location, "DeltaTable", matching_files(location, years=[2024])[0]))
+    assert stats["rows"] == 5
+    assert stats["category"] == ["export", "production"]
+    assert stats["resource"] == ["crude oil", "total supply"]
+
+def test_partition_index_is_cached_and_follows_rewrites(tmp_path, monkeypatch):
+    location = str(tmp_path)
+    save_parquet(output_df(), location)
+    index = partition_index(location)
+    with open(partition_index_path(location), "r", encoding="utf-8") as f:
+        assert json.load(f) == index
+
+    opened = []
+    monkeypatch.setattr("src.query.file_stats", lambda path: opened.append(path) or file_stats(path))
+    assert partition_index(location) == index
+    assert opened == [] # nothing changed, no footer read
+
+    merge_parquet(output_df(figures_offset=1.0), location) # rewrites 2024 Q1 only
+    updated = partition_index(location)
+    assert len(opened) == 1 and "year=2024" in opened[0]
+    assert len(updated) == 3 and set(updated) != set(index)
+    assert read_table(location, years=[2024], resources=["indigenous production"])["figures"].tolist() == [13.0]
+
+def test_batches(tmp_path):
+    location = str(tmp_path)
+    df = output_df()
+    save_parquet(df, location)
+    batches = list(read_table(location, years=[2023], columns=["resource", "figures"], batch_size=4))
+    assert all(len(batch) <= 4 for batch in batches)
+    assert sum(len(batch) for batch in batches) == 10
+    assert list(read_table(location, years=[2030], batch_size=4)) == []
+
+def test_versioned_table(tmp_path):
+    location = str(tmp_path)
+    commit_merge(output_df(), location, "2024-07-30", "ET_JUL.xlsx")
+    commit_merge(output_df(figures_offset=1.0), location, "2024-08-29", "ET_AUG.xlsx")
+    query = {"years": [2024], "resources": ["indigenous production"], "columns": ["figures"]}
+    assert read_table(location, **query)["figures"].tolist() == [13.0]
+    assert read_table(location, version=0, **query)["figures"].tolist() == [12.0]
+    assert read_table(location, **query)["figures"].tolist() == [13.0]
+
+def test_csv_table(tmp_path):
+    location = f"{tmp_path}/"
+    df = output_df()
+    df.to_csv(f"{location}DeltaTable.csv", index=False)
+    result = read_table(location, years=[2023], categories=["production"], columns=["resource", "quarter", "figures"])
+    assert len(result) == 4
+    assert result["quarter"].tolist() == [1, 1, 2, 2]
+    batches = list(read_table(location, categories=["import"], batch_size=2))
+    assert sum(len(batch) for batch in batches) == 3
+    assert read_table(str(tmp_path / "missing")).empty
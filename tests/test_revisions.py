@@ -0,0 +1,71 @@
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import release_df
+from src.storage import save_parquet
+from src.versioning import commit_merge
+from src.revisions import diff_frames, diff_stored, save_revisions, read_revisions, revision_columns
+
+june = release_df([11.0, 9.0, np.nan, 4.0], datetime(2024, 6, 27), "ET_3.1_JUN_24.xlsx")
+# revises production and crude oil, fills in imports, leaves exports
+july = release_df([12.0, 7.2, 6.0, 4.0], datetime(2024, 7, 30), "ET_3.1_JUL_24.xlsx")
+
+def test_diff_frames():
+    revisions = diff_frames(june, july)
+    assert list(revisions.columns) == revision_columns
+    by_resource = revisions.set_index("resource")
+    assert sorted(by_resource.index) == ["crude oil", "imports", "indigenous production"]
+    assert (revisions["year"] == 2023).all() and (revisions["quarter"] == 2).all()
+    assert by_resource.loc["indigenous production", "change"] == 1.0
+    assert by_resource.loc["crude oil", "pct_change"] == pytest.approx(-0.2)
+    assert np.isnan(by_resource.loc["imports", "old_figures"]) and by_resource.loc["imports", "new_figures"] == 6.0
+    assert by_resource.loc["crude oil", "old_date_published"] == pd.Timestamp("2024-06-27")
+    assert by_resource.loc["crude oil", "new_date_published"] == pd.Timestamp("2024-07-30")
+    assert set(revisions["filename"]) == {"ET_3.1_JUL_24.xlsx"}
+
+def test_diff_frames_no_revisions():
+    assert diff_frames(june, june).empty
+    assert diff_frames(june.iloc[:0], july).empty
+    # keys only in one of them are inserts or kept rows, not revisions
+    assert diff_frames(june[june["quarter"] == 1], july[july["quarter"] == 2]).empty
+
+def test_hash_collisions_are_not_revisions(monkeypatch):
+    # every key hashing the same - the join matches every pair, and only the real revisions are kept
+    expected = diff_frames(june, july)
+    monkeypatch.setattr("src.revisions.key_hash", lambda keys: np.zeros(len(keys), dtype=np.uint64))
+    pd.testing.assert_frame_equal(diff_frames(june, july), expected)
+
+@pytest.mark.parametrize("store", [
+    lambda df, location: df.to_csv(f"{location}DeltaTable.csv", index=False),
+    lambda df, location: save_parquet(df, location),
+    lambda df, location: commit_merge(df, location, "2024-06-27", "ET_3.1_JUN_24.xlsx"),
+])
+def test_diff_stored(tmp_path, store):
+    location = f"{tmp_path}/"
+    assert diff_stored(july, location).empty # nothing stored yet
+    store(june, location)
+    revisions = diff_stored(july, location)
+    pd.testing.assert_frame_equal(revisions, diff_frames(june, july), check_categorical=False)
+
+def test_diff_stored_reads_only_incoming_years(tmp_path, monkeypatch):
+    location = f"{tmp_path}/"
+    save_parquet(june, location)
+    calls = []
+    monkeypatch.setattr("src.revisions.read_table", lambda *args, **kwargs: calls.append(kwargs) or june)
+    diff_stored(july, location)
+    assert calls[0]["years"] == [2023]
+    assert "filename" not in calls[0]["columns"]
+
+def test_revision_feed(tmp_path):
+    location = f"{tmp_path}/"
+    assert read_revisions(location).empty
+    assert save_revisions(diff_frames(june, june), location) is None
+    save_revisions(diff_frames(june, july), location)
+    august = release_df([12.0, 7.5, 6.0, 4.0], datetime(2024, 8, 29), "ET_3.1_AUG_24.xlsx")
+    save_revisions(diff_frames(july, august), location)
+
+    feed = read_revisions(location)
+    assert len(feed) == 4
+    assert list(feed["filename"].unique()) == ["ET_3.1_JUL_24.xlsx", "ET_3.1_AUG_24.xlsx"]
+    assert read_revisions(location, since="2024-08-01")["old_figures"].tolist() == [7.2]
@@ -0,0 +1,118 @@
+import asyncio
+import io
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pandas as pd
+import pytest
+from benchmarks.synthetic import write_workbook
+from src.datasets import datasets, get_dataset
+from src.http_client import close_session
+from src.runner import run_datasets
+from src.views import load_views
+from src.revisions import read_revisions
+
+DELAY = 0.5 # seconds the stand-in server takes for every request
+
+def workbook_bytes(published: str, seed: int) -> bytes:
+    buffer = io.BytesIO()
+    write_workbook(buffer, n_blocks=1, n_years=2, published=published, seed=seed)
+    return buffer.getvalue()
+
+PAGES = {
+    "/oil": b'<a class="govuk-link gem-c-attachment__link" href="/files/ET_3.1_JUL_24.xlsx">Supply and use of crude oil, natural gas liquids and feedstocks (ET 3.1)</a>',
+    "/gas": b'<a class="govuk-link gem-c-attachment__link" href="/files/ET_4.1_JUL_24.xlsx">Natural gas supply and consumption (ET 4.1)</a>',
+    "/coal": b'<a class="govuk-link gem-c-attachment__link" href="/files/ET_2.2_JUL_24.xlsx">Something else entirely</a>',
+    "/files/ET_3.1_JUL_24.xlsx": workbook_bytes("30 July 2024", 0),
+    "/files/ET_4.1_JUL_24.xlsx": workbook_bytes("30 July 2024", 1),
+}
+
+class SlowHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    intervals = [] # (start, end) of every request served
+
+    def do_GET(self):
+        start = time.perf_counter()
+        time.sleep(DELAY)
+        SlowHandler.intervals.append((start, time.perf_counter()))
+        body = PAGES.get(self.path)
+        self.send_response(200 if body else 404)
+        self.send_header("Content-Length", str(len(body or b"")))
+        self.end_headers()
+        self.wfile.write(body or b"")
+
+    def log_message(self, *args):
+        pass
+
+def most_in_flight(intervals: list[tuple[float, float]]) -> int:
+    """
+    Most requests the server was handling at the same moment
+    """
+    events = sorted([(start, 1) for start, _ in intervals] + [(end, -1) for _, end in intervals])
+    in_flight, most = 0, 0
+    for _, change in events:
+        in_flight += change
+        most = max(most, in_flight)
+    return most
+
+@pytest.fixture
+def registry():
+    close_session()
+    SlowHandler.intervals = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    # only oil ships in the registry - the other two are stand-ins built from its settings
+    sections = {
+        "oil": {},
+        "gas": {"link_text": r"natural gas supply and consumption", "location": "gas/", "resource_checks": False},
+        "coal": {"link_text": r"supply and consumption of coal", "location": "coal/", "resource_checks": False},
+    }
+    yield {name: {**datasets["oil"], **settings, "landing_page": f"{url}/{name}"} for name, settings in sections.items()}
+    close_session()
+    server.shutdown()
+    server.server_close()
+
+def test_get_dataset():
+    assert get_dataset("oil")["sheet_name"] == "Quarter"
+    with pytest.raises(ValueError, match="Unknown dataset"):
+        get_dataset("nuclear")
+
+def test_run_datasets_concurrently(registry, tmp_path):
+    location = f"{tmp_path}/"
+    statuses = asyncio.run(run_datasets(registry, location, download_dir=f"{tmp_path}/downloads", parse_workers=2))
+
+    assert [(s["dataset"], s["status"]) for s in statuses] == [("oil", "ingested"), ("gas", "ingested"), ("coal", "failed")]
+    assert "File link not found" in statuses[2]["error"]
+    assert len(pd.read_csv(f"{location}DeltaTable.csv")) == statuses[0]["rows"]
+    assert set(pd.read_csv(f"{location}gas/DeltaTable.csv")["filename"]) == {"ET_4.1_JUL_24.xlsx"}
+
+    # the datasets' requests were served at the same time, not one dataset after another
+    assert most_in_flight(SlowHandler.intervals) >= 2
+    # workbooks are parsed from a file in the download folder, which is cleared once they are parsed
+    assert os.listdir(f"{tmp_path}/downloads") == []
+
+    # already ingested, so only the landing pages are requested
+    statuses = asyncio.run(run_datasets(registry, location, parse_workers=2))
+    assert [s["status"] for s in statuses] == ["unchanged", "unchanged", "failed"]
+
+def test_run_datasets_keeps_views_and_revisions(registry, tmp_path, monkeypatch):
+    location = f"{tmp_path}/"
+    options = {"download_dir": f"{tmp_path}/downloads", "views": True, "revisions": True, "parse_workers": 2}
+    asyncio.run(run_datasets(registry, location, **options))
+    # the same file republished with revised figures
+    monkeypatch.setitem(PAGES, "/files/ET_3.1_JUL_24.xlsx", workbook_bytes("30 July 2024", 2))
+    statuses = asyncio.run(run_datasets(registry, location, download_if_not_new=True, **options))
+    assert statuses[0]["status"] == "ingested"
+
+    table = pd.read_csv(f"{location}DeltaTable.csv")
+    assert len(read_revisions(location)) == len(table) # every figure differs with another seed
+    assert read_revisions(f"{location}gas/").empty
+    views = load_views(location)
+    assert views["shares"]["figures"].sum() == pytest.approx(table["figures"].sum())
+
+def test_run_datasets_concurrency_limit(registry, tmp_path):
+    asyncio.run(run_datasets(registry, f"{tmp_path}/", download_dir=f"{tmp_path}/downloads", max_concurrency=1, parse_workers=2))
+    assert len(SlowHandler.intervals) == 5
+    assert most_in_flight(SlowHandler.intervals) == 1
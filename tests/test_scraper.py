@@ -29,7 +29,7 @@ from src.scraper import (
         ("http://gov_link.com", 404, 3, RuntimeError)
     ]
 )
-@patch('requests.get')
+@patch('requests.Session.get')
 def test_extract_from_link(mock_get, link, status_code, retries, expected_error):
     mock_get.return_value.status_code = status_code
     
@@ -54,3 +54,56 @@ def test_extract_from_link(mock_get, link, status_code, retries, expected_error)
 def test_retrieve_filename(excel_link, expected_filename):
     filename = retrieve_filename(excel_link)
     assert filename == expected_filename
+
+def make_workbook_bytes(n_quarters: int = 4) -> bytes:
+    """
+    Small workbook laid out like the Energy Trends one - Cover Sheet text in A4, Quarter header on row 5
+    """
+    from openpyxl import Workbook
+    wb = Workbook()
+    cover = wb.active
+    cover.title = "Cover Sheet"
+    cover["A4"] = "This spreadsheet was published 30 July 2024\nNext update 26 September 2024"
+    quarter = wb.create_sheet("Quarter")
+    header = ["Column1"] + [f"{2023 + q // 4} Quarter {q % 4 + 1}" for q in range(n_quarters)]
+    quarter.append([])
+    quarter.append([])
+    quarter.append([])
+    quarter.append([])
+    quarter.append(header)
+    for i, resource in enumerate(["Indigenous Production", "Crude oil [note 1]", "NGLs", "Imports"]):
+        quarter.append([resource] + [float(i * 10 + q) for q in range(n_quarters)])
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+def test_get_info_reuses_parse_for_cached_response(tmp_path):
+    response = Response()
+    response.status_code = 200
+    response._content = make_workbook_bytes()
+    response.cache_body_path = str(tmp_path / "entry.body")
+
+    published_date_ts, df_quarter = get_info(response)
+    assert published_date_ts == datetime(2024, 7, 30)
+    assert df_quarter.iloc[0, 0] == "indigenous production"
+    assert os.path.exists(tmp_path / "entry.body.parsed.pkl")
+
+    # a 304 rebuilt response - the body should not need to be looked at again
+    response._content = b"not a workbook"
+    response.from_cache = True
+    cached_date_ts, cached_df = get_info(response)
+    assert cached_date_ts == published_date_ts
+    pd.testing.assert_frame_equal(cached_df, df_quarter)
+
+def test_get_info_reads_spooled_body():
+    import tempfile
+    response = Response()
+    response.status_code = 200
+    response.body_file = tempfile.SpooledTemporaryFile()
+    response.body_file.write(make_workbook_bytes(n_quarters=6))
+    response.body_file.seek(0)
+
+    published_date_ts, df_quarter = get_info(response)
+    assert published_date_ts == datetime(2024, 7, 30)
+    assert list(df_quarter.columns[1:]) == [f"{2023 + q // 4} Quarter {q % 4 + 1}" for q in range(6)]
+    assert response.body_file.closed
@@ -0,0 +1,5 @@
+from benchmarks.bench_startup import noop_path_modules
+
+def test_noop_run_skips_heavy_imports():
+    # a run that finds no new file should never load pandas, pandera, bs4 and co
+    assert noop_path_modules() == []
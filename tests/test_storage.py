@@ -0,0 +1,120 @@
+import os
+import pandas as pd
+import pytest
+from conftest import output_df
+from src.storage import (
+    partition_files,
+    content_hash,
+    save_parquet,
+    read_parquet_table,
+    merge_keys,
+    merge_frames,
+    merge_parquet,
+    merge_csv
+)
+from src import storage
+
+def test_save_parquet_layout_and_round_trip(tmp_path):
+    location = str(tmp_path)
+    df = output_df()
+    written = save_parquet(df, location)
+    assert written == [(2023, 1), (2023, 2), (2024, 1)]
+    assert os.path.isdir(tmp_path / "DeltaTable" / "year=2023" / "quarter=2")
+    assert len(partition_files(location, 2024, 1)) == 1
+
+    result = read_parquet_table(location)
+    pd.testing.assert_frame_equal(result, df, check_categorical=False)
+
+def test_save_parquet_only_rewrites_changed_partitions(tmp_path):
+    location = str(tmp_path)
+    save_parquet(output_df(), location)
+    untouched = partition_files(location, 2023, 1)
+
+    # a rerun of the same figures writes nothing, even though date_processed differs
+    assert save_parquet(output_df(), location) == []
+
+    # a revised figure only rewrites its own partition
+    assert save_parquet(output_df(figures_offset=1.5), location) == [(2024, 1)]
+    assert partition_files(location, 2023, 1) == untouched
+    assert read_parquet_table(location, years=[2024])["figures"].iloc[0] == 13.5
+
+def test_save_parquet_replaces_the_whole_table(tmp_path):
+    location = str(tmp_path)
+    save_parquet(output_df(), location)
+    df = output_df()
+    df_2023 = df[df["year"] == 2023].reset_index(drop=True)
+    assert save_parquet(df_2023, location) == [(2024, 1)] # 2023 is unchanged, 2024 is gone
+    pd.testing.assert_frame_equal(read_parquet_table(location), df_2023, check_categorical=False)
+    assert not os.path.exists(tmp_path / "DeltaTable" / "year=2024")
+
+@pytest.mark.parametrize(
+    "years, quarters, expected_periods",
+    [
+        ([2023], None, {(2023, 1), (2023, 2)}),
+        (None, [1], {(2023, 1), (2024, 1)}),
+        ([2023], [2], {(2023, 2)}),
+        ([1999], None, set()),
+    ]
+)
+def test_read_parquet_table_filters(tmp_path, years, quarters, expected_periods):
+    save_parquet(output_df(), str(tmp_path))
+    result = read_parquet_table(str(tmp_path), years=years, quarters=quarters)
+    assert set(zip(result["year"], result["quarter"])) == expected_periods
+
+def test_content_hash_ignores_date_processed():
+    df = output_df()
+    later = df.assign(date_processed=pd.Timestamp("2030-01-01"))
+    assert content_hash(df) == content_hash(later)
+    assert content_hash(df) != content_hash(df.assign(figures=df["figures"] + 1))
+
+def test_merge_frames():
+    existing = output_df()
+    incoming = output_df(figures_offset=2.0).assign(filename="ET_3.1_AUG_24.xlsx")
+    incoming = incoming[incoming["year"] == 2024]
+    extra = incoming.iloc[:1].assign(resource="new resource")
+    incoming = pd.concat([incoming, extra], ignore_index=True)
+
+    merged, stats = merge_frames(existing, incoming)
+    # one revised figure, one new row, nan stays nan so counts as unchanged
+    assert stats == {"inserted": 1, "updated": 1, "unchanged": 4}
+    assert len(merged) == len(existing) + 1
+    assert merged["filename"].value_counts().to_dict() == {"ET_3.1_JUL_24.xlsx": len(existing) - 1, "ET_3.1_AUG_24.xlsx": 2}
+    assert not merged.duplicated(subset=merge_keys).any()
+
+def test_merge_parquet_reads_and_writes_touched_partitions(tmp_path):
+    location = str(tmp_path)
+    assert merge_parquet(output_df(), location)["inserted"] == 15
+    untouched = partition_files(location, 2023, 1)
+
+    totals = merge_parquet(output_df(figures_offset=1.0), location)
+    assert totals == {"inserted": 0, "updated": 1, "unchanged": 14, "partitions_written": 1}
+    assert partition_files(location, 2023, 1) == untouched
+    assert len(read_parquet_table(location)) == 15
+
+@pytest.mark.parametrize("write", [save_parquet, merge_parquet])
+def test_write_stopped_part_way_never_doubles_or_loses_rows(tmp_path, monkeypatch, write):
+    location = str(tmp_path)
+    save_parquet(output_df(), location)
+
+    def crash(directory):
+        raise OSError("disk full")
+    monkeypatch.setattr(storage, "finish_partition_swap", crash) # new file staged, swap recorded, nothing renamed
+    with pytest.raises(OSError):
+        write(output_df(figures_offset=1.0), location)
+    monkeypatch.undo()
+    assert len(read_parquet_table(location)) == 15 # the staged file isn't read
+
+    # the next write finishes the swap first
+    write(output_df(figures_offset=1.0), location)
+    stored = read_parquet_table(location).sort_values(merge_keys, ignore_index=True)
+    assert stored["figures"].equals(output_df(figures_offset=1.0).sort_values(merge_keys, ignore_index=True)["figures"])
+    assert os.listdir(storage.partition_path(location, 2024, 1)) == [os.path.basename(partition_files(location, 2024, 1)[0])]
+
+def test_merge_csv(tmp_path):
+    location = f"{tmp_path}/"
+    merge_csv(output_df(), location)
+    stats = merge_csv(output_df(figures_offset=1.0), location)
+    assert stats == {"inserted": 0, "updated": 1, "unchanged": 14}
+    df = pd.read_csv(f"{location}DeltaTable.csv")
+    assert len(df) == 15
+    assert not os.path.exists(f"{location}DeltaTable.csv.tmp")
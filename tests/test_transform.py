@@ -7,11 +7,17 @@ from src.transform import (
     remove_note_data,
     retrieve_pie_category,
     nullify_category_if_not_pie,
+    assign_pie_category,
     extract_pie_df,
     melt_df,
     clean_df, 
     add_dates, 
     add_filename, 
+    parse_year_quarter_columns,
+    transform_quarter_df,
+    transform_quarter_dfs,
+    compact_df,
+    is_compact,
     save_csv, # skip
 )
 
@@ -83,6 +89,21 @@ def test_extract_pie_df():
 
     assert (result_df == expected_df).any().any()
 
+@pytest.mark.parametrize(
+    "resources",
+    [
+        ["indigenous production", "crude oil", "ngls", "imports", "feedstocks", "total supply", "exports", "crude oil & ngls"],
+        ["export of production", "crude oil", "stock change", "import", "transfers", "ngls"], # keyword priority
+        ["total supply", "crude oil", "production"], # nothing to forward fill at the start
+    ]
+)
+def test_assign_pie_category_matches_rowwise(resources):
+    df = pd.DataFrame({"resource": resources})
+    expected = df["resource"].apply(retrieve_pie_category).ffill()
+    expected = pd.DataFrame({"resource": df["resource"], "category": expected}).apply(nullify_category_if_not_pie, axis=1)
+    expected = expected.fillna("other")
+    pd.testing.assert_series_equal(assign_pie_category(df["resource"]), expected, check_names=False)
+
 def test_melt_df():
     df = pd.DataFrame({
         "resource": ["oil", "ngl"],
@@ -211,4 +232,100 @@ def test_add_filename(filename, expected_output_filename):
     df = pd.DataFrame({"resource": ["ngl", "crude"], "category": ["production", "production"]})
     result_df = add_filename(df, filename)
     assert result_df["filename"].iloc[0] == expected_output_filename
-    assert result_df["filename"].nunique() == 1
\ No newline at end of file
+    assert result_df["filename"].nunique() == 1
+
+@pytest.mark.parametrize(
+    "columns, expected_years, expected_quarters, expected_error",
+    [
+        (["2023 1st Quarter", "2023 Q2", "2024-Q1"], [2023, 2023, 2024], [1, 2, 1], None),
+        (["2023 Q1", "unknown string"], None, None, ValueError),
+    ]
+)
+def test_parse_year_quarter_columns(columns, expected_years, expected_quarters, expected_error):
+    if expected_error:
+        with pytest.raises(expected_error):
+            parse_year_quarter_columns(columns)
+    else:
+        years, quarters = parse_year_quarter_columns(columns)
+        assert years.tolist() == expected_years
+        assert quarters.tolist() == expected_quarters
+
+@pytest.mark.parametrize("compact", [True, False])
+def test_transform_quarter_df_matches_chain(compact):
+    df = pd.DataFrame({
+        "Column1": ["indigenous production", "crude oil [note 1]", "ngls", "imports", "crude oil & ngls [note 4]",
+                    "exports", "feedstocks ", "stock change [note 5]", "total supply"],
+        "2023 1st Quarter": [10.0, 8.0, 2.0, 5.0, 5.0, 3.0, 1.5, -2.0, 12.0],
+        "2023 2nd Quarter": [11, 9, 2, 6, 6, 4, 1, 2, 13],
+        "2023 3rd Quarter": [12.5, 10.0, np.nan, 7.0, 7.0, 5.0, 1.0, 0.0, 14.0],
+    })
+    expected = (
+        df
+        .pipe(extract_pie_df)
+        .pipe(melt_df)
+        .pipe(clean_df)
+        .pipe(add_dates, published_date = datetime(2024, 7, 30))
+        .pipe(add_filename, filename = "ET_3.1_JUL_24.xlsx")
+    )
+    result = transform_quarter_df(df, datetime(2024, 7, 30), "ET_3.1_JUL_24.xlsx", compact=compact)
+    result["date_processed"] = expected["date_processed"]
+
+    assert result.to_csv(index=False) == expected.to_csv(index=False)
+    if compact:
+        pd.testing.assert_frame_equal(result, compact_df(expected))
+    else:
+        pd.testing.assert_frame_equal(result, expected)
+
+@pytest.mark.parametrize("compact", [True, False])
+def test_transform_quarter_dfs_matches_each_sheet(compact):
+    # releases with different quarter columns (and header wording), and a sheet starting without a category keyword
+    #   - the forward fill mustn't carry the category of the sheet before into it
+    sheets = [
+        (pd.DataFrame({
+            "Column1": ["indigenous production", "crude oil [note 1]", "exports", "feedstocks"],
+            "2023 1st Quarter": [10.0, 8.0, 3.0, np.nan],
+            "2023 2nd Quarter": [11.0, 9.0, 4.0, 1.0],
+        }), datetime(2023, 9, 28), "ET_3.1_SEP_23.xlsx"),
+        (pd.DataFrame({
+            "Column1": ["crude oil", "imports", "ngls [note 2]"],
+            "2023 Q2": [9.5, 6.0, 2.0],
+            "2023 Q3": [12.0, 7.0, np.nan],
+            "2023 Q1": [8.0, 5.0, 1.0],
+        }), datetime(2023, 12, 21), "ET_3.1_DEC_23.xlsx"),
+        (pd.DataFrame({
+            "Column1": ["indigenous production", "total supply"],
+            "2023 3rd Quarter": [12.5, 14.0],
+        }), datetime(2023, 12, 21), "ET_3.1_DEC_23.xlsx"),
+    ]
+    expected = pd.concat(
+        [transform_quarter_df(df, published, filename, compact=compact) for df, published, filename in sheets], ignore_index=True
+    )
+    result = transform_quarter_dfs(sheets, compact=compact)
+    result["date_processed"] = expected["date_processed"]
+
+    assert result.to_csv(index=False) == expected.to_csv(index=False)
+    pd.testing.assert_frame_equal(result, compact_df(expected) if compact else expected)
+    assert result["category"].iloc[8:11].tolist() == ["other", "import", "import"] # the second sheet's first quarter
+
+def test_transform_quarter_dfs_repeated_quarter():
+    df = pd.DataFrame({"Column1": ["imports"], "2023 Q1": [1.0], "2023 1st quarter": [2.0]})
+    with pytest.raises(ValueError, match="ET_3.1_SEP_23.xlsx"):
+        transform_quarter_dfs([(df, datetime(2023, 9, 28), "ET_3.1_SEP_23.xlsx")])
+
+def test_compact_df():
+    df = pd.DataFrame({
+        "resource": ["crude oil", "ngls"],
+        "category": ["production", "production"],
+        "figures": [1.5, 2.0],
+        "year": [2023, 2023],
+        "quarter": [1, 2],
+        "date_published": ["2024-07-30", "2024-07-30"],
+        "filename": ["ET_3.1_JUL_24.xlsx", "ET_3.1_JUL_24.xlsx"]
+    })
+    result = compact_df(df)
+    assert is_compact(result) and not is_compact(df)
+    assert result["quarter"].dtype == np.int8
+    assert result["resource"].dtype == "category"
+    assert result["date_published"].iloc[0] == pd.Timestamp("2024-07-30")
+    assert result["figures"].dtype == np.float64
+    assert result.to_csv(index=False) == df.to_csv(index=False)
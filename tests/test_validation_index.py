@@ -0,0 +1,84 @@
+import logging
+import os
+from datetime import datetime
+import pandas as pd
+import pytest
+from benchmarks.synthetic import quarter_frame
+from conftest import release, revise
+from src.pipeline import transform_and_validate, save_release
+from src.validation_index import (
+    build_index,
+    empty_index,
+    load_index,
+    index_path,
+    check_increment,
+    incremental_check_report,
+    update_index
+)
+
+rows_per_quarter = len(quarter_frame(n_years=1))
+
+@pytest.fixture
+def index():
+    return build_index(release())
+
+def test_unchanged_release_has_no_delta(index):
+    assert check_increment(index, release())["delta"] == 0
+
+def test_new_and_revised_rows(index):
+    incoming = revise(release(start_year=2020), 2022, 4) # next release - one more year, last quarter revised
+    failures, delta = incremental_check_report(index, incoming)
+    assert failures == []
+    assert delta.sum() == rows_per_quarter * 5 # 2023 plus the revised quarter
+
+def test_old_revision_is_a_warning(index, caplog):
+    incoming = revise(release(), 2019, 1)
+    with caplog.at_level(logging.WARNING):
+        check_increment(index, incoming)
+    assert "unexpected_revisions" in caplog.text
+    failures, _ = incremental_check_report(index, incoming, window=None)
+    assert failures == []
+
+def test_gap_and_duplicates_fail(index):
+    with pytest.raises(AssertionError, match="quarters missing"):
+        check_increment(index, release(start_year=2024, n_years=1)) # 2023 never stored
+    failures, _ = incremental_check_report(index, release(start_year=2024, n_years=1))
+    assert failures[0]["detail"]["periods"] == ["2023 Q1", "2023 Q2", "2023 Q3", "2023 Q4"]
+
+    incoming = release()
+    with pytest.raises(AssertionError, match="repeated values"):
+        check_increment(index, pd.concat([incoming, incoming.iloc[[0]]], ignore_index=True))
+
+def test_update_index(index):
+    incoming = revise(release(start_year=2020), 2022, 4)
+    updated = update_index(index, incoming)
+    assert len(updated) == len(index) + rows_per_quarter * 4
+    assert check_increment(updated, incoming)["delta"] == 0
+    assert len(update_index(index, incoming, write_mode="overwrite")) == len(incoming)
+
+def test_index_bootstrapped_from_csv(tmp_path):
+    location = f"{tmp_path}/"
+    assert load_index(location).empty
+    release().to_csv(f"{location}DeltaTable.csv", index=False)
+    index = load_index(location)
+    assert check_increment(index, release())["delta"] == 0
+    assert load_index(location).equals(index) # read back from the saved index
+
+def test_save_release_keeps_stored_index_in_step(tmp_path):
+    location = f"{tmp_path}/"
+    save_release(release(), location, "csv", "merge", datetime(2024, 7, 30), "ET_3.1_JUL_24.xlsx")
+    assert not os.path.exists(index_path(location)) # no index yet - the first load bootstraps it from the table
+    load_index(location)
+
+    # a save that doesn't pass the index (as the backfill and dataset runner do) still updates the stored one
+    incoming = revise(release(start_year=2020), 2022, 4)
+    save_release(incoming, location, "csv", "merge", datetime(2024, 9, 26), "ET_3.1_SEP_24.xlsx")
+    index = load_index(location)
+    assert len(index) == len(pd.read_csv(f"{location}DeltaTable.csv"))
+    assert check_increment(index, incoming)["delta"] == 0
+
+def test_transform_and_validate_incremental():
+    df = quarter_frame(n_years=2)
+    full = transform_and_validate(df, datetime(2024, 7, 30), "ET_3.1_JUL_24.xlsx")
+    incremental = transform_and_validate(df, datetime(2024, 7, 30), "ET_3.1_JUL_24.xlsx", index=empty_index())
+    pd.testing.assert_frame_equal(full.drop(columns="date_processed"), incremental.drop(columns="date_processed"))
@@ -0,0 +1,73 @@
+import os
+from datetime import datetime
+import pytest
+from conftest import release_df
+from src.storage import merge_parquet
+from src import versioning
+from src.versioning import (
+    latest_version,
+    active_files,
+    commit_merge,
+    version_as_of,
+    read_version,
+    as_of,
+    log_path
+)
+
+@pytest.fixture
+def table(tmp_path):
+    """
+    Three releases: the second revises 2023 Q2 production, the third changes nothing
+    """
+    location = str(tmp_path)
+    commit_merge(release_df([11.0, 9.0, 6.0, 4.0], datetime(2024, 6, 27), "ET_JUN.xlsx"), location, "2024-06-27", "ET_JUN.xlsx")
+    commit_merge(release_df([12.0, 9.0, 6.0, 4.0], datetime(2024, 7, 30), "ET_JUL.xlsx"), location, "2024-07-30", "ET_JUL.xlsx")
+    commit_merge(release_df([12.0, 9.0, 6.0, 4.0], datetime(2024, 8, 29), "ET_AUG.xlsx"), location, "2024-08-29", "ET_AUG.xlsx")
+    return location
+
+def test_commits_only_when_something_changed(table):
+    assert latest_version(table) == 1
+    # the revised partition was replaced, the other one kept its original file
+    files = active_files(table)
+    assert sorted(info["filename"] for info in files.values()) == ["ET_JUL.xlsx", "ET_JUN.xlsx"]
+    # replaced files stay on disk for older versions
+    assert all(os.path.exists(os.path.join(table, "DeltaTable", p)) for p in active_files(table, version=0))
+
+@pytest.mark.parametrize(
+    "as_of_date, expected_version, expected_figure",
+    [
+        ("2024-01-01", -1, None),
+        ("2024-06-27", 0, 11.0),
+        ("2024-07-29", 0, 11.0),
+        ("2024-07-30", 1, 12.0),
+        (datetime(2025, 1, 1), 1, 12.0),
+    ]
+)
+def test_as_of(table, as_of_date, expected_version, expected_figure):
+    assert version_as_of(table, as_of_date) == expected_version
+    df = as_of(table, as_of_date)
+    if expected_figure is None:
+        assert df.empty
+    else:
+        production = df[(df["resource"] == "indigenous production") & (df["quarter"] == 2)]
+        assert production["figures"].tolist() == [expected_figure]
+        assert len(df) == 8
+
+def test_checkpoints_bound_replay(tmp_path, monkeypatch):
+    monkeypatch.setattr(versioning, "checkpoint_interval", 2)
+    location = str(tmp_path)
+    for i in range(6):
+        published = datetime(2024, 1 + i, 28)
+        commit_merge(release_df([float(i), 9.0, 6.0, 4.0], published, f"ET_{i}.xlsx"), location, str(published.date()), f"ET_{i}.xlsx")
+    assert sorted(f for f in os.listdir(log_path(location)) if "checkpoint" in f) == [
+        "00000000000000000002.checkpoint.json", "00000000000000000004.checkpoint.json"
+    ]
+    # a commit before the checkpoint is never read when replaying from it
+    os.remove(os.path.join(log_path(location), "00000000000000000001.json"))
+    latest = read_version(location)
+    assert latest.loc[(latest["resource"] == "indigenous production") & (latest["quarter"] == 2), "figures"].tolist() == [5.0]
+    assert as_of(location, "2024-05-28")["filename"].astype(str).str.contains("ET_4").any()
+
+def test_unversioned_writers_refuse_versioned_table(table):
+    with pytest.raises(RuntimeError):
+        merge_parquet(release_df([1.0, 9.0, 6.0, 4.0], datetime(2024, 9, 1), "x.xlsx"), table)
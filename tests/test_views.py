@@ -0,0 +1,97 @@
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import release, revise
+from src.storage import merge_frames
+from src.pipeline import save_release
+import src.views as views_module
+from src.views import build_views, build_totals, refresh_views, read_view, load_views
+
+def assert_views_equal(views: dict, expected: dict) -> None:
+    for name in expected:
+        pd.testing.assert_frame_equal(views[name], expected[name], check_categorical=False)
+
+def test_view_values():
+    df = pd.DataFrame({
+        "year": [2023, 2023, 2023, 2023, 2024, 2024],
+        "quarter": [1, 1, 2, 2, 1, 1],
+        "category": ["import"] * 6,
+        "resource": ["crude oil", "feedstocks"] * 3,
+        "figures": [6.0, 2.0, 9.0, np.nan, 12.0, 4.0],
+    })
+    views = build_views(df)
+    assert views["totals"]["total"].tolist() == [8.0, 9.0, 16.0]
+    assert views["totals"]["resources"].tolist() == [2, 1, 2]
+    assert views["shares"]["share"].tolist()[:2] == [0.75, 0.25]
+    changes = views["changes"].set_index(["year", "quarter", "resource"])
+    assert changes.loc[(2023, 2, "crude oil"), "qoq_change"] == 3.0
+    assert changes.loc[(2023, 2, "crude oil"), "qoq_pct"] == 0.5
+    assert changes.loc[(2024, 1, "crude oil"), "yoy_change"] == 6.0
+    # the quarter before 2024 Q1 is 2023 Q4, which isn't there
+    assert np.isnan(changes.loc[(2024, 1, "crude oil"), "qoq_change"])
+    assert np.isnan(changes.loc[(2024, 1, "feedstocks"), "qoq_change"])
+
+@pytest.mark.parametrize("incoming", [
+    release(),                                   # nothing changed
+    release(start_year=2020),                    # one more year
+    revise(release(start_year=2020), 2021, 2),   # one more year, an old quarter revised
+    revise(release(start_year=2022, n_years=3), 2022, 1),
+])
+def test_refresh_matches_full_rebuild(tmp_path, incoming):
+    location = f"{tmp_path}/"
+    stored = release()
+    refresh_views(stored, location)
+    refresh_views(incoming, location)
+    merged, _ = merge_frames(stored, incoming)
+    assert_views_equal(load_views(location), build_views(merged))
+
+def test_refresh_only_recomputes_changed_quarters(tmp_path, monkeypatch):
+    location = f"{tmp_path}/"
+    refresh_views(release(), location)
+    assert refresh_views(release(), location)["periods_refreshed"] == 0
+
+    grouped = []
+    monkeypatch.setattr("src.views.build_totals", lambda base: grouped.append(base) or build_totals(base))
+    stats = refresh_views(revise(release(), 2020, 3), location)
+    assert stats == {"rebuilt": False, "periods_refreshed": 1}
+    assert len(grouped) == 1
+    assert set(zip(grouped[0]["year"], grouped[0]["quarter"])) == {(2020, 3)}
+
+def test_refresh_stopped_part_way_is_finished_by_the_retry(tmp_path, monkeypatch):
+    location = f"{tmp_path}/"
+    stored, incoming = release(), revise(release(start_year=2020), 2021, 2)
+    refresh_views(stored, location)
+
+    update_view = views_module._update_view
+    def crash_on_changes(location, name, *args):
+        if name == "changes":
+            raise OSError("disk full")
+        update_view(location, name, *args)
+    monkeypatch.setattr(views_module, "_update_view", crash_on_changes)
+    with pytest.raises(OSError):
+        refresh_views(incoming, location) # totals and shares are written, changes aren't
+    monkeypatch.undo()
+
+    assert refresh_views(incoming, location)["periods_refreshed"] > 0
+    merged, _ = merge_frames(stored, incoming)
+    assert_views_equal(load_views(location), build_views(merged))
+
+def test_overwrite_rebuilds(tmp_path):
+    location = f"{tmp_path}/"
+    refresh_views(release(), location)
+    incoming = release(start_year=2022, n_years=2)
+    assert refresh_views(incoming, location, write_mode="overwrite")["rebuilt"]
+    assert_views_equal(load_views(location), build_views(incoming))
+    assert read_view("totals", location)["year"].min() == 2022
+    with pytest.raises(ValueError):
+        read_view("ratios", location)
+
+@pytest.mark.parametrize("output_format, write_mode", [("csv", "merge"), ("parquet", "merge"), ("parquet", "versioned")])
+def test_views_turned_on_later_are_built_from_the_stored_table(tmp_path, output_format, write_mode):
+    location = f"{tmp_path}/"
+    stored, incoming = release(), revise(release(start_year=2020), 2021, 2)
+    save_release(stored, location, output_format, write_mode, datetime(2024, 6, 27), "ET_3.1_JUN_24.xlsx")
+    save_release(incoming, location, output_format, write_mode, datetime(2024, 7, 30), "ET_3.1_JUL_24.xlsx", views=True)
+    merged, _ = merge_frames(stored, incoming)
+    assert_views_equal(load_views(location), build_views(merged)) # not only the years of the release